@@ -0,0 +1,135 @@
+"""Disk-backed cache of Gemini responses, keyed by model name and normalized prompt."""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+# Per call site: whether responses may be reused and for how long (seconds).
+# Creative generation opts out so every press still produces a new recipe.
+POLICIES = {
+    "grocery_list": {"cache": True, "ttl": 30 * DAY},
+    "voila_merge": {"cache": True, "ttl": 7 * DAY},
+    "ai_sub": {"cache": True, "ttl": 30 * DAY},
+    "new_meal": {"cache": False, "ttl": 0},
+    "recipe_pool": {"cache": False, "ttl": 0},
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_use ON responses (used);
+"""
+
+
+def normalize_prompt(prompt):
+    """Prompts are indented f-strings; whitespace differences must not change the key."""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(model_name, prompt, generation_config=None):
+    # The response schema shapes the answer, so it is part of the key.
+    config = json.dumps(generation_config, sort_keys=True) if generation_config else ""
+    return hashlib.sha256(f"{model_name}\0{normalize_prompt(prompt)}\0{config}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path, max_entries=5000, max_bytes=50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def get(self, key, site, ttl):
+        with self._lock:
+            row = self._conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > ttl:
+                self.misses[site] = self.misses.get(site, 0) + 1
+                return None
+            self._conn.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self.hits[site] = self.hits.get(site, 0) + 1
+            return row[0]
+
+    def put(self, key, site, text):
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, site, text, size, created, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, site, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or size > self.max_bytes:
+            # Drop the least recently used tenth in one go rather than row by row.
+            oldest = self._conn.execute("SELECT key, size FROM responses ORDER BY used LIMIT ?", (max(1, count // 10),)).fetchall()
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key, _ in oldest])
+            count -= len(oldest)
+            size -= sum(row_size for _, row_size in oldest)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        sites = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": entries,
+            "bytes": size,
+            "sites": {site: {"hits": self.hits.get(site, 0), "misses": self.misses.get(site, 0)} for site in sites},
+        }
+
+
+class CachedModel:
+    """Wraps a household's ai_client.Budget, whose worker pool submit() uses; generate() returns response text, consulting the cache per POLICIES."""
+
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+        self.model_name = getattr(model, "model_name", "")
+
+    def generate(self, site, prompt, cancel=None, generation_config=None):
+        policy = POLICIES.get(site, {"cache": False, "ttl": 0})
+        if not policy["cache"]:
+            return self.model.generate_content(prompt, cancel=cancel, generation_config=generation_config, site=site).text
+
+        key = cache_key(self.model_name, prompt, generation_config)
+        text = self.cache.get(key, site, policy["ttl"])
+        if text is None:
+            text = self.model.generate_content(prompt, cancel=cancel, generation_config=generation_config, site=site).text
+            self.cache.put(key, site, text)
+        return text
+
+    def stream(self, site, prompt, cancel=None, generation_config=None):
+        """Yields the response in chunks as it arrives; a cached answer comes back as one chunk."""
+        policy = POLICIES.get(site, {"cache": False, "ttl": 0})
+        if not policy["cache"]:
+            yield from self.model.stream(prompt, cancel=cancel, generation_config=generation_config, site=site)
+            return
+
+        key = cache_key(self.model_name, prompt, generation_config)
+        text = self.cache.get(key, site, policy["ttl"])
+        if text is None:
+            chunks = []
+            for chunk in self.model.stream(prompt, cancel=cancel, generation_config=generation_config, site=site):
+                chunks.append(chunk)
+                yield chunk
+            self.cache.put(key, site, "".join(chunks))
+        else:
+            yield text
+
+    def submit(self, site, prompt, cancel=None, generation_config=None):
+        """generate() on the household Budget's bounded worker pool; returns a Future."""
+        return self.model.submit(self.generate, site, prompt, cancel, generation_config)
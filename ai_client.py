@@ -0,0 +1,199 @@
+"""Shared, rate-limited access to the Gemini model.
+
+Every call from every session goes through one GeminiClient: a token bucket keeps the
+app under the project's requests-per-minute quota, a semaphore bounds how many calls are
+in flight, and 429/5xx answers are retried with jittered exponential backoff instead of
+failing the whole page. Calls take an optional threading.Event; setting it stops retries,
+queued waits and streams early. Each attempt is recorded as a "gemini" span on the tracer
+(the caller's, if it passes one). When one server hosts several households, each calls
+through its own Budget, which records its calls on the household's own tracer.
+"""
+import concurrent.futures
+import contextvars
+import random
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+import tracing
+
+# Errors worth another attempt: quota (429), server trouble (5xx) and timeouts.
+RETRYABLE = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    TimeoutError,
+)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel=None):
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            _sleep(wait, cancel)
+
+
+def _sleep(seconds, cancel):
+    if cancel is None:
+        time.sleep(seconds)
+    elif cancel.wait(seconds):
+        raise Cancelled()
+
+
+class GeminiClient:
+    """model is a GenerativeModel, or a function making one; the latter is only called on
+    the first request, so creating a client costs nothing until Gemini is actually used."""
+
+    def __init__(self, model, requests_per_minute=60, burst=5, max_concurrent=4, retries=4, timeout=60.0, base_delay=1.0, max_delay=30.0, tracer=None, model_name=None):
+        self._model = model if hasattr(model, "generate_content") else None
+        self._make_model = None if self._model is not None else model
+        self._model_lock = threading.Lock()
+        self.tracer = tracer if tracer is not None else tracing.Tracer()
+        self.model_name = model_name or getattr(model, "model_name", "")
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.retries = retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.calls = 0
+        self.retried = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._make_model()
+        return self._model
+
+    def _backoff(self, attempt, cancel):
+        # Full jitter: concurrent sessions that hit the same 429 do not retry in lockstep.
+        _sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)), cancel)
+
+    def _admit(self, cancel):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        self.bucket.acquire(cancel)
+        self.calls += 1
+
+    def _request(self, prompt, stream, generation_config):
+        return self.model.generate_content(
+            prompt, stream=stream, generation_config=generation_config, request_options={"timeout": self.timeout}
+        )
+
+    def generate_content(self, prompt, cancel=None, generation_config=None, site="", tracer=None):
+        """Same contract as GenerativeModel.generate_content, with rate limiting and retries.
+
+        site only labels the trace; tracer, if given, records it instead of the client's own.
+        """
+        tracer = tracer or self.tracer
+        for attempt in range(self.retries + 1):
+            queued = time.perf_counter()
+            try:
+                with self._slots:
+                    self._admit(cancel)
+                    with tracer.span("gemini", site or "generate", attempt=attempt, queued_ms=_since(queued)):
+                        return self._request(prompt, False, generation_config)
+            except RETRYABLE:
+                if attempt == self.retries:
+                    raise
+                self.retried += 1
+                self._backoff(attempt, cancel)
+
+    def stream(self, prompt, cancel=None, generation_config=None, site="", tracer=None):
+        """Yields response text chunks as Gemini produces them.
+
+        Retries only until the first chunk has arrived; after that a failure is raised,
+        since the caller has already shown part of the answer.
+        """
+        tracer = tracer or self.tracer
+        for attempt in range(self.retries + 1):
+            started = False
+            queued = time.perf_counter()
+            try:
+                with self._slots:
+                    self._admit(cancel)
+                    with tracer.span("gemini", site or "stream", attempt=attempt, queued_ms=_since(queued)) as span:
+                        sent = time.perf_counter()
+                        for chunk in self._request(prompt, True, generation_config):
+                            if cancel is not None and cancel.is_set():
+                                raise Cancelled()
+                            if not started:
+                                span["first_chunk_ms"] = _since(sent)
+                            started = True
+                            yield chunk.text
+                return
+            except RETRYABLE:
+                if started or attempt == self.retries:
+                    raise
+                self.retried += 1
+                self._backoff(attempt, cancel)
+
+
+class Budget:
+    """One household's share of a GeminiClient shared by several households.
+
+    Calls pass the household's own token bucket and concurrency limit before the client's
+    project-wide ones, so a busy household queues behind itself instead of using up the
+    quota and the in-flight slots of everyone else. Retries are paced by the client alone.
+    """
+
+    def __init__(self, client, requests_per_minute, burst=5, max_concurrent=2, tracer=None):
+        self.client = client
+        self.tracer = tracer if tracer is not None else tracing.Tracer()
+        self.model_name = client.model_name
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="gemini-household")
+        self.calls = 0
+
+    @property
+    def retried(self):
+        return self.client.retried
+
+    def _admit(self, cancel):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        self.bucket.acquire(cancel)
+        self.calls += 1
+
+    def generate_content(self, prompt, cancel=None, generation_config=None, site=""):
+        with self._slots:
+            self._admit(cancel)
+            return self.client.generate_content(prompt, cancel=cancel, generation_config=generation_config, site=site, tracer=self.tracer)
+
+    def stream(self, prompt, cancel=None, generation_config=None, site=""):
+        with self._slots:
+            self._admit(cancel)
+            yield from self.client.stream(prompt, cancel=cancel, generation_config=generation_config, site=site, tracer=self.tracer)
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn on the household's bounded worker pool and returns its Future."""
+        return self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _since(started):
+    return round((time.perf_counter() - started) * 1000, 1)
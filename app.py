@@ -1,441 +1,517 @@
 import streamlit as st
-import google.generativeai as genai
 import gspread
 from google.oauth2.service_account import Credentials
 import json
-import random
-import concurrent.futures 
+import math
+import ai_cache
+import ai_client
+import cart_match
+import grocery_lists
+import households
+import ingredients
+import jobs
+import journal
+import local_store
+import recipe_pool
+import recipes
+import sheets
+import sync
+import tracing
+import vault_search
+import week_plan
 
 # --- SETUP ---
 st.set_page_config(page_title="Household Meal Planner", page_icon="🍳", layout="centered")
 
 if 'voila_pending' not in st.session_state:
     st.session_state.voila_pending = False
-if 'voila_new_cart' not in st.session_state:
-    st.session_state.voila_new_cart = []
+if 'voila_merge' not in st.session_state:
+    st.session_state.voila_merge = (None, "", "")
 if 'voila_item' not in st.session_state:
     st.session_state.voila_item = ""
+if 'vault_page' not in st.session_state:
+    st.session_state.vault_page = 0
+if 'section' not in st.session_state:
+    st.session_state.section = "📅 Schedule"
+    st.session_state.open_section = "📅 Schedule"
+
+VAULT_PAGE_SIZE = 10
+VAULT_PICK_SIZE = 8
+VAULT_PICK_PROMPT = "-- Pick from Vault --"
+
+# --- HOUSEHOLD ---
+# Everything below that holds a household's data or traffic (sheet, mirror, caches, pool,
+# jobs, tracer) is cached per household; only the Gemini client and service-account
+# logins are shared.
+hosted = households.names(st.secrets)
+household = st.query_params.get("household", hosted[0] if len(hosted) == 1 else None)
+if household not in hosted:
+    st.error("This planner hosts several households. Open it with ?household=<your household>&token=<your token> added to the address.")
+    st.stop()
+if not households.admits(st.secrets, household, st.query_params.get("token")):
+    st.error("This household's planner needs its private link. Add &token=<your token> to the address.")
+    st.stop()
+
+@st.cache_resource
+def get_tracer(household):
+    return tracing.Tracer()
+
+tracer = get_tracer(household)
+# A run cut short by st.rerun() or st.stop() never reaches the end of the script.
+if 'trace_run' in st.session_state:
+    traced_household, span = st.session_state.trace_run
+    get_tracer(traced_household).end(span, "interrupted")
+st.session_state.trace_run = (household, tracer.begin_run())
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+
+def gemini_model():
+    # Imported and configured on the first Gemini request, not at startup: the SDK is
+    # slow to import and most reruns never call it.
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+@st.cache_resource
+def get_gemini():
+    """The project-wide quota and in-flight limit, shared by every household."""
+    return ai_client.GeminiClient(gemini_model, requests_per_minute=int(st.secrets.get("GEMINI_RPM", 60)), model_name=GEMINI_MODEL)
 
-api_key = st.secrets["GEMINI_API_KEY"]
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.5-flash')
+@st.cache_resource
+def get_ai(household):
+    settings = households.settings(st.secrets, household)
+    client = get_gemini()
+    # Each household gets its share of the quota and at most its share (rounded up) of the slots.
+    budget = ai_client.Budget(client, settings["GEMINI_RPM"], max_concurrent=-(-client.max_concurrent // len(hosted)), tracer=get_tracer(household))
+    cache = ai_cache.ResponseCache(settings["AI_CACHE_PATH"])
+    return ai_cache.CachedModel(budget, cache)
+
+ai = get_ai(household)
+
+@st.cache_resource
+def get_pool(household):
+    return recipe_pool.RecipePool(get_ai(household))
+
+pool = get_pool(household)
+
+@st.cache_resource
+def get_jobs(household):
+    return jobs.JobRunner(tracer=get_tracer(household))
+
+runner = get_jobs(household)
 
 # --- GOOGLE SHEETS CONNECTION ---
 @st.cache_resource
-def get_google_sheet():
-    creds_dict = json.loads(st.secrets["GCP_SERVICE_ACCOUNT"])
+def get_sheets_client(service_account):
+    """One authorized gspread client per service account, reused by every household on it."""
+    creds_dict = json.loads(service_account)
     scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    client = gspread.authorize(creds)
-    return client.open_by_url(st.secrets["SHEET_URL"])
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_all_records(sheet_name):
-    client = get_google_sheet()
-    return client.worksheet(sheet_name).get_all_records()
+    return gspread.authorize(creds)
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_col_values(sheet_name, col_num):
-    client = get_google_sheet()
-    return client.worksheet(sheet_name).col_values(col_num)
+@st.cache_resource
+def get_google_sheet(household):
+    settings = households.settings(st.secrets, household)
+    client = get_sheets_client(settings["GCP_SERVICE_ACCOUNT"])
+    with get_tracer(household).span("sheets", "open_by_url", op="read"):
+        spreadsheet = client.open_by_url(settings["SHEET_URL"])
+    return tracing.TracedSheets(spreadsheet, get_tracer(household))
 
-try:
-    db = get_google_sheet()
-    schedule_ws = db.worksheet("Schedule")
-    pantry_ws = db.worksheet("Pantry")
-    
-    try:
-        vault_ws = db.worksheet("Recipe Vault")
-    except:
-        vault_ws = db.add_worksheet(title="Recipe Vault", rows="100", cols="3")
-        vault_ws.append_row(["Meal Title", "Recipe", "Rating"])
-        
-    try:
-        voila_ws = db.worksheet("Voila")
-    except:
-        voila_ws = db.add_worksheet(title="Voila", rows="100", cols="1")
-        voila_ws.append_row(["Item"])
-        
-    try:
-        settings_ws = db.worksheet("Settings")
-    except:
-        settings_ws = db.add_worksheet(title="Settings", rows="10", cols="2")
-        settings_ws.append_row(["Setting", "Value"])
-        settings_ws.append_row(["Diet & Portions", "High-protein dinner recipes (using chicken, fish, ground turkey, or a high-protein vegetarian base). Scale all ingredient measurements to feed exactly 3 adults and 2 children for a single meal."])
+@st.cache_resource
+def get_worksheets(household):
+    return sheets.bootstrap(get_google_sheet(household))
 
-    try:
-        groceries_ws = db.worksheet("Groceries")
-    except:
-        groceries_ws = db.add_worksheet(title="Groceries", rows="200", cols="2")
-        groceries_ws.append_row(["List Type", "Item"])
+@st.cache_resource
+def get_journal(household):
+    settings = households.settings(st.secrets, household)
+    store = local_store.LocalStore(settings["LOCAL_DB_PATH"])
+    engine = sync.SyncEngine(get_google_sheet(household), get_worksheets(household), store)
+    engine.start()
+    return journal.MutationJournal(store, engine, get_tracer(household))
 
+try:
+    store = get_journal(household)
 except Exception as e:
     st.error(f"Error connecting to Google Sheets. Check your secrets file! Details: {e}")
     st.stop()
 
-# --- INITIALIZE OR READ DATA ---
-schedule_data = fetch_all_records("Schedule")
-if not schedule_data:
-    schedule_ws.append_row(["Day", "Status", "Meal"])
-    defaults = [
-        ["Monday", "Cook at Home", ""],
-        ["Tuesday", "Cook Day 1 (Makes Tues & Wed meals)", ""],
-        ["Wednesday", "Prepped on Tuesday", ""],
-        ["Thursday", "Cook Day 2 (Makes Thurs & Fri meals)", ""],
-        ["Friday", "Prepped on Thursday", ""],
-        ["Saturday", "Leftovers / Flexible", ""],
-        ["Sunday", "Cook at Home", ""]
-    ]
-    schedule_ws.append_rows(defaults)
-    fetch_all_records.clear("Schedule")
-    schedule_data = fetch_all_records("Schedule")
-
-schedule_dict = {row["Day"]: {"status": row["Status"], "meal": row["Meal"], "row_index": i + 2} for i, row in enumerate(schedule_data)}
-
-pantry_data = fetch_col_values("Pantry", 1)
-if not pantry_data:
-    pantry_ws.append_row(["Item"])
-    pantry_ws.append_rows([["Olive Oil"], ["Salt"], ["Black Pepper"], ["Garlic Powder"]])
-    fetch_col_values.clear("Pantry", 1)
-    pantry_data = fetch_col_values("Pantry", 1)
-
-current_pantry = pantry_data[1:]
-
-vault_data = fetch_all_records("Recipe Vault")
-vault_dict = {
-    str(row["Meal Title"]): {
-        "recipe": str(row["Recipe"]), 
-        "rating": str(row["Rating"]), 
-        "row_index": i + 2
-    } for i, row in enumerate(vault_data) if row.get("Meal Title")
-}
-
-loved_meals = [title for title, data in vault_dict.items() if data["rating"] in ["4", "5"]]
-banned_meals = [title for title, data in vault_dict.items() if data["rating"] in ["1", "2"]]
-loved_str = ", ".join(loved_meals) if loved_meals else "None yet"
-banned_str = ", ".join(banned_meals) if banned_meals else "None yet"
-
-voila_data = fetch_col_values("Voila", 1)
-if not voila_data:
-    voila_ws.append_row(["Item"])
-    fetch_col_values.clear("Voila", 1)
-    voila_data = fetch_col_values("Voila", 1)
-current_voila = voila_data[1:]
-
-settings_data = fetch_all_records("Settings")
-diet_prefs = "High-protein recipes."
-for row in settings_data:
-    if row.get("Setting") == "Diet & Portions":
-        diet_prefs = str(row.get("Value"))
-
-groceries_data = fetch_all_records("Groceries")
+# Edits from other devices arrive in the background and show up on a later rerun.
+store.poll()
+
+# --- READ DATA ---
+def vault_index():
+    return store.derived("Recipe Vault", vault_search.VaultIndex)
+
+def recipe_context(diet_prefs, vault_dict):
+    # vault_dict only ties the result to the vault's version; the ranking itself uses the shared index.
+    index = vault_index()
+    loved_str, banned_str = index.prompt_context("", background=diet_prefs)
+    return recipe_pool.Context(diet_prefs, frozenset(index.loved), frozenset(index.banned), loved_str, banned_str)
+
+def pool_context():
+    """What pooled recipes are generated for; the pool starts over when the diet or the loved or banned meals change."""
+    return store.derived(("Settings", "Recipe Vault"), recipe_context)
+
+def vault_recipe(title, data):
+    """A vault favourite as it is planned onto a day."""
+    ingredients_list = data.structured.ingredients if data.structured else ()
+    return recipes.Recipe(title, f"(Vault Rating: {data.rating} Stars)", ingredients_list)
+
+# --- WRITE DATA ---
+def save_meal(day, recipe):
+    # Dropped as a conflict if another device changed the day's meal since this one last saw it.
+    seen = store.view("Schedule")[day].meal
+    store.update_row("Schedule", day, {3: recipe.to_markdown(), 4: recipe.to_json()}, expected={3: seen})
+
+def pick_from_vault(day):
+    selected = st.session_state[f"sel_{day}"]
+    vault_dict = store.view("Recipe Vault")
+    if selected in vault_dict:
+        save_meal(day, vault_recipe(selected, vault_dict[selected]))
+    # Back to the prompt, so a later Generate New Meal is not overwritten by a stale pick.
+    st.session_state[f"sel_{day}"] = VAULT_PICK_PROMPT
+
+def reset_vault_page():
+    st.session_state.vault_page = 0
+
+# Bulk mode gives every row a checkbox keyed prefix + row key; the ticked rows are committed in one go.
+def ticked(prefix, keys):
+    return [key for key in keys if st.session_state.get(prefix + key)]
+
+def tick(prefix, keys, value=True):
+    for key in keys:
+        st.session_state[prefix + key] = value
+
+def move_to_pantry(rows, current_pantry):
+    """Groceries rows into the pantry as one transaction: a single append and a single delete."""
+    new_items = []
+    for row in rows:
+        clean_item = row.item.replace("*", "").strip().title()
+        if clean_item and clean_item not in current_pantry and clean_item not in new_items:
+            new_items.append(clean_item)
+    with store.transaction():
+        store.append_rows("Pantry", [[item] for item in new_items])
+        store.delete_keys("Groceries", [row.key for row in rows])
+
+# --- BACKGROUND JOBS ---
+# Long AI pipelines run on the job runner, off the script thread, so they must not call st.
+# They return (level, message), an st alert to show the session that started or joined them.
+def auto_fill_week(job):
+    job.progress(0, 3, "Planning the week around shared ingredients...")
+    schedule_dict = store.view("Schedule")
+    vault_dict = store.view("Recipe Vault")
+    
+    prep_days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    last_week = [details.structured.title for details in schedule_dict.values() if details.structured]
+    
+    # Loved vault meals that share ingredients (and use the pantry) take every day they can.
+    planned = week_plan.plan_week(store.derived("Recipe Vault", week_plan.PlanIndex), prep_days, store.view("Pantry"), exclude=last_week)
+    new_meals = {day: vault_recipe(title, vault_dict[title]) for day, title in planned.items()}
+    ai_days = [day for day in prep_days if day not in planned]
+    
+    # The rest comes out of the candidate pool: one batched call, usually made in the
+    # background before the button was even pressed.
+    pooled = []
+    if ai_days:
+        job.progress(1, message="Firing up the kitchen! Generating AI recipes...")
+        pooled = pool.take(pool_context(), len(ai_days), exclude=list(planned.values()) + vault_index().banned, timeout=120)
+    new_meals.update(zip(ai_days, pooled))
+    skipped_days = ai_days[len(pooled):]
+        
+    new_meals["Saturday"] = recipes.Recipe("Flexible / Clean out the fridge!", "", ())
+    
+    job.progress(2, message="Writing the week's schedule...")
+    for day, recipe in new_meals.items():
+        if day in schedule_dict:
+            save_meal(day, recipe)
+    job.progress(3)
+    
+    if skipped_days:
+        return "warning", f"Chef Gemini is busy, so {', '.join(skipped_days)} kept their current meals. Try again in a minute!"
+    return "success", "Your week is planned!"
+
+def compile_grocery_lists(job):
+    schedule_dict = store.view("Schedule")
+    current_pantry = store.view("Pantry")
+    pantry_string = ", ".join(current_pantry)
+
+    system_prompt = f"""
+    Extract all ingredients from the following recipes. Combine quantities where possible.
+    CRITICAL INSTRUCTION: The user already has these pantry items: {pantry_string}. DO NOT include them.
+    
+    FORMATTING RULES:
+    1. Output a NEWLINE-SEPARATED list. 
+    2. Group the items by grocery store aisles.
+    3. Before each group, add a header starting with three hashtags (e.g., ### Produce, ### Meat & Seafood).
+    4. Put each completely separate ingredient on its own line.
+    5. NEVER split a single ingredient across multiple lines.
+    6. You MAY use commas within an ingredient line.
+    7. Do not use bullet points, asterisks, or introductory text.
+    """
+
+    # Only lists whose meals (or relevant pantry items) changed since their last compile are rebuilt.
+    groceries_values = store.values("Groceries")
+    stale_lists = []
+    for list_name, days in grocery_lists.LIST_GROUPS:
+        list_text = grocery_lists.meal_text(schedule_dict, days)
+        aggregator = grocery_lists.aggregate(schedule_dict, days, current_pantry)
+        list_fingerprint = grocery_lists.fingerprint(list_text, aggregator)
+        if not grocery_lists.is_current(groceries_values, list_name, list_fingerprint, aggregator):
+            stale_lists.append((list_name, list_fingerprint, aggregator))
+
+    if not stale_lists:
+        return "info", "Your lists already match this week's meals. Nothing to recompile!"
+
+    job.progress(0, len(stale_lists), "Dispatching agents to organize the aisles in parallel...")
+    unsorted_lists = []
+    # Gemini only sees the lines the local parser could not read.
+    replies = [ai.submit("grocery_list", system_prompt + "\nRecipes:\n" + "\n".join(aggregator.unparsed)) if aggregator.unparsed else None for _, _, aggregator in stale_lists]
+    for done, ((list_name, list_fingerprint, aggregator), reply) in enumerate(zip(stale_lists, replies)):
+        groups = aggregator.grouped()
+        if reply is not None:
+            try:
+                ingredients.merge_sectioned(groups, reply.result())
+            except Exception:
+                unsorted_lists.append(list_name)
+                ingredients.merge_sectioned(groups, "\n".join(aggregator.unparsed))
+                list_fingerprint += grocery_lists.PARTIAL
+        grocery_lists.write_list(store, list_name, list_fingerprint, [x.strip().title() for x in ingredients.to_list_items(groups)])
+        job.progress(done + 1, message=f"{list_name} is ready.")
+
+    if unsorted_lists:
+        return "warning", f"Chef Gemini is busy, so a few items in {', '.join(unsorted_lists)} are listed under Other."
+    return "success", "Lists successfully generated and synced to all devices!"
+
+# Both pipelines read the schedule and write what is derived from it, so they take turns.
+def follow_job(name, fn):
+    """Starts fn as job name, or joins the run already under way, and shows this session its outcome."""
+    job = runner.submit(name, fn, lock="week")
+    st.session_state[f"job_{name}"] = job.id
+
+def show_job(name):
+    """Progress while the job runs (in any session); its outcome once, to the sessions following it."""
+    job = runner.get(name)
+    if job is None:
+        return
+    if job.active:
+        st.session_state[f"job_{name}"] = job.id
+        job_progress(name)
+    elif st.session_state.get(f"job_{name}") == job.id:
+        del st.session_state[f"job_{name}"]
+        if job.error is not None:
+            st.error(f"Something went wrong: {job.error}")
+        else:
+            level, message = job.result
+            getattr(st, level)(message)
+
+@st.fragment(run_every=1.0)
+def job_progress(name):
+    job = runner.get(name)
+    if job.active:
+        st.progress(job.fraction(), text=job.message or "Waiting for the kitchen...")
+    else:
+        # Its edits can touch every tab, so bring the whole page up to date.
+        st.rerun()
 
-# --- HEADER ---
-col_h1, col_h2 = st.columns([4, 1])
-with col_h1:
-    st.title("🍳 Household Meal Planner")
-with col_h2:
-    st.write("") 
-    if st.button("🔄 Sync App", use_container_width=True):
-        fetch_all_records.clear()
-        fetch_col_values.clear()
+# --- FRAGMENTS ---
+# Each tab and day card reruns on its own and reads only the tabs it shows via store.view().
+# Buttons whose edit is invisible outside their fragment rerun just that fragment.
+def rerun_fragment():
+    # A fragment-scoped rerun is only allowed while the fragment itself is rerunning;
+    # during a full run (e.g. the vault picker reacting on first render) rerun the app.
+    try:
+        st.rerun(scope="fragment")
+    except st.errors.StreamlitAPIException:
         st.rerun()
-        
-st.divider()
 
-# --- TABS ---
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📅 Schedule", "🛒 Groceries", "🥫 Pantry", "⭐ Vault", "🚚 Voila", "⚙️ Settings"])
+@st.fragment
+def day_card(day):
+    details = store.view("Schedule")[day]
+    vault_dict = store.view("Recipe Vault")
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.subheader(day)
+    with col2:
+        if "Cook Day" in details.status:
+            st.info(f"🧑‍🍳 **{details.status}**")
+        elif "Warm-Up" in details.status or "Prepped" in details.status:
+            st.warning(f"♨️ **{details.status}**")
+        elif "Flexible" in details.status:
+            st.error(f"🥡 **{details.status}**")
+        else:
+            st.success(f"🍽️ **{details.status}**")
+
+        if details.meal:
+            st.write(details.meal)
+            recipe = details.structured
+
+            with st.expander("✏️ Line-by-Line Edit & AI Substitute"):
+                new_lines = []
+
+                for idx, item in enumerate(recipe.ingredients):
+                    col_e1, col_e2 = st.columns([4, 1])
+                    with col_e1:
+                        dynamic_key = f"edit_line_{day}_{idx}_{item.text}"
+                        edited_line = st.text_input(f"Edit {idx}", value=item.text, key=dynamic_key, label_visibility="collapsed")
+                        new_lines.append(edited_line)
+                    with col_e2:
+                        if st.button("🪄 AI Sub", key=f"sub_btn_{day}_{idx}"):
+                            with st.spinner("Swapping..."):
+                                prompt = f"""
+                                I am cooking {recipe.title or "dinner"}. I need a culinary substitute for '{item.text}'. 
+                                You MUST provide a completely DIFFERENT ingredient (e.g., swapping chicken for tofu, or cilantro for parsley). 
+                                Do NOT just give me a different preparation or amount of the exact same ingredient.
+                                Give the replacement ingredient with the quantity and unit to use instead.
+                                """
+                                substitute = recipes.ingredient_from_reply(ai.generate("ai_sub", prompt, generation_config=recipes.INGREDIENT_CONFIG))
+                                swapped = recipe.ingredients[:idx] + (substitute,) + recipe.ingredients[idx + 1:]
+                                save_meal(day, recipe._replace(ingredients=swapped))
+                                rerun_fragment()
+
+                st.write("")
+                if st.button("💾 Save Manual Edits", key=f"save_manual_{day}", use_container_width=True):
+                    edited = recipe._replace(ingredients=tuple(recipes.ingredient_from_line(line) for line in new_lines if line.strip()))
+                    if edited != recipe:
+                        save_meal(day, edited)
+                        rerun_fragment()
+
+            with st.expander("⭐ Rate & Save this Meal"):
+                col_r1, col_r2 = st.columns([2, 1])
+                with col_r1:
+                    meal_name = st.text_input("Name this meal:", key=f"name_{day}")
+                with col_r2:
+                    rating = st.selectbox("Rating:", ["5 (Love)", "4 (Like)", "3 (Okay)", "2 (Dislike)", "1 (Never Again)"], key=f"rate_{day}")
+
+                if st.button("Save to Vault", key=f"save_{day}", use_container_width=True):
+                    if meal_name:
+                        numeric_rating = rating[0] 
+                        saved = recipe._replace(title=meal_name, description="")
+                        store.append_rows("Recipe Vault", [[meal_name, saved.ingredients_markdown(), numeric_rating, saved.to_json()]])
+                        st.success(f"Saved {meal_name} with {numeric_rating} stars!")
+                        st.rerun()
 
-with tab1:
-    if st.button("✨ Auto-Fill Magic Week", type="primary", use_container_width=True):
-        with st.spinner("Firing up the kitchen! Generating parallel AI recipes..."):
-            
-            prep_days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-            new_meals = {}
-            
-            chosen_favs = random.sample(loved_meals, min(2, len(loved_meals)))
-            random.shuffle(prep_days)
-            fav_days = prep_days[:len(chosen_favs)]
-            ai_days = prep_days[len(chosen_favs):]
-            
-            for i, day in enumerate(fav_days):
-                fav_title = chosen_favs[i]
-                fav_data = vault_dict[fav_title]
-                new_meals[day] = f"**{fav_title}**\n*(Vault Rating: {fav_data['rating']} Stars)*\n\n**Ingredients needed:**\n{fav_data['recipe']}"
-            
-            def fetch_magic_meal(prompt_text):
-                return model.generate_content(prompt_text).text
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future_to_day = {}
-                for day in ai_days:
-                    prompt = f"""
-                    Suggest a dinner recipe based EXACTLY on these family preferences: {diet_prefs}.
-                    CRITICAL INSTRUCTIONS:
-                    - Do NOT suggest these 1 and 2-star banned meals: {banned_str}
-                    - Provide a fresh, creative idea.
-                    Format your response exactly like this:
-                    **[Recipe Title]**
-                    *Brief 1-sentence description.*
-                    
-                    **Ingredients needed:**
-                    (Provide a simple bulleted list with quantities)
-                    """
-                    future = executor.submit(fetch_magic_meal, prompt)
-                    future_to_day[future] = day
-                
-                for future in concurrent.futures.as_completed(future_to_day):
-                    day = future_to_day[future]
-                    new_meals[day] = future.result()
-                
-            new_meals["Saturday"] = "**Flexible / Clean out the fridge!**"
-            
-            cells_to_update = []
-            for day, meal_text in new_meals.items():
-                if day in schedule_dict:
-                    row_index = schedule_dict[day]["row_index"]
-                    cells_to_update.append(gspread.Cell(row=row_index, col=3, value=meal_text))
-            
-            if cells_to_update:
-                schedule_ws.update_cells(cells_to_update)
-            
-            fetch_all_records.clear("Schedule")
-            st.rerun()
+        if "Flexible" not in details.status:
+            required_ingredients = st.text_input(f"Craving something specific for {day}?", key=f"req_{day}", placeholder="e.g., chicken, pasta, sweet potatoes...")
+
+            col_btn1, col_btn2 = st.columns(2)
+            with col_btn1:
+                if st.button(f"✨ Generate New Meal", key=f"btn_{day}", use_container_width=True):
+                    # A plain regenerate is served from the candidate pool; cravings need their own call.
+                    pooled = [] if required_ingredients.strip() else pool.take(pool_context(), exclude=vault_index().banned + ([recipe.title] if details.meal else []))
+                    if pooled:
+                        save_meal(day, pooled[0])
+                        rerun_fragment()
+                    with st.spinner(f"Chef Gemini is planning {day}..."):
+                        diet_prefs = store.view("Settings")
+                        # Only the vault meals relevant to this request go into the prompt.
+                        loved_str, banned_str = vault_index().prompt_context(required_ingredients, background=diet_prefs)
+                        req_string = f"\n- STRICT REQUIREMENT: You MUST base this recipe around these specific ingredients: {required_ingredients.strip()}." if required_ingredients.strip() else ""
+
+                        prompt = f"""
+                        Suggest a dinner recipe based EXACTLY on these family preferences: {diet_prefs}.
+                        CRITICAL INSTRUCTIONS:{req_string}
+                        - Here are the family's 4 and 5-star meals. You are highly encouraged to suggest one of these, or a very close variation: {loved_str}
+                        - Do NOT suggest these 1 and 2-star banned meals: {banned_str}
+
+                        Give the recipe title, a brief 1-sentence description, and every ingredient with its quantity and unit.
+                        """
+                        # The reply is JSON; the preview renders each field as soon as it is complete.
+                        reply = recipes.RecipeStream(ai.stream("new_meal", prompt, generation_config=recipes.RECIPE_CONFIG))
+                        st.write_stream(iter(reply))
+                        save_meal(day, recipes.from_reply(reply.text))
+                        rerun_fragment()
+
+            with col_btn2:
+                if vault_dict:
+                    # Loved meals by default; typing searches the whole vault. Either way the list stays short.
+                    vault_query = st.text_input("Search the Vault:", key=f"vault_q_{day}", placeholder="Or search the Vault...", label_visibility="collapsed")
+                    picks = vault_index().search(vault_query, None if vault_query.strip() else vault_search.RATING_FILTERS["Loved (4-5 ⭐)"])
+                    fav_options = [VAULT_PICK_PROMPT] + picks[:VAULT_PICK_SIZE]
+                    st.selectbox("Or choose from Vault:", fav_options, key=f"sel_{day}", label_visibility="collapsed", on_change=pick_from_vault, args=(day,))
+                else:
+                    st.write("*(Rate meals to build Vault)*")
+    st.divider()
 
-    st.write("---")
-    
-    st.header("This Week's Schedule")
-    for day, details in schedule_dict.items():
-        col1, col2 = st.columns([1, 3])
-        with col1:
-            st.subheader(day)
-        with col2:
-            if "Cook Day" in details["status"]:
-                st.info(f"🧑‍🍳 **{details['status']}**")
-            elif "Warm-Up" in details["status"] or "Prepped" in details["status"]:
-                st.warning(f"♨️ **{details['status']}**")
-            elif "Flexible" in details["status"]:
-                st.error(f"🥡 **{details['status']}**")
-            else:
-                st.success(f"🍽️ **{details['status']}**")
-            
-            if details["meal"]:
-                st.write(details["meal"])
-                
-                with st.expander("✏️ Line-by-Line Edit & AI Substitute"):
-                    lines = details["meal"].split("\n")
-                    new_lines = []
-                    
-                    for idx, line in enumerate(lines):
-                        stripped = line.strip()
-                        
-                        is_bold_header = stripped.startswith("**")
-                        is_italic_desc = stripped.startswith("*") and not stripped.startswith("**") and not stripped.startswith("* ")
-                        
-                        if stripped == "" or is_bold_header or is_italic_desc:
-                            st.markdown(line)
-                            new_lines.append(line)
-                        else:
-                            col_e1, col_e2 = st.columns([4, 1])
-                            with col_e1:
-                                dynamic_key = f"edit_line_{day}_{idx}_{line}"
-                                edited_line = st.text_input(f"Edit {idx}", value=line, key=dynamic_key, label_visibility="collapsed")
-                                new_lines.append(edited_line)
-                            with col_e2:
-                                if st.button("🪄 AI Sub", key=f"sub_btn_{day}_{idx}"):
-                                    with st.spinner("Swapping..."):
-                                        title = next((l for l in lines if "**" in l), "the recipe").replace("**", "")
-                                        prompt = f"""
-                                        I am cooking {title}. I need a culinary substitute for '{line}'. 
-                                        You MUST provide a completely DIFFERENT ingredient (e.g., swapping chicken for tofu, or cilantro for parsley). 
-                                        Do NOT just give me a different preparation or amount of the exact same ingredient.
-                                        Please provide JUST the replacement ingredient and its measurement, formatted exactly like the original line. 
-                                        Do not use introductory text.
-                                        """
-                                        new_ingredient = model.generate_content(prompt).text.strip().lstrip("- ").lstrip("* ")
-                                        
-                                        if line.startswith("* "):
-                                            new_ingredient = f"* {new_ingredient}"
-                                        elif line.startswith("- "):
-                                            new_ingredient = f"- {new_ingredient}"
-                                            
-                                        lines[idx] = new_ingredient
-                                        updated_meal = "\n".join(lines)
-                                        
-                                        schedule_ws.update_cell(details["row_index"], 3, updated_meal)
-                                        fetch_all_records.clear("Schedule")
-                                        st.rerun()
-                                        
-                    st.write("")
-                    if st.button("💾 Save Manual Edits", key=f"save_manual_{day}", use_container_width=True):
-                        updated_meal = "\n".join(new_lines)
-                        if updated_meal != details["meal"]:
-                            schedule_ws.update_cell(details["row_index"], 3, updated_meal)
-                            fetch_all_records.clear("Schedule")
-                            st.rerun()
-                
-                with st.expander("⭐ Rate & Save this Meal"):
-                    col_r1, col_r2 = st.columns([2, 1])
-                    with col_r1:
-                        meal_name = st.text_input("Name this meal:", key=f"name_{day}")
-                    with col_r2:
-                        rating = st.selectbox("Rating:", ["5 (Love)", "4 (Like)", "3 (Okay)", "2 (Dislike)", "1 (Never Again)"], key=f"rate_{day}")
-                    
-                    if st.button("Save to Vault", key=f"save_{day}", use_container_width=True):
-                        if meal_name:
-                            numeric_rating = rating[0] 
-                            vault_ws.append_row([meal_name, details["meal"], numeric_rating])
-                            fetch_all_records.clear("Recipe Vault")
-                            st.success(f"Saved {meal_name} with {numeric_rating} stars!")
-                            st.rerun()
-            
-            if "Flexible" not in details["status"]:
-                required_ingredients = st.text_input(f"Craving something specific for {day}?", key=f"req_{day}", placeholder="e.g., chicken, pasta, sweet potatoes...")
-                
-                col_btn1, col_btn2 = st.columns(2)
-                with col_btn1:
-                    if st.button(f"✨ Generate New Meal", key=f"btn_{day}", use_container_width=True):
-                        with st.spinner(f"Chef Gemini is planning {day}..."):
-                            req_string = f"\n- STRICT REQUIREMENT: You MUST base this recipe around these specific ingredients: {required_ingredients.strip()}." if required_ingredients.strip() else ""
-                            
-                            prompt = f"""
-                            Suggest a dinner recipe based EXACTLY on these family preferences: {diet_prefs}.
-                            CRITICAL INSTRUCTIONS:{req_string}
-                            - Here are the family's 4 and 5-star meals. You are highly encouraged to suggest one of these, or a very close variation: {loved_str}
-                            - Do NOT suggest these 1 and 2-star banned meals: {banned_str}
-                            
-                            Format your response exactly like this:
-                            **[Recipe Title]**
-                            *Brief 1-sentence description.*
-                            
-                            **Ingredients needed:**
-                            (Provide a simple bulleted list with quantities)
-                            """
-                            response = model.generate_content(prompt)
-                            schedule_ws.update_cell(details["row_index"], 3, response.text)
-                            fetch_all_records.clear("Schedule")
-                            st.rerun()
-                
-                with col_btn2:
-                    if vault_dict:
-                        fav_options = ["-- Pick from Vault --"] + list(vault_dict.keys())
-                        selected_fav = st.selectbox("Or choose from Vault:", fav_options, key=f"sel_{day}", label_visibility="collapsed")
-                        
-                        if selected_fav != "-- Pick from Vault --":
-                            formatted_fav = f"**{selected_fav}**\n*(Vault Rating: {vault_dict[selected_fav]['rating']} Stars)*\n\n**Ingredients needed:**\n{vault_dict[selected_fav]['recipe']}"
-                            
-                            # THE FIX: This stops the Streamlit Infinite Loop!
-                            if details["meal"] != formatted_fav:
-                                schedule_ws.update_cell(details["row_index"], 3, formatted_fav)
-                                fetch_all_records.clear("Schedule")
-                                st.rerun()
-                    else:
-                        st.write("*(Rate meals to build Vault)*")
-        st.divider()
+@st.fragment
+def groceries_tab():
+    current_pantry = store.view("Pantry")
+    groceries_data = store.view("Groceries")
 
-with tab2:
     st.header("🛒 Smart Shopping Lists")
     
-    if st.button("✨ Compile AI Grocery Lists", type="primary", use_container_width=True):
-        with st.spinner("Dispatching agents to organize the aisles in parallel..."):
-            
-            household_text = "".join([f"\n{schedule_dict[day]['meal']}" for day in ["Sunday", "Monday"] if schedule_dict[day]["meal"]])
-            cook_text_1 = "".join([f"\n{schedule_dict[day]['meal']}" for day in ["Tuesday", "Wednesday"] if schedule_dict[day]["meal"]])
-            cook_text_2 = "".join([f"\n{schedule_dict[day]['meal']}" for day in ["Thursday", "Friday"] if schedule_dict[day]["meal"]])
-            
-            pantry_string = ", ".join(current_pantry)
-            
-            groceries_ws.clear()
-            groceries_ws.append_row(["List Type", "Item"])
-            rows_to_add = []
-
-            system_prompt = f"""
-            Extract all ingredients from the following recipes. Combine quantities where possible.
-            CRITICAL INSTRUCTION: The user already has these pantry items: {pantry_string}. DO NOT include them.
-            
-            FORMATTING RULES:
-            1. Output a NEWLINE-SEPARATED list. 
-            2. Group the items by grocery store aisles.
-            3. Before each group, add a header starting with three hashtags (e.g., ### Produce, ### Meat & Seafood).
-            4. Put each completely separate ingredient on its own line.
-            5. NEVER split a single ingredient across multiple lines.
-            6. You MAY use commas within an ingredient line.
-            7. Do not use bullet points, asterisks, or introductory text.
-            """
-
-            def get_grocery_list(prompt_text, list_name):
-                if not prompt_text.strip(): return []
-                resp = model.generate_content(system_prompt + "\nRecipes:\n" + prompt_text).text
-                items = [x.strip().title().lstrip("- ").lstrip("* ") for x in resp.split("\n") if x.strip()]
-                return [[list_name, item] for item in items]
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                f_house = executor.submit(get_grocery_list, household_text, "🏡 Household (Sun/Mon)")
-                f_cook1 = executor.submit(get_grocery_list, cook_text_1, "🧑‍🍳 Cook List 1 (Tues/Wed)")
-                f_cook2 = executor.submit(get_grocery_list, cook_text_2, "🧑‍🍳 Cook List 2 (Thurs/Fri)")
-                
-                rows_to_add.extend(f_house.result())
-                rows_to_add.extend(f_cook1.result())
-                rows_to_add.extend(f_cook2.result())
-                
-            if rows_to_add:
-                groceries_ws.append_rows(rows_to_add)
-            
-            fetch_all_records.clear("Groceries")
-            st.success("Lists successfully generated and synced to all devices!")
-            st.rerun()
+    compile_job = runner.get("compile groceries")
+    if st.button("✨ Compile AI Grocery Lists", type="primary", use_container_width=True, disabled=compile_job is not None and compile_job.active):
+        follow_job("compile groceries", compile_grocery_lists)
+    show_job("compile groceries")
             
     st.divider()
 
     if not groceries_data:
         st.info("Your grocery lists are empty. Hit the big compile button to generate them!")
     else:
-        list_categories = ["🏡 Household (Sun/Mon)", "🧑‍🍳 Cook List 1 (Tues/Wed)", "🧑‍🍳 Cook List 2 (Thurs/Fri)"]
-        
-        for category in list_categories:
-            items_in_category = [(i, row) for i, row in enumerate(groceries_data) if row["List Type"] == category]
+        bulk = st.toggle("🧺 Bulk shopping mode", key="bulk_groceries", help="Tick off everything you bought, then move it all to the pantry at once.")
+        if bulk:
+            item_keys = [row.key for row in groceries_data if not row.item.startswith("###")]
+            picked = set(ticked("pick_grocery_", item_keys))
+            col_b1, col_b2 = st.columns([3, 1])
+            with col_b1:
+                if st.button(f"🥫 Move {len(picked)} Ticked Items to Pantry", type="primary", disabled=not picked, use_container_width=True):
+                    move_to_pantry([row for row in groceries_data if row.key in picked], current_pantry)
+                    st.rerun()
+            with col_b2:
+                st.button("Clear Ticks", disabled=not picked, use_container_width=True, on_click=tick, args=("pick_grocery_", item_keys, False))
+
+        for category in grocery_lists.LIST_NAMES:
+            items_in_category = [row for row in groceries_data if row.list_type == category]
             
             if items_in_category:
                 st.subheader(category)
-                for original_index, row in items_in_category:
-                    item_text = str(row['Item'])
-                    
-                    if item_text.startswith("###"):
-                        header_name = item_text.replace("###", "").strip()
-                        st.markdown(f"<br>**🏷️ {header_name}**", unsafe_allow_html=True)
-                    else:
+                for header, aisle_rows in grocery_lists.aisles(items_in_category):
+                    if header is not None:
+                        header_name = header.item.replace("###", "").strip()
+                        if bulk and aisle_rows:
+                            col_h1, col_h2 = st.columns([4, 1])
+                            with col_h1:
+                                st.markdown(f"<br>**🏷️ {header_name}**", unsafe_allow_html=True)
+                            with col_h2:
+                                st.button("Tick Aisle", key=f"aisle_{header.key}", on_click=tick, args=("pick_grocery_", [row.key for row in aisle_rows]))
+                        else:
+                            st.markdown(f"<br>**🏷️ {header_name}**", unsafe_allow_html=True)
+
+                    for row in aisle_rows:
+                        item_text = row.item
+                        if bulk:
+                            st.checkbox(f"🛒 {item_text}", key=f"pick_grocery_{row.key}")
+                            continue
                         col_g1, col_g2 = st.columns([4, 1])
                         with col_g1:
                             st.write(f"🛒 {item_text}")
                         with col_g2:
-                            if st.button("To Pantry", key=f"buy_{original_index}"):
-                                clean_item = item_text.replace("*", "").strip().title()
-                                if clean_item and clean_item not in current_pantry:
-                                    pantry_ws.append_row([clean_item])
-                                    fetch_col_values.clear("Pantry", 1)
-                                groceries_ws.delete_rows(original_index + 2)
-                                fetch_all_records.clear("Groceries")
+                            if st.button("To Pantry", key=f"buy_{row.key}"):
+                                move_to_pantry([row], current_pantry)
                                 st.rerun()
                 st.write("---")
 
     st.subheader("➕ Add an Extra Item")
-    st.write("*(Note: Compiling the AI lists will reset this tab, so add your manual items after you compile!)*")
+    st.write("*(Manual items are kept when you recompile the AI lists.)*")
     
     col_m1, col_m2 = st.columns(2)
     with col_m1:
         manual_item = st.text_input("Item name:", placeholder="e.g., 1 Bag of Apples")
     with col_m2:
-        list_options = ["🏡 Household (Sun/Mon)", "🧑‍🍳 Cook List 1 (Tues/Wed)", "🧑‍🍳 Cook List 2 (Thurs/Fri)"]
-        target_list = st.selectbox("Which list?", list_options)
+        target_list = st.selectbox("Which list?", grocery_lists.LIST_NAMES)
         
     if st.button("Add Item to List", use_container_width=True):
         if manual_item:
             clean_manual = manual_item.replace("*", "").strip().title()
-            groceries_ws.append_row([target_list, clean_manual])
-            fetch_all_records.clear("Groceries")
-            st.rerun()
+            store.append_rows("Groceries", [[target_list, clean_manual, grocery_lists.MANUAL]])
+            rerun_fragment()
+
+@st.fragment
+def pantry_tab():
+    current_pantry = store.view("Pantry")
 
-with tab3:
     st.header("🥫 Virtual Pantry")
     col_add1, col_add2 = st.columns([3, 1])
     with col_add1:
@@ -447,15 +523,21 @@ with tab3:
             if new_item:
                 clean_item = new_item.replace("*", "").strip().title()
                 if clean_item and clean_item not in current_pantry:
-                    pantry_ws.append_row([clean_item])
-                    fetch_col_values.clear("Pantry", 1)
-                    st.rerun()
+                    store.append_rows("Pantry", [[clean_item]])
+                    rerun_fragment()
                 
     st.divider()
     
     st.subheader("Current Stock")
     if not current_pantry:
         st.info("Your pantry is currently empty.")
+    elif st.toggle("🧺 Select several", key="bulk_pantry"):
+        picked = ticked("pick_pantry_", current_pantry.keys)
+        if st.button(f"Use Up {len(picked)} Ticked Items", type="primary", disabled=not picked):
+            store.delete_keys("Pantry", picked)
+            rerun_fragment()
+        for i, item in enumerate(current_pantry):
+            st.checkbox(f"✅ {item}", key=f"pick_pantry_{current_pantry.keys[i]}")
     else:
         for i, item in enumerate(current_pantry):
             col_item1, col_item2 = st.columns([4, 1])
@@ -463,12 +545,13 @@ with tab3:
                 st.write(f"✅ {item}")
             with col_item2:
                 if st.button("Use Up", key=f"del_pantry_{item}_{i}"):
-                    row_to_delete = i + 2 
-                    pantry_ws.delete_rows(row_to_delete)
-                    fetch_col_values.clear("Pantry", 1)
-                    st.rerun()
+                    store.delete_row("Pantry", current_pantry.keys[i])
+                    rerun_fragment()
+
+@st.fragment
+def vault_tab():
+    vault_dict = store.view("Recipe Vault")
 
-with tab4:
     st.header("⭐ Recipe Vault")
     st.write("Your historical ratings inform the AI. 4 and 5-star meals will be suggested often. 1 and 2-star meals are banned.")
     
@@ -477,8 +560,7 @@ with tab4:
         new_recipe = st.text_area("Ingredients (List quantities for the Grocery Compiler!)", placeholder="- 1 lb Ground Turkey\n- 1 can Kidney Beans\n...")
         if st.button("Save 5-Star Favorite", use_container_width=True):
             if new_title and new_recipe:
-                vault_ws.append_row([new_title, new_recipe, "5"])
-                fetch_all_records.clear("Recipe Vault")
+                store.append_rows("Recipe Vault", [[new_title, new_recipe, "5", recipes.from_markdown(new_recipe, new_title).to_json()]])
                 st.rerun()
                 
     st.divider()
@@ -486,23 +568,36 @@ with tab4:
     if not vault_dict:
         st.info("Your vault is empty. Rate meals on the Schedule tab to build your database!")
     else:
-        for title, data in vault_dict.items():
-            stars = "⭐" * int(data["rating"])
+        col_s1, col_s2 = st.columns([3, 2])
+        with col_s1:
+            vault_query = st.text_input("Search by meal or ingredient:", key="vault_query", placeholder="e.g., tacos, salmon...", on_change=reset_vault_page)
+        with col_s2:
+            rating_filter = st.selectbox("Show:", list(vault_search.RATING_FILTERS), key="vault_filter", on_change=reset_vault_page)
+
+        # Only the current page's widgets are built, however large the vault gets.
+        matches = vault_index().search(vault_query, vault_search.RATING_FILTERS[rating_filter])
+        page_count = max(1, math.ceil(len(matches) / VAULT_PAGE_SIZE))
+        page = min(st.session_state.vault_page, page_count - 1)
+        if not matches:
+            st.info("No vault meals match that search.")
+
+        for title in matches[page * VAULT_PAGE_SIZE:(page + 1) * VAULT_PAGE_SIZE]:
+            data = vault_dict[title]
+            stars = "⭐" * int(data.rating)
             with st.expander(f"{stars} {title}"):
                 st.write("**Ingredients / Portions:**")
-                edited_vault_recipe = st.text_area("Adjust portions here so future uses are perfectly scaled:", value=data["recipe"], height=150, key=f"edit_vault_{title}")
+                edited_vault_recipe = st.text_area("Adjust portions here so future uses are perfectly scaled:", value=data.recipe, height=150, key=f"edit_vault_{title}")
                 
                 if st.button("Save Portion Edits", key=f"save_portion_{title}"):
-                    if edited_vault_recipe != data["recipe"]:
-                        vault_ws.update_cell(data["row_index"], 2, edited_vault_recipe)
-                        fetch_all_records.clear("Recipe Vault")
-                        st.rerun()
+                    if edited_vault_recipe != data.recipe:
+                        store.update_row("Recipe Vault", data.key, {2: edited_vault_recipe, 4: recipes.from_markdown(edited_vault_recipe, title).to_json()}, expected={2: data.recipe})
+                        rerun_fragment()
                 
                 st.divider()
                 col_u1, col_u2 = st.columns(2)
                 with col_u1:
                     rating_options = ["5 (Love)", "4 (Like)", "3 (Okay)", "2 (Dislike)", "1 (Never Again)"]
-                    current_val = str(data["rating"])
+                    current_val = str(data.rating)
                     default_idx = next((i for i, opt in enumerate(rating_options) if opt.startswith(current_val)), 0)
                     new_rating = st.selectbox("Change Rating:", rating_options, index=default_idx, key=f"edit_rate_{title}")
                 with col_u2:
@@ -510,43 +605,52 @@ with tab4:
                     st.write("")
                     if st.button("Update Rating", key=f"upd_vault_{title}", use_container_width=True):
                         if new_rating[0] != current_val:
-                            vault_ws.update_cell(data["row_index"], 3, new_rating[0])
-                            fetch_all_records.clear("Recipe Vault")
-                            st.rerun()
+                            store.update_row("Recipe Vault", data.key, {3: new_rating[0]}, expected={3: current_val})
+                            rerun_fragment()
                 
                 if st.button("Delete from Vault", key=f"del_vault_{title}"):
-                    vault_ws.delete_rows(data["row_index"])
-                    fetch_all_records.clear("Recipe Vault")
+                    store.delete_row("Recipe Vault", data.key)
                     st.rerun()
 
-with tab5:
+        if page_count > 1:
+            col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+            with col_p1:
+                if st.button("◀ Previous", disabled=page == 0, use_container_width=True):
+                    st.session_state.vault_page = page - 1
+                    rerun_fragment()
+            with col_p2:
+                st.caption(f"Page {page + 1} of {page_count} ({len(matches)} meals)")
+            with col_p3:
+                if st.button("Next ▶", disabled=page >= page_count - 1, use_container_width=True):
+                    st.session_state.vault_page = page + 1
+                    rerun_fragment()
+
+@st.fragment
+def voila_tab():
+    current_voila = store.view("Voila")
+
     st.header("🚚 Voila Delivery List")
     st.write("Manage your weekly Sobeys order. Add an item, and Chef Gemini will automatically combine matching quantities!")
     
     if st.session_state.voila_pending:
-        st.warning(f"⚠️ **Duplicate Detected!** It looks like you already have something similar to **'{st.session_state.voila_item}'** in your cart.")
+        merge_key, merged_line, seen_line = st.session_state.voila_merge
+        st.warning(f"⚠️ **Duplicate Detected!** It looks like you already have something similar to **'{st.session_state.voila_item}'** in your cart. Combined, it would read **'{merged_line}'**.")
         
         col_c1, col_c2, col_c3 = st.columns(3)
         with col_c1:
             if st.button("✅ Combine Them", use_container_width=True):
-                voila_ws.clear()
-                voila_ws.append_row(["Item"])
-                rows_to_add = [[item] for item in st.session_state.voila_new_cart]
-                if rows_to_add:
-                    voila_ws.append_rows(rows_to_add)
-                fetch_col_values.clear("Voila", 1)
+                store.update_row("Voila", merge_key, {1: merged_line}, expected={1: seen_line})
                 st.session_state.voila_pending = False
-                st.rerun()
+                rerun_fragment()
         with col_c2:
             if st.button("➕ Add Separately", use_container_width=True):
-                voila_ws.append_row([st.session_state.voila_item])
-                fetch_col_values.clear("Voila", 1)
+                store.append_rows("Voila", [[st.session_state.voila_item]])
                 st.session_state.voila_pending = False
-                st.rerun()
+                rerun_fragment()
         with col_c3:
             if st.button("❌ Cancel", use_container_width=True):
                 st.session_state.voila_pending = False
-                st.rerun()
+                rerun_fragment()
         st.divider()
         
     else:
@@ -562,43 +666,55 @@ with tab5:
                         clean_voila = new_voila.replace("*", "").strip().title()
                         
                         if not current_voila:
-                            voila_ws.append_row([clean_voila])
-                            fetch_col_values.clear("Voila", 1)
-                            st.rerun()
+                            store.append_rows("Voila", [[clean_voila]])
+                            rerun_fragment()
                         else:
-                            cart_string = "\n".join(current_voila)
-                            prompt = f"""
-                            Here is my current grocery cart:
-                            {cart_string}
-                            
-                            I want to add this new item: "{clean_voila}"
+                            verdict, match, merged_line = cart_match.CartIndex(current_voila).match(clean_voila)
                             
-                            INSTRUCTIONS:
-                            1. Does the new item match (or is it essentially the same as) an item already in the cart? Answer exactly "DUPLICATE: YES" or "DUPLICATE: NO" on the first line.
-                            2. If YES, combine their quantities mathematically. If NO, simply add the new item to the bottom of the list.
-                            3. From the second line onwards, provide the final updated cart as a newline-separated list with NO bullet points, asterisks, or extra text. Capitalize each item.
-                            """
-                            response = model.generate_content(prompt)
-                            lines = response.text.strip().split("\n")
+                            # Only genuinely unclear items reach Gemini, and only with the close candidates.
+                            if verdict == "ambiguous":
+                                candidates = "\n".join(f"{n + 1}. {current_voila[p]}" for n, p in enumerate(match))
+                                prompt = f"""
+                                These items are already in my grocery cart:
+                                {candidates}
+                                
+                                I want to add this new item: "{clean_voila}"
+                                
+                                INSTRUCTIONS:
+                                1. Is the new item essentially the same product as one of the numbered items? Answer exactly "DUPLICATE: YES" or "DUPLICATE: NO" on the first line.
+                                2. If YES, put the number of the matching item on the second line.
+                                3. If YES, put the single combined item on the third line, with the quantities combined mathematically.
+                                4. Use NO bullet points, asterisks, or extra text. Capitalize the item.
+                                """
+                                lines = [x.strip() for x in ai.generate("voila_merge", prompt).strip().split("\n") if x.strip()]
+                                number = "".join(ch for ch in lines[1] if ch.isdigit()) if len(lines) > 2 else ""
+                                
+                                if "YES" in lines[0].upper() and number and 1 <= int(number) <= len(match):
+                                    verdict, match, merged_line = "duplicate", match[int(number) - 1], lines[2].title().lstrip("- ").lstrip("* ")
+                                else:
+                                    verdict = "new"
                             
-                            is_duplicate = "YES" in lines[0].upper()
-                            updated_cart = [x.strip().title().lstrip("- ").lstrip("* ") for x in lines[1:] if x.strip()]
-                            
-                            if is_duplicate:
+                            if verdict == "duplicate":
                                 st.session_state.voila_pending = True
                                 st.session_state.voila_item = clean_voila
-                                st.session_state.voila_new_cart = updated_cart
-                                st.rerun()
+                                st.session_state.voila_merge = (current_voila.keys[match], merged_line, current_voila[match])
+                                rerun_fragment()
                             else:
-                                voila_ws.append_row([clean_voila])
-                                fetch_col_values.clear("Voila", 1)
-                                st.rerun()
+                                store.append_rows("Voila", [[clean_voila]])
+                                rerun_fragment()
                 
     st.divider()
     
     st.subheader("Current Cart")
     if not current_voila:
         st.info("Your Voila list is empty.")
+    elif st.toggle("🧺 Select several", key="bulk_voila"):
+        picked = ticked("pick_voila_", current_voila.keys)
+        if st.button(f"Remove {len(picked)} Ticked Items", type="primary", disabled=not picked):
+            store.delete_keys("Voila", picked)
+            rerun_fragment()
+        for i, item in enumerate(current_voila):
+            st.checkbox(f"📦 {item}", key=f"pick_voila_{current_voila.keys[i]}")
     else:
         for i, item in enumerate(current_voila):
             col_vitem1, col_vitem2 = st.columns([4, 1])
@@ -606,12 +722,13 @@ with tab5:
                 st.write(f"📦 {item}")
             with col_vitem2:
                 if st.button("Remove", key=f"del_voila_{item}_{i}"):
-                    row_to_delete = i + 2 
-                    voila_ws.delete_rows(row_to_delete)
-                    fetch_col_values.clear("Voila", 1)
-                    st.rerun()
+                    store.delete_row("Voila", current_voila.keys[i])
+                    rerun_fragment()
+
+@st.fragment
+def settings_tab():
+    diet_prefs = store.view("Settings")
 
-with tab6:
     st.header("⚙️ App Settings")
     st.write("Tell Chef Gemini exactly how to cook for your family. Update this anytime your diet or portion sizes change!")
     
@@ -619,7 +736,88 @@ with tab6:
     
     if st.button("Save Settings", type="primary"):
         if new_diet_prefs != diet_prefs:
-            settings_ws.update_cell(2, 2, new_diet_prefs)
-            fetch_all_records.clear("Settings")
+            store.update_row("Settings", "Diet & Portions", {2: new_diet_prefs}, expected={2: diet_prefs})
             st.success("Settings saved! Chef Gemini will use these rules for all future meals.")
-            st.rerun()
\ No newline at end of file
+            rerun_fragment()
+    st.divider()
+    cache_stats = ai.cache.stats()
+    cache_hits = sum(site["hits"] for site in cache_stats["sites"].values())
+    cache_misses = sum(site["misses"] for site in cache_stats["sites"].values())
+    st.caption(f"🧠 AI answer cache: {cache_stats['entries']} saved answers, {cache_hits} hits / {cache_misses} misses since the server started.")
+
+    # Hidden unless the page is opened with ?diagnostics=1
+    if st.query_params.get("diagnostics"):
+        diagnostics_panel()
+
+def diagnostics_panel():
+    with st.expander("🩺 Diagnostics", expanded=True):
+        recent = tracer.last_minute()
+        col_d1, col_d2, col_d3 = st.columns(3)
+        col_d1.metric("Sheets reads / min", f"{recent['read']} of {tracing.SHEETS_QUOTAS['read']}")
+        col_d2.metric("Sheets writes / min", f"{recent['write']} of {tracing.SHEETS_QUOTAS['write']}")
+        col_d3.metric("Gemini calls / min", f"{recent['gemini']} of {households.settings(st.secrets, household)['GEMINI_RPM']}")
+
+        st.write("**Latest script runs** (API calls made until the next run)")
+        st.dataframe(tracer.runs(), hide_index=True, use_container_width=True)
+        st.write("**Where the time goes**")
+        st.dataframe(tracer.summary(), hide_index=True, use_container_width=True)
+        st.write("**Local caches**")
+        st.dataframe(tracer.cache_rates(), hide_index=True, use_container_width=True)
+        st.caption(f"Gemini: {ai.model.calls} calls, {ai.model.retried} retried. Sheets sync: {store.engine.pushes} pushes, {store.engine.pulls} pulls, {store.engine.checks} change checks. Jobs: {runner.started} started, {runner.joined} joined a run already under way.")
+        st.download_button("⬇️ Export trace (JSON lines)", tracer.export_jsonl(), file_name="meal-planner-trace.jsonl", mime="application/x-ndjson")
+
+# --- HEADER ---
+col_h1, col_h2 = st.columns([4, 1])
+with col_h1:
+    st.title("🍳 Household Meal Planner")
+with col_h2:
+    st.write("") 
+    if st.button("🔄 Sync App", use_container_width=True):
+        store.refresh()
+        st.rerun()
+
+# Edits another device beat to the same row, or that Sheets refused, were dropped on push; say so once per session.
+if 'seen_conflicts' not in st.session_state:
+    st.session_state.seen_conflicts = len(store.conflicts)
+if len(store.conflicts) > st.session_state.seen_conflicts:
+    st.warning(f"🔀 {len(store.conflicts) - st.session_state.seen_conflicts} change(s) were not saved: they clashed with edits made on another device, or Google Sheets refused them. You're now seeing the latest version.")
+    st.session_state.seen_conflicts = len(store.conflicts)
+
+if store.last_error is not None:
+    st.warning(f"⏳ {store.pending_count()} change(s) not yet saved to Google Sheets. Retrying automatically... ({store.last_error})")
+        
+st.divider()
+
+# --- TABS ---
+def schedule_tab():
+    fill_job = runner.get("auto-fill week")
+    if st.button("✨ Auto-Fill Magic Week", type="primary", use_container_width=True, disabled=fill_job is not None and fill_job.active):
+        follow_job("auto-fill week", auto_fill_week)
+    show_job("auto-fill week")
+
+    st.write("---")
+    
+    st.header("This Week's Schedule")
+    for day in store.view("Schedule"):
+        day_card(day)
+
+SECTIONS = {
+    "📅 Schedule": schedule_tab,
+    "🛒 Groceries": groceries_tab,
+    "🥫 Pantry": pantry_tab,
+    "⭐ Vault": vault_tab,
+    "🚚 Voila": voila_tab,
+    "⚙️ Settings": settings_tab,
+}
+
+def keep_section():
+    # Clicking the open section again would clear the control; keep that section open.
+    if st.session_state.section is None:
+        st.session_state.section = st.session_state.open_section
+    st.session_state.open_section = st.session_state.section
+
+# Unlike st.tabs, only the open section is built, so a rerun reads and renders just its tabs.
+st.segmented_control("Section", list(SECTIONS), key="section", on_change=keep_section, label_visibility="collapsed")
+SECTIONS[st.session_state.section]()
+
+tracer.end(st.session_state.pop("trace_run")[1])
\ No newline at end of file
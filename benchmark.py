@@ -0,0 +1,350 @@
+"""Offline benchmark of the planner's interactions.
+
+Runs app.py through Streamlit's AppTest against fakes.FakeSpreadsheet and
+fakes.FakeGenerativeModel, so no Google account or API key is needed:
+
+    python benchmark.py                                  # every dataset size
+    python benchmark.py --vault 1000 --sheets-latency 0.3 --gemini-latency 2
+    python benchmark.py --output before.json             # save results
+    python benchmark.py --compare before.json            # deltas against a saved run
+
+For every interaction it reports the wall time of the script run, the time until the
+background work it started (sync pushes, pool refills) has finished, the Sheets reads and
+writes and Gemini calls made in between, and the peak memory traced during the run.
+Datasets are generated from a fixed seed, so runs on different commits are comparable.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import google.generativeai as genai
+import gspread
+import streamlit as st
+from google.oauth2.service_account import Credentials
+from streamlit.testing.v1 import AppTest
+
+import fakes
+import grocery_lists
+import local_store
+import recipes
+import sheets
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+PROTEINS = ["Chicken", "Salmon", "Tofu", "Turkey", "Lentil", "Shrimp", "Beef", "Chickpea", "Pork", "Tempeh"]
+STYLES = ["Tacos", "Curry", "Stir-Fry", "Pasta", "Chili", "Bowl", "Soup", "Skillet", "Salad", "Casserole"]
+CUISINES = ["Thai", "Greek", "Mexican", "Korean", "Italian", "Indian", "Cajun", "Moroccan", "Japanese", "Lebanese"]
+PRODUCE = ["Onion", "Garlic", "Bell Pepper", "Spinach", "Carrot", "Zucchini", "Tomato", "Lime", "Cilantro", "Broccoli",
+           "Sweet Potato", "Mushroom", "Celery", "Ginger", "Kale", "Cucumber", "Lemon", "Green Onion", "Cabbage", "Corn"]
+STAPLES = ["Soy Sauce", "Cumin", "Paprika", "Oregano", "Chili Flakes", "Rice Vinegar", "Honey", "Mustard", "Flour",
+           "Brown Sugar", "Coconut Milk", "Chicken Stock", "Tomato Paste", "Sesame Oil", "Maple Syrup", "Basil", "Thyme"]
+
+
+# --- DATASETS ---
+def _recipe(rng, title):
+    items = [
+        recipes.ingredient_from_line(f"{rng.choice(['1', '1 1/2', '2'])} lb {title.split()[-2].lower()}"),
+        recipes.ingredient_from_line(f"{rng.randint(1, 3)} cups rice"),
+    ]
+    for name in rng.sample(PRODUCE, 4):
+        items.append(recipes.ingredient_from_line(f"{rng.randint(1, 4)} {name.lower()}"))
+    items.append(recipes.ingredient_from_line("Salt and pepper to taste"))
+    return recipes.Recipe(title, "", tuple(items))
+
+
+def dataset(vault, pantry, groceries, seed=0):
+    """Tabs for a FakeSpreadsheet at the given sizes, already at the current schema version."""
+    rng = random.Random(seed)
+
+    def new_id():
+        return f"id-{rng.getrandbits(40):010x}"
+    titles = [" ".join(words) for words in itertools.product(CUISINES, PROTEINS, STYLES)]
+    rng.shuffle(titles)
+
+    schedule = [sheets.TAB_HEADERS["Schedule"]]
+    for day, status in zip(DAYS, [row[1] for row in sheets.DEFAULT_SCHEDULE]):
+        recipe = _recipe(rng, titles[len(schedule)])._replace(description="Planned for the benchmark.")
+        schedule.append([day, status, recipe.to_markdown(), recipe.to_json()])
+
+    vault_rows = [sheets.TAB_HEADERS["Recipe Vault"]]
+    for i in range(vault):
+        recipe = _recipe(rng, titles[(i + 10) % len(titles)] + ("" if i + 10 < len(titles) else f" {i}"))
+        vault_rows.append([recipe.title, recipe.ingredients_markdown(), str(rng.randint(1, 5)), recipe.to_json(), new_id()])
+
+    names = [" ".join(words) for words in itertools.product(["", "Organic ", "Fresh "], STAPLES + PRODUCE)]
+    pantry_rows = [sheets.TAB_HEADERS["Pantry"]] + [[name.strip() or f"Staple {i}", new_id()] for i, name in zip(range(pantry), itertools.cycle(names))]
+
+    grocery_rows = [sheets.TAB_HEADERS["Groceries"]]
+    for i in range(groceries):
+        list_name = grocery_lists.LIST_NAMES[i * len(grocery_lists.LIST_NAMES) // max(groceries, 1)]
+        item = "### Produce" if i % 10 == 0 else f"{rng.randint(1, 4)} {rng.choice(PRODUCE)}"
+        grocery_rows.append([list_name, item, "benchmark", new_id()])
+
+    return {
+        "Schedule": schedule,
+        "Pantry": pantry_rows,
+        "Recipe Vault": vault_rows,
+        "Voila": [sheets.TAB_HEADERS["Voila"]] + [[f"{rng.randint(1, 3)} {name}", new_id()] for name in PRODUCE[:10]],
+        "Settings": [
+            sheets.TAB_HEADERS["Settings"],
+            ["Diet & Portions", sheets.DEFAULT_DIET],
+            [sheets.SCHEMA_VERSION_KEY, str(sheets.SCHEMA_VERSION)],
+        ],
+        "Groceries": grocery_rows,
+        sheets.REVISION_TAB: [sheets.TAB_HEADERS[sheets.REVISION_TAB]] + [[name, "0"] for name in sheets.TRACKED_TABS],
+    }
+
+
+# --- HARNESS ---
+class Backend:
+    """Fake Sheets and Gemini behind the app for one dataset, patched into the client libraries."""
+
+    def __init__(self, tabs, sheets_latency, gemini_latency):
+        self.spreadsheet = fakes.FakeSpreadsheet(tabs, latency=sheets_latency)
+        self.model = fakes.FakeGenerativeModel(latency=gemini_latency)
+        self.directory = tempfile.mkdtemp(prefix="planner-bench-")
+        self.store = local_store.LocalStore(os.path.join(self.directory, "mirror.sqlite3"))
+
+        spreadsheet = self.spreadsheet
+
+        class Client:
+            def open_by_url(self, url):
+                return spreadsheet
+
+        gspread.authorize = lambda creds, *args, **kwargs: Client()
+        Credentials.from_service_account_info = classmethod(lambda cls, info, **kwargs: None)
+        genai.configure = lambda **kwargs: None
+        genai.GenerativeModel = lambda *args, **kwargs: self.model
+        # Clients, the mirror and the recipe pool are process-wide resources; start each dataset fresh.
+        st.cache_resource.clear()
+
+    def app(self):
+        at = AppTest.from_file(APP, default_timeout=120)
+        at.secrets["GEMINI_API_KEY"] = "benchmark"
+        at.secrets["GCP_SERVICE_ACCOUNT"] = "{}"
+        at.secrets["SHEET_URL"] = "benchmark"
+        at.secrets["LOCAL_DB_PATH"] = os.path.join(self.directory, "mirror.sqlite3")
+        at.secrets["AI_CACHE_PATH"] = os.path.join(self.directory, "gemini_cache.sqlite3")
+        return at
+
+    def idle(self):
+        return self.model.in_flight == 0 and self.store.pending_count() == 0
+
+    def settle(self, timeout=60.0):
+        """Waits for queued edits to be pushed and Gemini calls to return."""
+        deadline = time.monotonic() + timeout
+        quiet = 0
+        # Background threads may not have started their call yet, so idle must hold twice.
+        while quiet < 2 and time.monotonic() < deadline:
+            quiet = quiet + 1 if self.idle() else 0
+            time.sleep(0.05)
+
+
+def _button(at, label=None, key=None):
+    for button in at.button:
+        if (label is None or button.label == label) and (key is None or button.key == key):
+            return button
+    return None
+
+
+def _click(at, label=None, key=None):
+    button = _button(at, label, key)
+    if button is None:
+        return None
+    return button.click().run()
+
+
+def _open(section):
+    """Action switching the page to section (see app.SECTIONS)."""
+    return lambda at: at.button_group(key="section").set_value(section).run()
+
+
+def _until_done(at, poll=0.5):
+    """Reruns the page until no background job shows progress, as its own polling fragment would."""
+    while at is not None and at.get("progress"):
+        time.sleep(poll)
+        at.run()
+    return at
+
+
+def _to_pantry(at):
+    keys = [button.key for button in at.button if button.key and button.key.startswith("buy_")]
+    return _click(at, key=keys[0]) if keys else None
+
+
+def _bulk_shop(at, count=40):
+    """Ticks up to count groceries in bulk shopping mode and moves them to the pantry together."""
+    at.toggle(key="bulk_groceries").set_value(True).run()
+    boxes = [box for box in at.checkbox if box.key and box.key.startswith("pick_grocery_")][:count]
+    if not boxes:
+        return None
+    for box in boxes:
+        box.check()
+    at.run()
+    return _click(at, label=f"🥫 Move {len(boxes)} Ticked Items to Pantry")
+
+
+def _add_pantry_item(at):
+    for text_input in at.text_input:
+        if text_input.label == "Add a staple to your pantry:":
+            text_input.set_value("Benchmark Beans")
+            return _click(at, label="Add Item")
+    return None
+
+
+# Interaction name -> action on the running AppTest, in the order they are run. An action
+# returning None was not possible at this dataset size (e.g. no second vault page).
+INTERACTIONS = [
+    ("cold start", lambda at: at.run()),
+    ("warm rerun", lambda at: at.run()),
+    ("generate new meal", lambda at: _click(at, key="btn_Monday")),
+    ("auto-fill week", lambda at: _until_done(_click(at, label="✨ Auto-Fill Magic Week"))),
+    ("open vault", _open("⭐ Vault")),
+    ("vault search", lambda at: at.text_input(key="vault_query").set_value("chicken").run()),
+    ("vault next page", lambda at: _click(at, label="Next ▶")),
+    ("open groceries", _open("🛒 Groceries")),
+    ("compile groceries", lambda at: _until_done(_click(at, label="✨ Compile AI Grocery Lists"))),
+    ("grocery to pantry", _to_pantry),
+    ("bulk shop 40 items", _bulk_shop),
+    ("open pantry", _open("🥫 Pantry")),
+    ("add pantry item", _add_pantry_item),
+]
+
+
+def measure(backend, at, action, memory):
+    sheets_before = len(backend.spreadsheet.calls)
+    gemini_before = len(backend.model.calls)
+    if memory:
+        tracemalloc.reset_peak()
+    random.seed(0)
+    started = time.perf_counter()
+    result = action(at)
+    wall = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    backend.settle()
+    settled = time.perf_counter() - started
+    if result is None:
+        return {"skipped": True}
+
+    calls = backend.spreadsheet.calls[sheets_before:]
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        "settled_ms": round(settled * 1000, 1),
+        "sheets_reads": sum(1 for kind, _ in calls if kind in ("read", "meta")),
+        "sheets_writes": sum(1 for kind, _ in calls if kind == "write"),
+        "gemini_calls": len(backend.model.calls) - gemini_before,
+        "peak_kib": round(peak / 1024) if peak is not None else None,
+        "error": str(at.exception[0].value) if at.exception else None,
+    }
+
+
+def run_dataset(sizes, args):
+    vault, pantry, groceries = sizes
+    backend = Backend(dataset(vault, pantry, groceries), args.sheets_latency, args.gemini_latency)
+    at = backend.app()
+    results = []
+    for name, action in INTERACTIONS:
+        result = measure(backend, at, action, args.memory)
+        results.append({"vault": vault, "pantry": pantry, "groceries": groceries, "interaction": name, **result})
+    return results
+
+
+def _median(rows):
+    """Collapses repeats of one measurement into their median."""
+    if any(row.get("skipped") for row in rows):
+        return dict(rows[0], skipped=True)
+    merged = dict(rows[0])
+    for field in ("wall_ms", "settled_ms", "sheets_reads", "sheets_writes", "gemini_calls", "peak_kib"):
+        if merged[field] is not None:
+            merged[field] = statistics.median(row[field] for row in rows)
+    merged["error"] = next((row["error"] for row in rows if row["error"]), None)
+    return merged
+
+
+# --- REPORTING ---
+COLUMNS = [("interaction", 18), ("wall_ms", 9), ("settled_ms", 10), ("sheets_reads", 6), ("sheets_writes", 6), ("gemini_calls", 6), ("peak_kib", 9)]
+HEADINGS = {"sheets_reads": "reads", "sheets_writes": "writes", "gemini_calls": "gemini", "peak_kib": "peak KiB", "settled_ms": "settled_ms"}
+
+
+def _key(row):
+    return row["vault"], row["pantry"], row["groceries"], row["interaction"]
+
+
+def print_report(results, baseline=None):
+    previous = {_key(row): row for row in (baseline or {}).get("results", [])}
+    dataset_key = None
+    for row in results:
+        if (row["vault"], row["pantry"], row["groceries"]) != dataset_key:
+            dataset_key = (row["vault"], row["pantry"], row["groceries"])
+            print(f"\nvault={row['vault']} pantry={row['pantry']} groceries={row['groceries']}")
+            print("  ".join(HEADINGS.get(name, name).rjust(width) for name, width in COLUMNS))
+        if row.get("skipped"):
+            print(row["interaction"].rjust(18) + "  (not possible at this size)")
+            continue
+        cells = []
+        for name, width in COLUMNS:
+            value = row[name]
+            before = previous.get(_key(row), {}).get(name)
+            if value is None:
+                value = "-"
+            elif name.endswith("_ms") and before:
+                value = f"{value:g} ({(value - before) / before:+.0%})"
+            elif name != "interaction" and before is not None and before != value:
+                value = f"{value:g} ({value - before:+g})"
+            elif name != "interaction":
+                value = f"{value:g}"
+            cells.append(str(value).rjust(width))
+        print("  ".join(cells) + (f"  ERROR: {row['error']}" if row["error"] else ""))
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planner against fake Sheets and Gemini backends.")
+    parser.add_argument("--vault", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--pantry", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--groceries", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="seconds per Sheets request")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="seconds per Gemini request")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per dataset; the median is reported")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to show deltas against")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        tracemalloc.start()
+    results = []
+    for sizes in itertools.product(args.vault, args.pantry, args.groceries):
+        runs = [run_dataset(sizes, args) for _ in range(args.repeat)]
+        results += [_median(list(rows)) for rows in zip(*runs)]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        settings = {name: getattr(args, name) for name in ("sheets_latency", "gemini_latency", "repeat", "memory")}
+        with open(args.output, "w") as f:
+            json.dump({"commit": _commit(), "settings": settings, "results": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
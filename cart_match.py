@@ -0,0 +1,129 @@
+"""Local duplicate detection for the Voila cart.
+
+Cart lines are indexed by normalized ingredient name (plural and synonym folded) and by
+character trigrams. A new item is either clearly new, clearly the same as one line
+(quantities are then merged here), or ambiguous - only that last case needs Gemini,
+and then only with the few candidate lines.
+"""
+import re
+from fractions import Fraction
+
+import ingredients
+
+# Different names for the same product, folded onto the right-hand spelling.
+SYNONYMS = {
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "garbanzo bean": "chickpea",
+    "coriander leaf": "cilantro",
+    "courgette": "zucchini",
+    "aubergine": "eggplant",
+    "capsicum": "bell pepper",
+    "pop": "soda",
+    "soft drink": "soda",
+    "crisp": "chip",
+    "tp": "toilet paper",
+    "bathroom tissue": "toilet paper",
+    "kleenex": "tissue",
+    "paper towel roll": "paper towel",
+    "yoghurt": "yogurt",
+    "mince": "ground beef",
+    "minced beef": "ground beef",
+    "hamburger meat": "ground beef",
+}
+
+MATCH_SCORE = 0.8
+NO_MATCH_SCORE = 0.3
+MAX_CANDIDATES = 3
+
+
+def match_key(name):
+    key = ingredients.name_key(name)
+    for phrase, canonical in SYNONYMS.items():
+        key = re.sub(rf"\b{re.escape(phrase)}\b", canonical, key)
+    return key
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Blend of word overlap and trigram overlap between two match keys, 0..1."""
+    if a == b:
+        return 1.0
+    words_a, words_b = set(a.split()), set(b.split())
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    word_score = len(words_a & words_b) / len(words_a | words_b) if words_a | words_b else 0.0
+    gram_score = len(grams_a & grams_b) / len(grams_a | grams_b) if grams_a | grams_b else 0.0
+    return max(word_score, gram_score)
+
+
+def _parse(line):
+    parsed = ingredients.parse_line(line)
+    if parsed is None:
+        return None, "", line.strip()
+    return parsed
+
+
+def merge_lines(existing, new):
+    """Combined cart line for two lines naming the same product, or None when their units
+    cannot be added together (e.g. "2 Cartons Milk" and "1 L Milk")."""
+    quantity_a, unit_a, name = _parse(existing)
+    quantity_b, unit_b, _ = _parse(new)
+    quantity_a = Fraction(1) if quantity_a is None else quantity_a
+    quantity_b = Fraction(1) if quantity_b is None else quantity_b
+    dimension_a, size_a = ingredients.unit_dimension(unit_a)
+    dimension_b, size_b = ingredients.unit_dimension(unit_b)
+    if dimension_a != dimension_b:
+        return None
+    total = quantity_a + quantity_b * size_b / size_a
+    return f"{ingredients.format_amount(total, unit_a)} {name}".strip().title()
+
+
+class CartIndex:
+    def __init__(self, cart):
+        self.cart = list(cart)
+        self.keys = [match_key(_parse(line)[2]) for line in self.cart]
+        self.by_key = {}
+        self.by_gram = {}
+        for position, key in enumerate(self.keys):
+            self.by_key.setdefault(key, []).append(position)
+            for gram in trigrams(key):
+                self.by_gram.setdefault(gram, set()).add(position)
+
+    def candidates(self, key):
+        """Cart positions sharing any trigram with key, best match first."""
+        positions = set()
+        for gram in trigrams(key):
+            positions |= self.by_gram.get(gram, set())
+        scored = [(similarity(key, self.keys[p]), p) for p in positions]
+        return sorted(scored, reverse=True)
+
+    def match(self, item):
+        """Classifies a new item against the cart.
+
+        Returns ("new", None, None), ("duplicate", position, merged_line) or
+        ("ambiguous", [positions], None).
+        """
+        key = match_key(_parse(item)[2])
+        if not key:
+            return "new", None, None
+        if key in self.by_key:
+            position = self.by_key[key][0]
+            merged = merge_lines(self.cart[position], item)
+            if merged is not None:
+                return "duplicate", position, merged
+            return "ambiguous", [position], None
+
+        scored = self.candidates(key)
+        if not scored or scored[0][0] < NO_MATCH_SCORE:
+            return "new", None, None
+        best_score, best = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        if best_score >= MATCH_SCORE and runner_up < NO_MATCH_SCORE:
+            merged = merge_lines(self.cart[best], item)
+            if merged is not None:
+                return "duplicate", best, merged
+        return "ambiguous", [p for score, p in scored[:MAX_CANDIDATES] if score >= NO_MATCH_SCORE], None
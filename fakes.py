@@ -0,0 +1,257 @@
+"""In-memory stand-ins for the parts of the gspread and Gemini APIs the planner uses.
+
+Useful for exercising the sync engine and the app without a Google account:
+
+    db = FakeSpreadsheet({"Pantry": [["Item"], ["Salt"]]})
+    store = LocalStore(":memory:")
+    engine = SyncEngine(db, {ws.title: ws for ws in db.worksheets()}, store)
+
+Every call is appended to `calls` as (kind, target) so tests can count API traffic.
+Both fakes take a latency in seconds that every request sleeps for, standing in for
+the network (see benchmark.py).
+"""
+import json
+import re
+import threading
+import time
+
+import gspread
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter.upper()) - 64
+    return index
+
+
+def _cell_text(cell):
+    value = cell.get("userEnteredValue", {})
+    for kind in ("stringValue", "numberValue", "boolValue", "formulaValue"):
+        if kind in value:
+            number = value[kind]
+            if kind == "numberValue" and float(number).is_integer():
+                number = int(number)
+            return str(number)
+    return ""
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, values=None):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.values = [[str(cell) for cell in row] for row in (values or [])]
+        self.col_count = 26
+
+    def _log(self, kind):
+        self.spreadsheet._request(kind, self.title)
+
+    def _trimmed(self):
+        while self.values and not any(self.values[-1]):
+            self.values.pop()
+        return self.values
+
+    def _set(self, row, col, value):
+        while len(self.values) < row:
+            self.values.append([])
+        cells = self.values[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = str(value)
+
+    # Reads
+    def get_all_values(self):
+        self._log("read")
+        return [list(row) for row in self._trimmed()]
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        if len(values) < 2:
+            return []
+        header = values[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in values[1:]]
+
+    def col_values(self, col):
+        self._log("read")
+        return [row[col - 1] if len(row) >= col else "" for row in self._trimmed()]
+
+    # Writes
+    def update_cell(self, row, col, value):
+        self._log("write")
+        self._set(row, col, value)
+
+    def update_cells(self, cells, value_input_option=None):
+        self._log("write")
+        for cell in cells:
+            self._set(cell.row, cell.col, cell.value)
+
+    def append_row(self, values, value_input_option=None):
+        self.append_rows([values])
+
+    def append_rows(self, values, value_input_option=None):
+        self._log("write")
+        self._trimmed().extend([str(cell) for cell in row] for row in values)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._log("write")
+        del self.values[start_index - 1:end_index or start_index]
+
+    def add_cols(self, cols):
+        self._log("meta")
+        self.col_count += cols
+
+    def clear(self):
+        self._log("write")
+        self.values = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, tabs=None, latency=0.0):
+        self.calls = []
+        self.latency = latency
+        self._sheets = {}
+        for title, values in (tabs or {}).items():
+            self._add(title, values)
+
+    def _add(self, title, values=None):
+        sheet = FakeWorksheet(self, len(self._sheets) + 1, title, values)
+        self._sheets[title] = sheet
+        return sheet
+
+    def _request(self, kind, target):
+        self.calls.append((kind, target))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def worksheets(self, exclude_hidden=False):
+        self._request("meta", None)
+        return list(self._sheets.values())
+
+    def worksheet(self, title):
+        self._request("meta", title)
+        if title not in self._sheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self._request("meta", title)
+        return self._add(title)
+
+    def _range(self, a1):
+        match = re.match(r"^'?(.*?)'?!([A-Z]+)\d*(?::([A-Z]+)\d*)?$", a1)
+        sheet = self._sheets[match.group(1)]
+        first = _column_index(match.group(2))
+        last = _column_index(match.group(3) or match.group(2))
+        values = [row[first - 1:last] for row in sheet._trimmed()]
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def values_get(self, range, params=None):
+        self._request("read", range)
+        values = self._range(range)
+        return {"range": range, "values": values} if values else {"range": range}
+
+    def values_batch_get(self, ranges, params=None):
+        self._request("read", tuple(ranges))
+        value_ranges = []
+        for a1 in ranges:
+            values = self._range(a1)
+            value_ranges.append({"range": a1, "values": values} if values else {"range": a1})
+        return {"valueRanges": value_ranges}
+
+    def batch_update(self, body):
+        self._request("write", len(body["requests"]))
+        by_id = {sheet.id: sheet for sheet in self._sheets.values()}
+        for request in body["requests"]:
+            if "updateCells" in request:
+                update = request["updateCells"]
+                sheet = by_id[update["start"]["sheetId"]]
+                for r, row in enumerate(update["rows"]):
+                    for c, cell in enumerate(row["values"]):
+                        sheet._set(update["start"]["rowIndex"] + r + 1, update["start"]["columnIndex"] + c + 1, _cell_text(cell))
+            elif "appendCells" in request:
+                append = request["appendCells"]
+                sheet = by_id[append["sheetId"]]
+                sheet._trimmed().extend([_cell_text(cell) for cell in row["values"]] for row in append["rows"])
+            elif "insertDimension" in request:
+                span = request["insertDimension"]["range"]
+                sheet = by_id[span["sheetId"]]
+                sheet.values[span["startIndex"]:span["startIndex"]] = [[] for _ in range(span["endIndex"] - span["startIndex"])]
+            elif "deleteDimension" in request:
+                span = request["deleteDimension"]["range"]
+                sheet = by_id[span["sheetId"]]
+                del sheet.values[span["startIndex"]:span["endIndex"]]
+            else:
+                raise NotImplementedError(f"FakeSpreadsheet does not support {list(request)}")
+        return {"replies": [{} for _ in body["requests"]]}
+
+
+# --- GEMINI ---
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel, answering each kind of prompt the planner sends.
+
+    Replies follow the requested response schema (recipe, recipe list or ingredient);
+    grocery prompts get their unparsed lines back under "### Other" and cart checks
+    answer "DUPLICATE: NO". Every prompt is appended to `calls`.
+    """
+
+    def __init__(self, model_name="gemini-2.5-flash", latency=0.0, chunk_size=40, **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _recipe(self, number):
+        proteins = ["Chicken", "Salmon", "Tofu", "Turkey", "Lentil", "Shrimp", "Beef", "Chickpea"]
+        protein = proteins[number % len(proteins)]
+        return {
+            "title": f"{protein} Bowl No. {number}",
+            "description": f"A quick {protein.lower()} bowl.",
+            "ingredients": [
+                {"quantity": 1.5, "unit": "lb", "name": protein.lower()},
+                {"quantity": 2, "unit": "cup", "name": "rice"},
+                {"quantity": 1, "name": "red bell pepper", "note": "sliced"},
+                {"name": "salt", "note": "to taste"},
+            ],
+        }
+
+    def _reply(self, prompt, generation_config):
+        number = len(self.calls)
+        properties = (generation_config or {}).get("response_schema", {}).get("properties", {})
+        if "recipes" in properties:
+            count = re.search(r"Suggest (\d+)", prompt)
+            count = int(count.group(1)) if count else 1
+            return json.dumps({"recipes": [self._recipe(number * 100 + i) for i in range(count)]})
+        if "title" in properties:
+            return json.dumps(self._recipe(number))
+        if properties:
+            return json.dumps({"quantity": 1, "unit": "lb", "name": "tempeh"})
+        if "DUPLICATE" in prompt:
+            return "DUPLICATE: NO"
+        if "Recipes:" in prompt:
+            return "### Other\n" + prompt.split("Recipes:", 1)[1].strip()
+        return "OK"
+
+    def generate_content(self, prompt, stream=False, generation_config=None, request_options=None):
+        with self._lock:
+            self.calls.append(prompt)
+            self.in_flight += 1
+            text = self._reply(prompt, generation_config)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if stream:
+            return [FakeResponse(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size)]
+        return FakeResponse(text)
@@ -0,0 +1,82 @@
+"""Per-list grocery compilation.
+
+Every compiled Groceries row carries, in its Source column, a fingerprint of the inputs
+its list was built from. Compiling again only rebuilds lists whose fingerprint moved and
+rewrites just those rows; manually added items (Source "manual") are never touched.
+A list written while Gemini could not sort it carries its fingerprint plus PARTIAL,
+which never matches, so the next compile tries that list again.
+"""
+import hashlib
+
+import ingredients
+import sheets
+
+LIST_GROUPS = [
+    ("🏡 Household (Sun/Mon)", ["Sunday", "Monday"]),
+    ("🧑‍🍳 Cook List 1 (Tues/Wed)", ["Tuesday", "Wednesday"]),
+    ("🧑‍🍳 Cook List 2 (Thurs/Fri)", ["Thursday", "Friday"]),
+]
+LIST_NAMES = [name for name, _ in LIST_GROUPS]
+MANUAL = "manual"
+PARTIAL = "-partial"
+
+
+def meal_text(schedule_dict, days):
+    return "".join(f"\n{schedule_dict[day].meal}" for day in days if day in schedule_dict and schedule_dict[day].meal)
+
+
+def aggregate(schedule_dict, days, pantry):
+    """Aggregator over the days' structured recipes; lines the parser could not read land in unparsed."""
+    aggregator = ingredients.GroceryAggregator(pantry)
+    for day in days:
+        recipe = schedule_dict[day].structured if day in schedule_dict else None
+        for item in (recipe.ingredients if recipe else ()):
+            if item.name is None:
+                aggregator.unparsed.append(item.text)
+            else:
+                aggregator.add_parsed(item.quantity, item.unit, item.name)
+    return aggregator
+
+
+def fingerprint(text, aggregator):
+    """The list's meals plus the ingredients the pantry removed from it, so pantry changes
+    that do not affect this list leave its fingerprint alone."""
+    digest = hashlib.sha256(text.encode("utf-8"))
+    digest.update(b"\0" + "\n".join(sorted(aggregator.pantry_hits)).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def aisles(rows):
+    """A list's GroceryItems split at its "###" aisle headers: [(header or None, items)]."""
+    groups = [(None, [])]
+    for row in rows:
+        if row.item.startswith("###"):
+            groups.append((row, []))
+        else:
+            groups[-1][1].append(row)
+    return [group for group in groups if group[0] is not None or group[1]]
+
+
+def compiled_rows(groceries_values, list_name):
+    """(row key, source) of every compiled row of a list."""
+    keys = sheets.row_keys(groceries_values, sheets.KEY_COLUMNS["Groceries"])
+    rows = []
+    for row, key in zip(groceries_values[1:], keys):
+        source = row[2] if len(row) > 2 else ""
+        if row and row[0] == list_name and source != MANUAL:
+            rows.append((key, source))
+    return rows
+
+
+def is_current(groceries_values, list_name, list_fingerprint, aggregator):
+    rows = compiled_rows(groceries_values, list_name)
+    if not rows:
+        return not aggregator.items and not aggregator.unparsed
+    return all(source == list_fingerprint for _, source in rows)
+
+
+def write_list(store, list_name, list_fingerprint, items):
+    """Replaces a list's compiled rows with items. Rows are removed by key, so ticking items
+    off on another device in the meantime cannot shift the wrong ones out."""
+    store.delete_keys("Groceries", [key for key, _ in compiled_rows(store.values("Groceries"), list_name)])
+    store.append_rows("Groceries", [[list_name, item, list_fingerprint] for item in items])
@@ -0,0 +1,56 @@
+"""Which households one server hosts, and each household's settings.
+
+A single-family install keeps its settings at the top level of the secrets file, as
+before. To host several families, give each a [households.<name>] table with its own
+SHEET_URL and TOKEN; a session opens its household with ?household=<name>&token=<token>.
+The name only picks the household and is easy to guess, so the token is what keeps one
+family out of another's planner: pick a long random one (e.g. secrets.token_urlsafe())
+and share the full address only with that family. A household without a TOKEN cannot
+be opened at all. A table may also set GCP_SERVICE_ACCOUNT (default: the top-level one; households sharing an account share
+one authorized client), GEMINI_RPM (its budget within the project-wide top-level
+GEMINI_RPM; default: an equal share), LOCAL_DB_PATH and AI_CACHE_PATH (default: one
+file per household).
+"""
+import hmac
+
+DEFAULT = "default"
+
+
+def _single_family(secrets):
+    # Decided by the secrets' layout, never by the name: a [households.default] table is
+    # an ordinary household with its own settings and TOKEN.
+    return not secrets.get("households")
+
+
+def names(secrets):
+    """Every household the server hosts."""
+    return [DEFAULT] if _single_family(secrets) else sorted(secrets["households"])
+
+
+def settings(secrets, name):
+    """name's settings, defaults filled in. KeyError for a household the server does not host."""
+    if name not in names(secrets):
+        raise KeyError(name)
+    if _single_family(secrets):
+        merged = {"LOCAL_DB_PATH": "meal_planner.sqlite3", "AI_CACHE_PATH": "gemini_cache.sqlite3", "GEMINI_RPM": 60}
+        merged.update({key: secrets[key] for key in ("GCP_SERVICE_ACCOUNT", "SHEET_URL", "LOCAL_DB_PATH", "AI_CACHE_PATH", "GEMINI_RPM") if key in secrets})
+    else:
+        merged = {
+            "GCP_SERVICE_ACCOUNT": secrets.get("GCP_SERVICE_ACCOUNT"),
+            "LOCAL_DB_PATH": f"meal_planner_{name}.sqlite3",
+            "AI_CACHE_PATH": f"gemini_cache_{name}.sqlite3",
+            "GEMINI_RPM": max(1, int(secrets.get("GEMINI_RPM", 60)) // len(names(secrets))),
+        }
+        merged.update(secrets["households"][name])
+    merged["GEMINI_RPM"] = int(merged["GEMINI_RPM"])
+    return merged
+
+
+def admits(secrets, name, token):
+    """Whether a session presenting token may open name. A single-family install needs no token."""
+    if name not in names(secrets):
+        return False
+    if _single_family(secrets):
+        return True
+    expected = str(secrets["households"][name].get("TOKEN", ""))
+    return bool(expected) and hmac.compare_digest(expected.encode("utf-8"), str(token or "").encode("utf-8"))
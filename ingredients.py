@@ -0,0 +1,363 @@
+"""Local ingredient parsing and grocery list aggregation.
+
+Recipes in the planner list ingredients as bullet lines ("- 1 1/2 lb chicken thighs").
+Those lines are parsed into (quantity, unit, name), summed across meals with unit
+conversion, checked against the pantry and grouped by aisle without calling Gemini.
+"""
+import re
+from fractions import Fraction
+
+# --- UNITS ---
+# alias -> (canonical unit, dimension, size in the dimension's base unit)
+# Volume is measured in teaspoons, weight in ounces; count units never convert.
+_UNITS = {
+    "tsp": ("tsp", "volume", 1), "teaspoon": ("tsp", "volume", 1),
+    "tbsp": ("tbsp", "volume", 3), "tablespoon": ("tbsp", "volume", 3), "tbs": ("tbsp", "volume", 3), "tbl": ("tbsp", "volume", 3),
+    "cup": ("cup", "volume", 48), "c": ("cup", "volume", 48),
+    "fl oz": ("fl oz", "volume", 6),
+    "pint": ("pint", "volume", 96), "pt": ("pint", "volume", 96),
+    "quart": ("quart", "volume", 192), "qt": ("quart", "volume", 192),
+    "gallon": ("gallon", "volume", 768), "gal": ("gallon", "volume", 768),
+    "ml": ("ml", "volume", Fraction(2029, 10000)), "milliliter": ("ml", "volume", Fraction(2029, 10000)),
+    "l": ("l", "volume", Fraction(20288, 100)), "liter": ("l", "volume", Fraction(20288, 100)), "litre": ("l", "volume", Fraction(20288, 100)),
+    "oz": ("oz", "weight", 1), "ounce": ("oz", "weight", 1),
+    "lb": ("lb", "weight", 16), "pound": ("lb", "weight", 16),
+    "g": ("g", "weight", Fraction(35274, 1000000)), "gram": ("g", "weight", Fraction(35274, 1000000)),
+    "kg": ("kg", "weight", Fraction(35274, 1000)), "kilogram": ("kg", "weight", Fraction(35274, 1000)),
+}
+_COUNT_UNITS = {
+    "can", "jar", "package", "pkg", "packet", "bag", "box", "bottle", "container", "carton", "tub",
+    "bunch", "head", "clove", "stalk", "sprig", "slice", "piece", "fillet", "loaf", "block",
+    "pinch", "dash", "handful", "sheet", "stick", "ear", "link",
+}
+_ABBREVIATED = {"tsp", "tbsp", "fl oz", "oz", "lb", "g", "kg", "ml", "l"}
+
+_UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8", "⅜": "3/8", "⅝": "5/8", "⅞": "7/8"}
+
+_QUANTITY = re.compile(r"^(\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)(?:\s*(?:-|to|–)\s*(\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?))?\s*")
+
+# Words describing preparation or size rather than what to buy.
+_DESCRIPTORS = {
+    "fresh", "freshly", "chopped", "diced", "minced", "sliced", "grated", "shredded", "crushed", "ground",
+    "large", "small", "medium", "boneless", "skinless", "finely", "roughly", "thinly", "cooked", "uncooked",
+    "raw", "dried", "optional", "divided", "packed", "peeled", "trimmed", "halved", "cubed", "rinsed", "drained",
+    "about", "approximately", "of", "extra", "lean",
+}
+# "ground" matters for meat ("ground turkey"); keep it when followed by one of these.
+_GROUND_MEATS = {"turkey", "beef", "pork", "chicken", "lamb", "bison"}
+_NOT_PLURAL = {"hummus", "asparagus", "couscous", "molasses", "swiss", "bass", "grass", "citrus", "lemongrass"}
+
+
+def _canonical_unit(word):
+    for candidate in (word, _singular(word), word[:-1]):
+        if candidate in _UNITS:
+            return _UNITS[candidate][0]
+        if candidate in _COUNT_UNITS:
+            return "package" if candidate == "pkg" else candidate
+    return ""
+
+
+def canonical_unit(word):
+    """Canonical spelling of a unit word ("Cups" -> "cup"), or "" if it is not a unit."""
+    word = word.lower().strip().rstrip(".")
+    if re.match(r"^fl\.? ?oz$", word):
+        return "fl oz"
+    return _canonical_unit(word) if word else ""
+
+
+def _quantity(text):
+    text = text.strip()
+    if " " in text:
+        whole, fraction = text.split()
+        return Fraction(whole) + Fraction(fraction)
+    return Fraction(text)
+
+
+def _singular(word):
+    if word in _NOT_PLURAL or len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def name_key(name):
+    """Normalized identity of an ingredient: lowercase, singular, no prep words."""
+    words = re.findall(r"[a-z]+", name.lower())
+    kept = []
+    for i, word in enumerate(words):
+        if word == "ground" and i + 1 < len(words) and words[i + 1] in _GROUND_MEATS:
+            kept.append(word)
+        elif word not in _DESCRIPTORS:
+            kept.append(_singular(word))
+    return " ".join(kept)
+
+
+# --- PARSING ---
+def ingredient_lines(recipe_text):
+    """Ingredient lines of a recipe with bullets removed. The bold title and headers, the
+    italic description, "For the sauce:" style labels and numbered steps are skipped."""
+    lines = []
+    for line in recipe_text.split("\n"):
+        stripped = line.strip()
+        if not stripped or stripped.startswith(("**", "#")) or stripped.endswith(":"):
+            continue
+        if stripped.startswith("*") and not stripped.startswith("* "):
+            continue
+        if re.match(r"^\d+[.)]\s", stripped):
+            continue
+        if stripped.startswith(("- ", "* ", "• ")):
+            stripped = stripped[2:].strip()
+        if stripped:
+            lines.append(stripped)
+    return lines
+
+
+def parse_line(line):
+    """Returns (quantity or None, unit, display name) for an ingredient line, or None if it cannot be read."""
+    text = line.replace("*", "").strip()
+    for symbol, fraction in _UNICODE_FRACTIONS.items():
+        text = re.sub(rf"(\d)\s*{symbol}", rf"\1 {fraction}", text).replace(symbol, fraction)
+    text = re.sub(r"\([^)]*\)", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+
+    quantity = None
+    match = _QUANTITY.match(text)
+    if match:
+        quantity = _quantity(match.group(2) or match.group(1))
+        text = text[match.end():]
+    elif re.match(r"^(a|an|one)\s", text, re.IGNORECASE):
+        quantity = Fraction(1)
+        text = text.split(" ", 1)[1]
+
+    unit = ""
+    if re.match(r"^fl\.? oz\.? ", text, re.IGNORECASE):
+        unit, text = "fl oz", text.split(" ", 2)[2]
+    else:
+        first, _, rest = text.partition(" ")
+        unit = _canonical_unit(first.lower().rstrip("."))
+        if unit and rest:
+            text = rest
+        else:
+            unit = ""
+
+    text = re.sub(r"^of\s+", "", text.strip(), flags=re.IGNORECASE)
+    name = re.split(r",|;|\bfor (?:garnish|serving)\b", text)[0]
+    name = re.sub(r"\bto taste\b|\bas needed\b", "", name, flags=re.IGNORECASE).strip(" .-:")
+    if not name_key(name) or len(name.split()) > 8:
+        return None
+    return quantity, unit, name
+
+
+# --- AGGREGATION ---
+AISLE_ORDER = [
+    "Produce", "Meat & Seafood", "Dairy & Eggs", "Bakery", "Pantry & Dry Goods",
+    "Canned & Jarred", "Spices & Seasonings", "Condiments & Sauces", "Frozen", "Other",
+]
+
+# Ingredient word or phrase (in name_key form) -> aisle.
+AISLES = {
+    # Produce
+    "onion": "Produce", "garlic": "Produce", "shallot": "Produce", "scallion": "Produce", "green onion": "Produce",
+    "tomato": "Produce", "potato": "Produce", "sweet potato": "Produce", "carrot": "Produce", "celery": "Produce",
+    "pepper": "Produce", "bell pepper": "Produce", "jalapeno": "Produce", "chili": "Produce", "zucchini": "Produce",
+    "squash": "Produce", "cucumber": "Produce", "broccoli": "Produce", "cauliflower": "Produce", "spinach": "Produce",
+    "kale": "Produce", "lettuce": "Produce", "cabbage": "Produce", "mushroom": "Produce", "avocado": "Produce",
+    "lemon": "Produce", "lime": "Produce", "orange": "Produce", "apple": "Produce", "banana": "Produce",
+    "berry": "Produce", "strawberry": "Produce", "blueberry": "Produce", "grape": "Produce", "mango": "Produce",
+    "pineapple": "Produce", "ginger": "Produce", "cilantro": "Produce", "parsley": "Produce", "basil": "Produce",
+    "mint": "Produce", "dill": "Produce", "asparagus": "Produce", "green bean": "Produce", "pea": "Produce",
+    "corn": "Produce", "eggplant": "Produce", "leek": "Produce", "arugula": "Produce", "brussels sprout": "Produce",
+    "beet": "Produce", "radish": "Produce", "herb": "Produce", "bok choy": "Produce", "snap pea": "Produce",
+    # Meat & Seafood
+    "chicken": "Meat & Seafood", "chicken breast": "Meat & Seafood", "chicken thigh": "Meat & Seafood",
+    "turkey": "Meat & Seafood", "ground turkey": "Meat & Seafood", "beef": "Meat & Seafood", "ground beef": "Meat & Seafood",
+    "steak": "Meat & Seafood", "pork": "Meat & Seafood", "pork chop": "Meat & Seafood", "pork tenderloin": "Meat & Seafood",
+    "bacon": "Meat & Seafood", "sausage": "Meat & Seafood", "ham": "Meat & Seafood", "lamb": "Meat & Seafood",
+    "salmon": "Meat & Seafood", "cod": "Meat & Seafood", "tilapia": "Meat & Seafood", "halibut": "Meat & Seafood",
+    "fish": "Meat & Seafood", "shrimp": "Meat & Seafood", "prawn": "Meat & Seafood", "scallop": "Meat & Seafood",
+    "tuna steak": "Meat & Seafood", "trout": "Meat & Seafood", "mussel": "Meat & Seafood",
+    # Dairy & Eggs
+    "egg": "Dairy & Eggs", "milk": "Dairy & Eggs", "butter": "Dairy & Eggs", "cheese": "Dairy & Eggs",
+    "cheddar": "Dairy & Eggs", "mozzarella": "Dairy & Eggs", "parmesan": "Dairy & Eggs", "feta": "Dairy & Eggs",
+    "cream": "Dairy & Eggs", "heavy cream": "Dairy & Eggs", "sour cream": "Dairy & Eggs", "cream cheese": "Dairy & Eggs",
+    "yogurt": "Dairy & Eggs", "greek yogurt": "Dairy & Eggs", "cottage cheese": "Dairy & Eggs", "tofu": "Dairy & Eggs",
+    "tempeh": "Dairy & Eggs", "ricotta": "Dairy & Eggs", "half and half": "Dairy & Eggs",
+    # Bakery
+    "bread": "Bakery", "bun": "Bakery", "roll": "Bakery", "tortilla": "Bakery", "pita": "Bakery", "naan": "Bakery",
+    "bagel": "Bakery", "baguette": "Bakery", "wrap": "Bakery",
+    # Pantry & Dry Goods
+    "rice": "Pantry & Dry Goods", "pasta": "Pantry & Dry Goods", "spaghetti": "Pantry & Dry Goods", "penne": "Pantry & Dry Goods",
+    "noodle": "Pantry & Dry Goods", "quinoa": "Pantry & Dry Goods", "couscous": "Pantry & Dry Goods", "oat": "Pantry & Dry Goods",
+    "flour": "Pantry & Dry Goods", "sugar": "Pantry & Dry Goods", "brown sugar": "Pantry & Dry Goods", "breadcrumb": "Pantry & Dry Goods",
+    "panko": "Pantry & Dry Goods", "lentil": "Pantry & Dry Goods", "oil": "Pantry & Dry Goods", "olive oil": "Pantry & Dry Goods",
+    "vegetable oil": "Pantry & Dry Goods", "sesame oil": "Pantry & Dry Goods", "honey": "Pantry & Dry Goods",
+    "maple syrup": "Pantry & Dry Goods", "nut": "Pantry & Dry Goods", "almond": "Pantry & Dry Goods", "peanut": "Pantry & Dry Goods",
+    "walnut": "Pantry & Dry Goods", "cashew": "Pantry & Dry Goods", "sesame seed": "Pantry & Dry Goods", "cornstarch": "Pantry & Dry Goods",
+    "baking powder": "Pantry & Dry Goods", "baking soda": "Pantry & Dry Goods", "raisin": "Pantry & Dry Goods",
+    # Canned & Jarred
+    "bean": "Canned & Jarred", "black bean": "Canned & Jarred", "kidney bean": "Canned & Jarred",
+    "chickpea": "Canned & Jarred", "broth": "Canned & Jarred", "stock": "Canned & Jarred", "tomato sauce": "Canned & Jarred",
+    "tomato paste": "Canned & Jarred", "diced tomato": "Canned & Jarred", "crushed tomato": "Canned & Jarred",
+    "coconut milk": "Canned & Jarred", "tuna": "Canned & Jarred", "olive": "Canned & Jarred", "salsa": "Canned & Jarred",
+    "marinara": "Canned & Jarred", "pasta sauce": "Canned & Jarred", "pumpkin puree": "Canned & Jarred",
+    "peanut butter": "Canned & Jarred",
+    # Spices & Seasonings
+    "salt": "Spices & Seasonings", "black pepper": "Spices & Seasonings", "peppercorn": "Spices & Seasonings",
+    "paprika": "Spices & Seasonings", "smoked paprika": "Spices & Seasonings", "cumin": "Spices & Seasonings",
+    "chili powder": "Spices & Seasonings", "garlic powder": "Spices & Seasonings", "onion powder": "Spices & Seasonings",
+    "oregano": "Spices & Seasonings", "thyme": "Spices & Seasonings", "rosemary": "Spices & Seasonings",
+    "cinnamon": "Spices & Seasonings", "turmeric": "Spices & Seasonings", "curry powder": "Spices & Seasonings",
+    "red pepper flake": "Spices & Seasonings", "cayenne": "Spices & Seasonings", "bay leaf": "Spices & Seasonings",
+    "italian seasoning": "Spices & Seasonings", "seasoning": "Spices & Seasonings", "nutmeg": "Spices & Seasonings",
+    "coriander": "Spices & Seasonings", "garam masala": "Spices & Seasonings", "vanilla": "Spices & Seasonings",
+    "powder": "Spices & Seasonings", "spice": "Spices & Seasonings",
+    # Condiments & Sauces
+    "soy sauce": "Condiments & Sauces", "tamari": "Condiments & Sauces", "vinegar": "Condiments & Sauces",
+    "mustard": "Condiments & Sauces", "ketchup": "Condiments & Sauces", "mayonnaise": "Condiments & Sauces",
+    "mayo": "Condiments & Sauces", "hot sauce": "Condiments & Sauces", "sriracha": "Condiments & Sauces",
+    "bbq sauce": "Condiments & Sauces", "barbecue sauce": "Condiments & Sauces", "teriyaki sauce": "Condiments & Sauces",
+    "hoisin sauce": "Condiments & Sauces", "fish sauce": "Condiments & Sauces", "worcestershire sauce": "Condiments & Sauces",
+    "pesto": "Condiments & Sauces", "sauce": "Condiments & Sauces", "dressing": "Condiments & Sauces",
+    # Frozen
+    "frozen pea": "Frozen", "frozen corn": "Frozen", "frozen vegetable": "Frozen", "frozen berry": "Frozen",
+    "ice cream": "Frozen", "frozen": "Frozen",
+}
+
+
+def aisle_for(key):
+    """Most specific aisle match, preferring phrases, then the head noun, then any word."""
+    words = key.split()
+    for size in (3, 2):
+        for start in range(len(words) - size, -1, -1):
+            phrase = " ".join(words[start:start + size])
+            if phrase in AISLES:
+                return AISLES[phrase]
+    for word in reversed(words):
+        if word in AISLES:
+            return AISLES[word]
+    return "Other"
+
+
+def in_pantry(key, pantry_keys, to_taste=False):
+    """True when the ingredient is covered by the pantry: an exact match, or a pantry item
+    that ends the name ("kosher salt" is covered by "salt", "rice vinegar" is not by "rice").
+    Unmeasured seasonings also match the other way round ("pepper" by "black pepper")."""
+    parts = [part.strip() for part in re.split(r"\band\b|&", key) if part.strip()]
+    for part in parts:
+        if not any(part == item or part.endswith(" " + item) or (to_taste and item.endswith(" " + part))
+                   for item in pantry_keys):
+            return False
+    return True
+
+
+def _format_quantity(quantity):
+    quantity = Fraction(quantity).limit_denominator(8)
+    whole, rest = divmod(quantity.numerator, quantity.denominator)
+    if not rest:
+        return str(whole)
+    fraction = f"{rest}/{quantity.denominator}"
+    return f"{whole} {fraction}" if whole else fraction
+
+
+def _format_unit(unit, quantity):
+    if not unit or unit in _ABBREVIATED or quantity <= 1:
+        return unit
+    return unit + ("es" if unit.endswith(("ch", "sh", "x")) else "s")
+
+
+def unit_dimension(unit):
+    """(dimension, size in that dimension's base unit); count units are their own dimension."""
+    return (_UNITS[unit][1], _UNITS[unit][2]) if unit in _UNITS else (unit, 1)
+
+
+def format_amount(quantity, unit):
+    """"1 1/2 cups", "2 lb", "3" - the quantity with its unit pluralized where it reads naturally."""
+    return f"{_format_quantity(quantity)} {_format_unit(unit, quantity)}".strip()
+
+
+class GroceryAggregator:
+    """Collects parsed ingredient lines and renders them as aisle-grouped list items."""
+
+    def __init__(self, pantry=()):
+        self.pantry_keys = {name_key(item) for item in pantry if name_key(item)}
+        self.items = {}
+        self.unparsed = []
+        self.pantry_hits = set()
+
+    def add_recipe(self, recipe_text):
+        for line in ingredient_lines(recipe_text):
+            self.add_line(line)
+
+    def add_line(self, line):
+        parsed = parse_line(line)
+        if parsed is None:
+            self.unparsed.append(line)
+            return
+        self.add_parsed(*parsed)
+
+    def add_parsed(self, quantity, unit, name):
+        key = name_key(name)
+        if in_pantry(key, self.pantry_keys, to_taste=quantity is None):
+            self.pantry_hits.add(key)
+            return
+        item = self.items.setdefault(key, {"name": name, "amounts": {}, "units": []})
+        if name.lower() != key and name.lower().endswith("s") and not item["name"].lower().endswith("s"):
+            item["name"] = name
+        if quantity is None:
+            return
+        dimension, size = unit_dimension(unit)
+        item["amounts"][dimension] = item["amounts"].get(dimension, 0) + quantity * size
+        item["units"].append(unit)
+
+    def _amount_text(self, item):
+        parts = []
+        for dimension, total in item["amounts"].items():
+            if dimension in ("volume", "weight"):
+                # Report in the largest unit the recipes used for this ingredient.
+                used = [u for u in item["units"] if u in _UNITS and _UNITS[u][1] == dimension]
+                unit = max(used, key=lambda u: _UNITS[u][2])
+                quantity = total / _UNITS[unit][2]
+            else:
+                unit, quantity = dimension, total
+            parts.append(format_amount(quantity, unit))
+        return " + ".join(parts)
+
+    def grouped(self):
+        """aisle -> list item strings, for every aisle with something to buy."""
+        groups = {}
+        for key, item in self.items.items():
+            amount = self._amount_text(item)
+            line = f"{amount} {item['name']}" if amount else item["name"]
+            groups.setdefault(aisle_for(key), []).append(line)
+        return groups
+
+
+def merge_sectioned(groups, text):
+    """Folds a '### Aisle' sectioned list (the Gemini fallback format) into groups."""
+    aisle = "Other"
+    for line in text.split("\n"):
+        stripped = line.strip().lstrip("-* ").strip()
+        if not stripped:
+            continue
+        if line.strip().startswith("###"):
+            aisle = line.strip().lstrip("#").strip().title() or "Other"
+            continue
+        groups.setdefault(aisle, []).append(stripped)
+    return groups
+
+
+def to_list_items(groups):
+    """Flattens groups into the sheet format: a '### Aisle' header row before each aisle's items."""
+    aisles = [a for a in AISLE_ORDER if a in groups] + sorted(a for a in groups if a not in AISLE_ORDER)
+    items = []
+    for aisle in aisles:
+        items.append(f"### {aisle}")
+        items.extend(sorted(groups[aisle], key=lambda line: name_key(re.sub(r"^[\d\s/.+]+", "", line))))
+    return items
@@ -0,0 +1,93 @@
+"""Background jobs for the planner's long AI pipelines (Auto-Fill, grocery compiles).
+
+Jobs run on a small worker pool instead of the Streamlit script thread, so leaving the
+page does not cancel them and the UI only polls their progress. A job is known by name:
+asking for one that is still queued or running, from any session, joins it instead of
+starting a second one (single-flight). Jobs sharing a lock name never interleave.
+"""
+import contextlib
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+
+class Job:
+    """One run of a pipeline. The pipeline reports through progress(); the UI reads the rest."""
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.state = "queued"
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def progress(self, done, total=None, message=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def fraction(self):
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+
+class JobRunner:
+    def __init__(self, workers=2, tracer=None):
+        self.tracer = tracer if tracer is not None else tracing.Tracer()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._ids = itertools.count(1)
+        self._jobs = {}
+
+        self.started = 0
+        self.joined = 0
+
+    def get(self, name):
+        """The latest job called name, queued, running or finished; None if there never was one."""
+        with self._lock:
+            return self._jobs.get(name)
+
+    def submit(self, name, fn, *args, lock=None):
+        """Runs fn(job, *args) in the background and returns the job.
+
+        While a job called name is queued or running, returns that job instead: its result
+        answers this request too. Jobs submitted with the same lock run one at a time.
+        """
+        with self._lock:
+            job = self._jobs.get(name)
+            if job is not None and job.active:
+                self.joined += 1
+                return job
+            job = self._jobs[name] = Job(next(self._ids), name)
+            exclusive = self._locks.setdefault(lock, threading.Lock()) if lock else contextlib.nullcontext()
+            self.started += 1
+        # The job's spans count towards the script run that started it.
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, exclusive)
+        return job
+
+    def _run(self, job, fn, args, exclusive):
+        with exclusive:
+            job.state = "running"
+            try:
+                with self.tracer.span("job", job.name):
+                    job.result = fn(job, *args)
+                job.state = "done"
+            except Exception as e:
+                job.error = e
+                job.state = "failed"
+            job.finished = time.time()
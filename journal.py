@@ -0,0 +1,302 @@
+"""Write-behind mutation journal for the planner spreadsheet.
+
+Edits are applied to the local snapshot immediately and queued per tab. The sync
+engine coalesces the queue and flushes it as one spreadsheet batchUpdate per worksheet.
+"""
+import functools
+import threading
+from contextlib import contextmanager
+
+import recipes
+import sheets
+import tracing
+
+
+# --- OPERATIONS ---
+# Ops are tuples using the same 1-based row/column numbers as gspread:
+#   ("update", row, col, value)
+#   ("append", rows)
+#   ("delete", start_row, end_row)   inclusive
+# The app only queues appends and keyed ops; updates and deletes by position are what
+# keyed ops resolve to against the tab as it is when they are pushed.
+# Keyed ops find their row by its key (see sheets.KEY_COLUMNS) wherever it is by then:
+#   ("update_row", key_col, key, [[col, value], ...], [[col, expected], ...] or None)
+#   ("delete_keys", key_col, [key, ...])
+KEYED_OPS = ("update_row", "delete_keys")
+
+
+def locate(values, op):
+    """The positional ops a keyed op amounts to against values; none for rows already gone."""
+    if op[0] == "delete_keys":
+        keys = set(op[2])
+        rows = [i + 2 for i, key in enumerate(sheets.row_keys(values, op[1])) if key in keys]
+        # Bottom up, so each row number is still right when its turn comes.
+        return [("delete", row, row) for row in reversed(rows)]
+    row = sheets.find_row(values, op[1], op[2])
+    if row is None:
+        return []
+    return [("update", row, col, value) for col, value in op[3]]
+
+
+def _conflicts(values, op):
+    """True when an update_row op's row is gone or another writer changed a cell it expected."""
+    row = sheets.find_row(values, op[1], op[2])
+    if row is None:
+        return True
+    cells = values[row - 1]
+    written = dict(op[3])
+    for col, expected in op[4] or ():
+        current = cells[col - 1] if len(cells) >= col else ""
+        # Already holding the new value means an earlier attempt of this very push landed.
+        if current not in (str(expected), str(written.get(col, expected))):
+            return True
+    return False
+
+
+def resolve(values, ops):
+    """Turns ops into positional ops against values (the tab as the spreadsheet has it right
+    now), applying them to values as it goes. Returns (positional ops, conflicting ops).
+
+    Updates whose row is gone or whose expected cells moved are left out as conflicts; a
+    delete whose row is already gone is simply dropped.
+    """
+    resolved, conflicts = [], []
+    for op in ops:
+        if op[0] == "update_row" and _conflicts(values, op):
+            conflicts.append(op)
+            continue
+        for step in (locate(values, op) if op[0] in KEYED_OPS else [op]):
+            apply_op(values, step)
+            coalesce(resolved, step)
+    return resolved, conflicts
+
+
+def apply_op(values, op):
+    kind = op[0]
+    if kind == "update":
+        _, row, col, value = op
+        while len(values) < row:
+            values.append([])
+        cells = values[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = str(value)
+    elif kind == "append":
+        values.extend([str(cell) for cell in row] for row in op[1])
+    elif kind == "delete":
+        _, start, end = op
+        del values[start - 1:end]
+    elif kind in KEYED_OPS:
+        for step in locate(values, op):
+            apply_op(values, step)
+
+
+def _merge_updates(first, second):
+    """One update_row op doing both; expectations stay those of the first, since the second
+    was made against values the first had already written."""
+    written = dict(first[3])
+    expected = {col: value for col, value in second[4] or () if col not in written}
+    expected.update(first[4] or ())
+    written.update(second[3])
+    return (first[0], first[1], first[2], [[col, value] for col, value in sorted(written.items())],
+            [[col, value] for col, value in sorted(expected.items())] or None)
+
+
+def coalesce(ops, op):
+    """Adds op to the queue, merging it into the previous op where the result is identical."""
+    kind = op[0]
+    if kind == "update":
+        # Only look back through the trailing run of updates; a structural op shifts rows.
+        for i in range(len(ops) - 1, -1, -1):
+            if ops[i][0] != "update":
+                break
+            if ops[i][1:3] == op[1:3]:
+                ops[i] = op
+                return
+    elif kind == "update_row":
+        for i in range(len(ops) - 1, -1, -1):
+            if ops[i][0] != "update_row":
+                break
+            if tuple(ops[i][1:3]) == tuple(op[1:3]):
+                ops[i] = _merge_updates(ops[i], op)
+                return
+    elif ops and ops[-1][0] == kind == "append":
+        ops[-1] = ("append", ops[-1][1] + op[1])
+        return
+    elif ops and ops[-1][0] == kind == "delete":
+        _, start, end = ops[-1]
+        _, new_start, new_end = op
+        if new_start == start:
+            ops[-1] = ("delete", start, end + new_end - new_start + 1)
+            return
+        if new_end == start - 1:
+            ops[-1] = ("delete", new_start, end)
+            return
+    ops.append(op)
+
+
+def _cell(value):
+    # Always text, as typed: sent as a number, "007" or a zero-padded quantity would come back as 7.
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def ops_to_requests(sheet_id, ops):
+    requests = []
+    for op in ops:
+        kind = op[0]
+        if kind == "update":
+            _, row, col, value = op
+            requests.append({"updateCells": {
+                "rows": [{"values": [_cell(value)]}],
+                "fields": "userEnteredValue",
+                "start": {"sheetId": sheet_id, "rowIndex": row - 1, "columnIndex": col - 1},
+            }})
+        elif kind == "append":
+            requests.append({"appendCells": {
+                "sheetId": sheet_id,
+                "rows": [{"values": [_cell(v) for v in row]} for row in op[1]],
+                "fields": "userEnteredValue",
+            }})
+        elif kind == "delete":
+            _, start, end = op
+            requests.append({"deleteDimension": {"range": {
+                "sheetId": sheet_id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+            }}})
+    return requests
+
+
+# --- JOURNAL ---
+class MutationJournal:
+    """The app's read/write surface: edits land in the local mirror at once and the
+    sync engine pushes them to Sheets in batches behind the user's back."""
+
+    def __init__(self, store, engine, tracer=None):
+        self.store = store
+        self.engine = engine
+        self.tracer = tracer if tracer is not None else tracing.Tracer()
+        self._views = {}
+        self._derived = {}
+        # Recipe cells rarely change when their tab does, so re-decoding the tab reuses them.
+        # Kept per journal, i.e. per household, so one family's recipes never evict another's.
+        self._load_recipe = functools.lru_cache(maxsize=2048)(recipes.load)
+        # Per thread, i.e. per browser session: the edits of the transaction() in progress.
+        self._pending = threading.local()
+
+    # Reads
+    def values(self, tab):
+        """Current optimistic contents of tab: the mirror, including every unpushed edit."""
+        return self.store.values(tab)
+
+    def view(self, tab):
+        """Decoded contents of one tab (see sheets.decode), rebuilt only after that tab changes."""
+        version = self.store.tab_versions.get(tab, 0)
+        cached = self._views.get(tab)
+        hit = cached is not None and cached[0] == version
+        self.tracer.cache(f"view {tab}", hit)
+        if not hit:
+            with self.tracer.span("decode", tab):
+                cached = (version, sheets.decode(tab, self.store.values(tab), self._load_recipe))
+            self._views[tab] = cached
+        return cached[1]
+
+    def derived(self, tabs, build):
+        """build(view(tab)), e.g. a search index, rebuilt only after that tab changes.
+
+        tabs may also be a tuple of tab names; build then gets one view per tab.
+        Like views, the result is shared by every session, so it must not be modified.
+        Results are cached under build's qualified name rather than the function object,
+        which Streamlit defines anew on every run of the script.
+        """
+        names = (tabs,) if isinstance(tabs, str) else tabs
+        version = tuple(self.store.tab_versions.get(tab, 0) for tab in names)
+        key = (names, f"{build.__module__}.{build.__qualname__}")
+        cached = self._derived.get(key)
+        label = f"{build.__name__} {' + '.join(names)}"
+        hit = cached is not None and cached[0] == version
+        self.tracer.cache(label, hit)
+        if not hit:
+            # Let go of the stale result before building its replacement.
+            self._derived.pop(key, None)
+            data = [self.view(tab) for tab in names]
+            with self.tracer.span("decode", label):
+                cached = (version, build(*data))
+            self._derived[key] = cached
+        return cached[1]
+
+    def poll(self):
+        """Has the sync engine look for edits from other devices soon; cheap enough for every rerun."""
+        self.engine.request_check()
+
+    def refresh(self):
+        """Pushes queued edits, then pulls every tab another device has changed."""
+        self.engine.push()
+        self.engine.check()
+
+    def pending_count(self):
+        return self.store.pending_count()
+
+    @property
+    def last_error(self):
+        return self.engine.last_error
+
+    @property
+    def conflicts(self):
+        """(tab, op) of every edit dropped because another device changed its row first or
+        because Sheets refused it outright."""
+        return self.engine.conflicts
+
+    # Writes
+    def _record(self, tab, op):
+        edits = getattr(self._pending, "edits", None)
+        if edits is not None:
+            edits.append((tab, op))
+            return
+        self.store.record(tab, op)
+        self.engine.request_push()
+
+    @contextmanager
+    def transaction(self):
+        """Groups the edits made in the block, across tabs: they land in the mirror together
+        when it ends (none of them if it raises) and go out in the same push.
+
+        Reads inside the block do not see its edits yet.
+        """
+        if getattr(self._pending, "edits", None) is not None:
+            yield
+            return
+        self._pending.edits = []
+        try:
+            yield
+            edits = self._pending.edits
+        finally:
+            self._pending.edits = None
+        if edits:
+            self.store.record_many(edits)
+            self.engine.request_push()
+
+    def update_row(self, tab, key, cells, expected=None):
+        """Sets cells ({col: value}) on the row whose key (sheets.KEY_COLUMNS) is key.
+
+        expected ({col: value}) is what this device showed; if another device changed any
+        of those cells first, the edit is dropped as a conflict instead of overwriting it.
+        """
+        pairs = [[col, value] for col, value in sorted(cells.items())]
+        checks = [[col, value] for col, value in sorted(expected.items())] if expected else None
+        self._record(tab, ("update_row", sheets.KEY_COLUMNS[tab], key, pairs, checks))
+
+    def append_rows(self, tab, rows):
+        """Appends rows, giving each a new ID on tabs that have one (sheets.ID_COLUMNS)."""
+        if rows:
+            rows = [list(row) for row in rows]
+            col = sheets.ID_COLUMNS.get(tab)
+            if col:
+                rows = [row[:col - 1] + [""] * (col - 1 - len(row)) + [sheets.new_id()] for row in rows]
+            self._record(tab, ("append", rows))
+
+    def delete_row(self, tab, key):
+        self.delete_keys(tab, [key])
+
+    def delete_keys(self, tab, keys):
+        """Deletes the rows whose keys (sheets.KEY_COLUMNS) are in keys, wherever they are by then."""
+        if keys:
+            self._record(tab, ("delete_keys", sheets.KEY_COLUMNS[tab], list(keys)))
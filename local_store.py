@@ -0,0 +1,221 @@
+"""SQLite mirror of the planner spreadsheet plus the outbox of edits not yet pushed to it."""
+import json
+import sqlite3
+import threading
+
+import journal
+import sheets
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    tab TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    key TEXT NOT NULL DEFAULT '',
+    cells TEXT NOT NULL,
+    PRIMARY KEY (tab, pos)
+);
+CREATE INDEX IF NOT EXISTS rows_by_key ON rows (tab, key);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tab TEXT NOT NULL,
+    op TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS synced (
+    tab TEXT PRIMARY KEY,
+    at REAL NOT NULL
+);
+"""
+
+
+# PRAGMA user_version: 1 once rows.key holds each row's sheets.KEY_COLUMNS key, which
+# mirrors made before row IDs filled from the first column instead.
+KEY_VERSION = 1
+
+
+def _load_op(text):
+    return tuple(json.loads(text))
+
+
+class LocalStore:
+    """Rows are stored by 1-based sheet row number (pos), the header being pos 1.
+
+    Reads are served from here; edits update the mirror and land in the outbox in the
+    same transaction, so they survive restarts until the sync engine acknowledges them.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < KEY_VERSION:
+            self._rekey()
+        self._lock = threading.RLock()
+        self._claimed = 0
+        self.version = 0
+        self.tab_versions = {}
+
+    # Reads
+    def values(self, tab):
+        with self._lock:
+            rows = self._conn.execute("SELECT cells FROM rows WHERE tab = ? ORDER BY pos", (tab,)).fetchall()
+        return [json.loads(cells) for (cells,) in rows]
+
+    def find(self, tab, key):
+        """Row number and cells of the first row below the header whose key (sheets.KEY_COLUMNS) is key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pos, cells FROM rows WHERE tab = ? AND key = ? AND pos > 1 ORDER BY pos LIMIT 1", (tab, key)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def has_synced(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM synced LIMIT 1").fetchone() is not None
+
+    # Mirror maintenance
+    def _put(self, tab, pos, cells):
+        col = sheets.KEY_COLUMNS.get(tab, 1)
+        key = str(cells[col - 1]) if len(cells) >= col else ""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rows (tab, pos, key, cells) VALUES (?, ?, ?, ?)",
+            (tab, pos, key, json.dumps(cells)),
+        )
+
+    def _rekey(self):
+        rows = self._conn.execute("SELECT tab, pos, cells FROM rows").fetchall()
+        self._conn.execute("BEGIN")
+        for tab, pos, cells in rows:
+            self._put(tab, pos, json.loads(cells))
+        self._conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+        self._conn.execute("COMMIT")
+
+    def _count(self, tab):
+        return self._conn.execute("SELECT COALESCE(MAX(pos), 0) FROM rows WHERE tab = ?", (tab,)).fetchone()[0]
+
+    def _apply(self, tab, op):
+        kind = op[0]
+        if kind == "update":
+            _, row, col, value = op
+            for pos in range(self._count(tab) + 1, row):
+                self._put(tab, pos, [])
+            found = self._conn.execute("SELECT cells FROM rows WHERE tab = ? AND pos = ?", (tab, row)).fetchone()
+            values = [json.loads(found[0])] if found else [[]]
+            journal.apply_op(values, ("update", 1, col, value))
+            self._put(tab, row, values[0])
+        elif kind == "append":
+            start = self._count(tab) + 1
+            for offset, cells in enumerate(op[1]):
+                self._put(tab, start + offset, [str(cell) for cell in cells])
+        elif kind == "delete":
+            _, start, end = op
+            self._conn.execute("DELETE FROM rows WHERE tab = ? AND pos BETWEEN ? AND ?", (tab, start, end))
+            self._shift(tab, end + 1, -(end - start + 1))
+        elif kind in journal.KEYED_OPS:
+            for step in self._locate(tab, op):
+                self._apply(tab, step)
+
+    def _locate(self, tab, op):
+        """journal.locate(), finding the rows through the key index instead of reading the tab."""
+        keys = op[2] if op[0] == "delete_keys" else [op[2]]
+        # Rows without an ID are keyed by their contents (sheets.row_keys), which the index cannot know.
+        if op[1] != sheets.KEY_COLUMNS.get(tab, 1) or any(not key or key.startswith("~") for key in keys):
+            return journal.locate(self.values(tab), op)
+        if op[0] == "delete_keys":
+            rows = self._conn.execute(
+                "SELECT pos FROM rows WHERE tab = ? AND pos > 1 AND key IN (SELECT value FROM json_each(?)) ORDER BY pos DESC",
+                (tab, json.dumps(keys)),
+            ).fetchall()
+            return [("delete", row, row) for (row,) in rows]
+        found = self.find(tab, op[2])
+        return [("update", found[0], col, value) for col, value in op[3]] if found else []
+
+    def _shift(self, tab, first, delta):
+        # Move rows from first onwards by delta in two steps so (tab, pos) never collides mid-update.
+        self._conn.execute("UPDATE rows SET pos = -(pos + ?) WHERE tab = ? AND pos >= ?", (delta, tab, first))
+        self._conn.execute("UPDATE rows SET pos = -pos WHERE tab = ? AND pos < 0", (tab,))
+
+    def record(self, tab, op):
+        """Applies an edit to the mirror and queues it for the spreadsheet."""
+        self.record_many([(tab, op)])
+
+    def record_many(self, edits):
+        """record() for a list of (tab, op), all in one transaction: either every edit lands or none."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for tab, op in edits:
+                    self._apply(tab, op)
+                    self._enqueue(tab, op)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for tab in dict.fromkeys(tab for tab, _ in edits):
+                self._bump(tab)
+
+    def _bump(self, tab):
+        self.version += 1
+        self.tab_versions[tab] = self.tab_versions.get(tab, 0) + 1
+
+    def _enqueue(self, tab, op):
+        # Merge into this tab's unclaimed ops the same way the in-memory journal would.
+        rows = self._conn.execute(
+            "SELECT id, op FROM outbox WHERE tab = ? AND id > ? ORDER BY id", (tab, self._claimed)
+        ).fetchall()
+        ops = [_load_op(text) for _, text in rows]
+        merged = list(ops)
+        journal.coalesce(merged, op)
+        if len(merged) > len(ops):
+            self._conn.execute("INSERT INTO outbox (tab, op) VALUES (?, ?)", (tab, json.dumps(op)))
+            return
+        for (op_id, _), old, new in zip(rows, ops, merged):
+            if old != new:
+                self._conn.execute("UPDATE outbox SET op = ? WHERE id = ?", (json.dumps(new), op_id))
+
+    def reconcile(self, tab, remote, synced_at):
+        """Makes the mirror equal remote plus still-queued edits, rewriting only rows that differ."""
+        with self._lock:
+            desired = [list(row) for row in remote]
+            for op_tab, op in self._queued():
+                if op_tab == tab:
+                    journal.apply_op(desired, op)
+            current = self.values(tab)
+            changed = 0
+            self._conn.execute("BEGIN")
+            try:
+                for i, cells in enumerate(desired):
+                    if i >= len(current) or current[i] != cells:
+                        self._put(tab, i + 1, cells)
+                        changed += 1
+                if len(current) > len(desired):
+                    self._conn.execute("DELETE FROM rows WHERE tab = ? AND pos > ?", (tab, len(desired)))
+                    changed += len(current) - len(desired)
+                self._conn.execute("INSERT OR REPLACE INTO synced (tab, at) VALUES (?, ?)", (tab, synced_at))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if changed:
+                self._bump(tab)
+            return changed
+
+    # Outbox
+    def _queued(self):
+        rows = self._conn.execute("SELECT tab, op FROM outbox ORDER BY id").fetchall()
+        return [(tab, _load_op(text)) for tab, text in rows]
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def claim(self):
+        """Returns every queued (id, tab, op) and stops later edits from merging into them."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, tab, op FROM outbox ORDER BY id").fetchall()
+            if rows:
+                self._claimed = rows[-1][0]
+            return [(op_id, tab, _load_op(text)) for op_id, tab, text in rows]
+
+    def ack(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
@@ -0,0 +1,123 @@
+"""Ready-made recipe candidates for Auto-Fill and Generate New Meal.
+
+One Gemini call returns a batch of distinct structured recipes for the household's
+current preferences, so filling a week or regenerating a day is served from memory
+instead of a call per day. Nothing is generated until the pool is first asked for a
+recipe; from then on a background thread tops it up when it runs low. The pool belongs
+to one preference context and empties itself as soon as a caller presents different
+diet settings or a different set of loved or banned meals.
+"""
+import contextvars
+import threading
+import time
+from collections import namedtuple
+
+import recipes
+
+PROMPT = """
+Suggest {count} different dinner recipes based EXACTLY on these family preferences: {diet_prefs}.
+CRITICAL INSTRUCTIONS:
+- Do NOT suggest these 1 and 2-star banned meals: {banned_str}
+- Mostly fresh, creative ideas. At most one may be a close variation of these 4 and 5-star meals: {loved_str}
+- Every recipe must be clearly different from the others (different main protein or cuisine).
+For each recipe give the title, a brief 1-sentence description, and every ingredient with its quantity and unit.
+"""
+
+# What pooled recipes are generated for. Only diet_prefs and the loved and banned titles
+# (frozensets) decide whether the pool still fits; loved_str and banned_str merely word
+# them for the prompt, and their ranking shifts whenever any vault meal is added or edited.
+Context = namedtuple("Context", ["diet_prefs", "loved", "banned", "loved_str", "banned_str"])
+
+
+def _same(first, second):
+    return first is not None and second is not None and first[:3] == second[:3]
+
+
+class RecipePool:
+    def __init__(self, ai, batch_size=8, low_water=3, retry_after=60.0):
+        self.ai = ai
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._context = None
+        self._recipes = []
+        self._refilling = None
+        self._retry_at = 0.0
+
+        self.batches = 0
+        self.last_error = None
+
+    def _use(self, context):
+        # Caller holds the lock. A refill still running for an old context finds it
+        # replaced and throws its batch away.
+        if not _same(context, self._context):
+            self._recipes = []
+            self._refilling = None
+            self._retry_at = 0.0
+        # The latest wording goes into the next refill's prompt either way.
+        self._context = context
+
+    def ensure(self, context):
+        """Starts a background refill when the pool for context is running low."""
+        with self._lock:
+            self._use(context)
+            if len(self._recipes) >= self.low_water or self._refilling is not None or time.monotonic() < self._retry_at:
+                return
+            done = self._refilling = threading.Event()
+        threading.Thread(target=contextvars.copy_context().run, args=(self._refill, context, done), name="recipe-pool", daemon=True).start()
+
+    def _refill(self, context, done):
+        prompt = PROMPT.format(count=self.batch_size, diet_prefs=context.diet_prefs, loved_str=context.loved_str, banned_str=context.banned_str)
+        try:
+            found = recipes.from_list_reply(self.ai.generate("recipe_pool", prompt, generation_config=recipes.RECIPE_LIST_CONFIG))
+            self.batches += 1
+            self.last_error = None
+        except Exception as e:
+            found = []
+            self.last_error = e
+        with self._lock:
+            if _same(context, self._context):
+                titles = {recipe.title.lower() for recipe in self._recipes}
+                for recipe in found:
+                    if recipe.title.lower() not in titles:
+                        titles.add(recipe.title.lower())
+                        self._recipes.append(recipe)
+                if not found:
+                    self._retry_at = time.monotonic() + self.retry_after
+            if self._refilling is done:
+                self._refilling = None
+        done.set()
+
+    def _take(self, context, count, exclude):
+        with self._lock:
+            self._use(context)
+            taken, kept = [], []
+            for recipe in self._recipes:
+                if len(taken) < count and recipe.title.lower() not in exclude:
+                    taken.append(recipe)
+                    exclude.add(recipe.title.lower())
+                else:
+                    kept.append(recipe)
+            self._recipes = kept
+            return taken, self._refilling
+
+    def take(self, context, count=1, exclude=(), timeout=None):
+        """Up to count distinct recipes for context, skipping titles in exclude.
+
+        With a timeout, waits that long for a refill when the pool cannot cover count;
+        otherwise returns at once with whatever is pooled (possibly nothing).
+        """
+        exclude = {title.lower() for title in exclude}
+        taken, _ = self._take(context, count, exclude)
+        if timeout is not None and len(taken) < count:
+            self.ensure(context)
+            with self._lock:
+                refilling = self._refilling
+            # No refill in progress may mean it has already finished: look again either way.
+            if refilling is None or refilling.wait(timeout):
+                more, _ = self._take(context, count - len(taken), exclude)
+                taken += more
+        self.ensure(context)
+        return taken
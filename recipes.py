@@ -0,0 +1,212 @@
+"""Structured recipes.
+
+Gemini answers recipe prompts with JSON matching RECIPE_SCHEMA. The JSON is stored
+compactly next to the rendered markdown ("Recipe JSON" on Schedule and Recipe Vault) and
+parsed once per distinct cell into an immutable Recipe, so the editor, AI Sub and the
+grocery compiler work on ingredients instead of re-reading prose. Rows without JSON
+(older rows, or a meal edited by hand in the spreadsheet) are parsed from their markdown.
+"""
+import json
+import re
+from collections import namedtuple
+from fractions import Fraction
+
+import ingredients
+
+INGREDIENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "quantity": {"type": "number", "nullable": True},
+        "unit": {"type": "string"},
+        "name": {"type": "string"},
+        "note": {"type": "string"},
+    },
+    "required": ["name"],
+}
+
+RECIPE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "ingredients": {"type": "array", "items": INGREDIENT_SCHEMA},
+    },
+    "required": ["title", "description", "ingredients"],
+}
+
+RECIPE_LIST_SCHEMA = {
+    "type": "object",
+    "properties": {"recipes": {"type": "array", "items": RECIPE_SCHEMA}},
+    "required": ["recipes"],
+}
+
+RECIPE_CONFIG = {"response_mime_type": "application/json", "response_schema": RECIPE_SCHEMA}
+RECIPE_LIST_CONFIG = {"response_mime_type": "application/json", "response_schema": RECIPE_LIST_SCHEMA}
+INGREDIENT_CONFIG = {"response_mime_type": "application/json", "response_schema": INGREDIENT_SCHEMA}
+
+# quantity is a Fraction or None; name is None when the line could not be parsed, in
+# which case only text (the display line) is meaningful.
+Ingredient = namedtuple("Ingredient", ["quantity", "unit", "name", "text"])
+
+
+class Recipe(namedtuple("Recipe", ["title", "description", "ingredients"])):
+    __slots__ = ()
+
+    def to_markdown(self):
+        lines = [f"**{self.title}**"]
+        if self.description:
+            lines.append(f"*{self.description}*")
+        if self.ingredients:
+            lines += ["", "**Ingredients needed:**"] + [f"- {item.text}" for item in self.ingredients]
+        return "\n".join(lines)
+
+    def ingredients_markdown(self):
+        """The Vault's Recipe column format: one bulleted ingredient per line."""
+        return "\n".join(f"- {item.text}" for item in self.ingredients)
+
+    def to_json(self):
+        return json.dumps({
+            "title": self.title,
+            "description": self.description,
+            "ingredients": [_ingredient_dict(item) for item in self.ingredients],
+        }, separators=(",", ":"), ensure_ascii=False)
+
+
+def _ingredient_dict(item):
+    # "text" keeps the line exactly as shown, so markdown rendered from the JSON matches the Meal cell.
+    entry = {"name": item.name or item.text, "text": item.text}
+    if item.quantity is not None:
+        entry["quantity"] = float(item.quantity)
+    if item.unit:
+        entry["unit"] = item.unit
+    return entry
+
+
+def ingredient_from_line(line):
+    text = line.strip().lstrip("-*• ").strip()
+    parsed = ingredients.parse_line(text)
+    if parsed is None:
+        return Ingredient(None, "", None, text)
+    return Ingredient(*parsed, text)
+
+
+def ingredient_from_dict(entry):
+    if entry.get("text"):
+        return ingredient_from_line(entry["text"])
+    quantity = entry.get("quantity")
+    unit = str(entry.get("unit") or "").strip()
+    amount = unit
+    if quantity is not None:
+        quantity = Fraction(quantity).limit_denominator(16)
+        canonical = ingredients.canonical_unit(unit)
+        amount = ingredients.format_amount(quantity, canonical) if canonical or not unit else f"{ingredients.format_amount(quantity, '')} {unit}"
+    text = " ".join(part for part in (amount, str(entry.get("name", "")).strip()) if part)
+    if entry.get("note"):
+        text += f", {entry['note'].strip()}"
+    return ingredient_from_line(text)
+
+
+def from_dict(data):
+    return Recipe(
+        str(data.get("title", "")).strip().strip("*"),
+        str(data.get("description", "")).strip().strip("*"),
+        tuple(ingredient_from_dict(entry) for entry in data.get("ingredients", []) if entry.get("name")),
+    )
+
+
+def from_markdown(text, title=""):
+    """Best-effort structure for a free-form recipe: bold title, italic description, ingredient lines."""
+    description = ""
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("**") and not title and "ingredients" not in stripped.lower():
+            title = stripped.strip("*").strip()
+        elif stripped.startswith("*") and not stripped.startswith(("**", "* ")) and not description:
+            description = stripped.strip("*").strip()
+    return Recipe(title, description, tuple(ingredient_from_line(line) for line in ingredients.ingredient_lines(text)))
+
+
+def from_reply(text):
+    """A Gemini recipe answer: JSON per RECIPE_SCHEMA, or markdown if the model ignored the schema."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return from_markdown(text)
+    return from_dict(data) if isinstance(data, dict) else from_markdown(text)
+
+
+def from_list_reply(text):
+    """Recipes from a RECIPE_LIST_SCHEMA answer; an unreadable answer yields none."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    entries = data.get("recipes", []) if isinstance(data, dict) else []
+    return [recipe for recipe in (from_dict(entry) for entry in entries if isinstance(entry, dict)) if recipe.title]
+
+
+def ingredient_from_reply(text):
+    """A Gemini ingredient answer: JSON per INGREDIENT_SCHEMA, or a plain line."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and data.get("name"):
+        return ingredient_from_dict(data)
+    return ingredient_from_line(text.strip().split("\n")[0])
+
+
+def load(recipe_json, markdown, title=""):
+    """Recipe for a stored cell pair. The JSON wins unless the markdown was edited since.
+
+    Uncached; MutationJournal memoises it per household (see sheets.decode).
+    """
+    if recipe_json:
+        try:
+            recipe = from_dict(json.loads(recipe_json))
+        except (ValueError, AttributeError):
+            recipe = None
+        if recipe is not None and markdown in (recipe.to_markdown(), recipe.ingredients_markdown()):
+            return recipe
+    if not markdown:
+        return None
+    return from_markdown(markdown, title)
+
+
+class RecipeStream:
+    """Iterates a streamed JSON recipe as markdown, emitting each field once it is complete.
+
+    Feed it to st.write_stream for a live preview; afterwards .text holds the raw reply.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.text = ""
+
+    def _preview(self):
+        recipe = Recipe(_string_field(self.text, "title"), _string_field(self.text, "description"), ())
+        items = re.findall(r"\{[^{}]*\}", self.text.partition('"ingredients"')[2])
+        parsed = []
+        for item in items:
+            try:
+                parsed.append(ingredient_from_dict(json.loads(item)))
+            except ValueError:
+                break
+        if not recipe.title:
+            return ""
+        return recipe._replace(ingredients=tuple(parsed)).to_markdown()
+
+    def __iter__(self):
+        shown = ""
+        for chunk in self.chunks:
+            self.text += chunk
+            preview = self._preview()
+            # Only ever append: the preview is a prefix of what the finished recipe renders as.
+            if preview.startswith(shown) and len(preview) > len(shown):
+                yield preview[len(shown):]
+                shown = preview
+
+
+def _string_field(text, field):
+    match = re.search(rf'"{field}"\s*:\s*("(?:[^"\\]|\\.)*")', text)
+    return json.loads(match.group(1)).strip().strip("*") if match else ""
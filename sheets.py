@@ -0,0 +1,345 @@
+"""Planner spreadsheet layout: schema bootstrap, batched loading and decoding."""
+import hashlib
+import types
+import uuid
+from collections import namedtuple
+
+import gspread
+
+import recipes
+
+# Tab name -> A1 column span holding its data (header row included).
+TAB_RANGES = {
+    "Schedule": "A:D",
+    "Pantry": "A:B",
+    "Recipe Vault": "A:E",
+    "Voila": "A:B",
+    "Settings": "A:B",
+    "Groceries": "A:D",
+    "Revisions": "A:B",
+}
+
+TAB_HEADERS = {
+    "Schedule": ["Day", "Status", "Meal", "Recipe JSON"],
+    "Pantry": ["Item", "ID"],
+    "Recipe Vault": ["Meal Title", "Recipe", "Rating", "Recipe JSON", "ID"],
+    "Voila": ["Item", "ID"],
+    "Settings": ["Setting", "Value"],
+    "Groceries": ["List Type", "Item", "Source", "ID"],
+    "Revisions": ["Tab", "Revision"],
+}
+
+# Grid size (rows, cols) used when a tab has to be created.
+TAB_SIZES = {
+    "Schedule": (20, 4),
+    "Pantry": (100, 2),
+    "Recipe Vault": (100, 5),
+    "Voila": (100, 2),
+    "Settings": (10, 2),
+    "Groceries": (200, 4),
+    "Revisions": (20, 2),
+}
+
+DEFAULT_SCHEDULE = [
+    ["Monday", "Cook at Home", ""],
+    ["Tuesday", "Cook Day 1 (Makes Tues & Wed meals)", ""],
+    ["Wednesday", "Prepped on Tuesday", ""],
+    ["Thursday", "Cook Day 2 (Makes Thurs & Fri meals)", ""],
+    ["Friday", "Prepped on Thursday", ""],
+    ["Saturday", "Leftovers / Flexible", ""],
+    ["Sunday", "Cook at Home", ""]
+]
+DEFAULT_PANTRY = [["Olive Oil"], ["Salt"], ["Black Pepper"], ["Garlic Powder"]]
+DEFAULT_DIET = "High-protein dinner recipes (using chicken, fish, ground turkey, or a high-protein vegetarian base). Scale all ingredient measurements to feed exactly 3 adults and 2 children for a single meal."
+
+SCHEMA_VERSION_KEY = "Schema Version"
+
+# One row per data tab holding a marker that every push to that tab replaces, so other
+# devices find out which tabs moved with one small read (see sync.SyncEngine.check).
+REVISION_TAB = "Revisions"
+TRACKED_TABS = [name for name in TAB_RANGES if name != REVISION_TAB]
+
+# Column (1-based) holding each row's stable key: a generated ID on the list tabs, and the
+# first column (Day, Setting, Tab) elsewhere. Edits address rows by key, never by position.
+ID_COLUMNS = {name: header.index("ID") + 1 for name, header in TAB_HEADERS.items() if "ID" in header}
+KEY_COLUMNS = {name: ID_COLUMNS.get(name, 1) for name in TAB_HEADERS}
+
+
+def new_id():
+    return "id-" + uuid.uuid4().hex[:10]
+
+
+def row_keys(values, key_col):
+    """Key of every row below the header. A row without one (typed into the spreadsheet by
+    hand) gets a key derived from its contents, which stops matching once it is edited."""
+    keys, seen = [], {}
+    for row in values[1:]:
+        key = row[key_col - 1] if len(row) >= key_col else ""
+        if not key:
+            content = "\x1f".join(str(cell) for cell in row)
+            seen[content] = seen.get(content, 0) + 1
+            key = "~" + hashlib.sha1(f"{content}#{seen[content]}".encode("utf-8")).hexdigest()[:10]
+        keys.append(key)
+    return keys
+
+
+def find_row(values, key_col, key):
+    """1-based sheet row of the row with key, or None."""
+    for i, row_key in enumerate(row_keys(values, key_col)):
+        if row_key == key:
+            return i + 2
+    return None
+
+
+class Items(tuple):
+    """A list tab's item names in sheet order; .keys holds each item's row key."""
+
+    def __new__(cls, names, keys):
+        items = super().__new__(cls, names)
+        items.keys = tuple(keys)
+        return items
+
+
+# --- SCHEMA BOOTSTRAP ---
+def _seed_defaults(worksheets, tabs):
+    """Version 1: headers on every tab plus the default schedule, pantry and diet."""
+    seeds = {
+        "Schedule": DEFAULT_SCHEDULE,
+        "Pantry": DEFAULT_PANTRY,
+        "Settings": [["Diet & Portions", DEFAULT_DIET]],
+    }
+    for name, header in TAB_HEADERS.items():
+        values = tabs.get(name, [])
+        rows = [] if values else [header]
+        if len(values) < 2:
+            rows += seeds.get(name, [])
+        if rows:
+            worksheets[name].append_rows(rows)
+            tabs[name] = values + rows
+
+
+def _add_grocery_source(worksheets, tabs):
+    """Version 2: each Groceries row records the compile fingerprint that produced it, or "manual"."""
+    values = tabs.get("Groceries", [])
+    if values and len(values[0]) < 3:
+        groceries_ws = worksheets["Groceries"]
+        if groceries_ws.col_count < 3:
+            groceries_ws.add_cols(3 - groceries_ws.col_count)
+        groceries_ws.update_cell(1, 3, "Source")
+        values[0] = values[0] + [""] * (2 - len(values[0])) + ["Source"]
+
+
+def _add_recipe_json(worksheets, tabs):
+    """Version 3: Schedule and Recipe Vault keep the structured recipe (see recipes.py) next to its markdown."""
+    for name in ("Schedule", "Recipe Vault"):
+        values = tabs.get(name, [])
+        if values and len(values[0]) < 4:
+            ws = worksheets[name]
+            if ws.col_count < 4:
+                ws.add_cols(4 - ws.col_count)
+            ws.update_cell(1, 4, "Recipe JSON")
+            values[0] = values[0] + [""] * (3 - len(values[0])) + ["Recipe JSON"]
+
+
+def _add_revisions(worksheets, tabs):
+    """Version 4: a revision marker row for every data tab."""
+    values = tabs.get(REVISION_TAB, [])
+    rows = [] if values else [TAB_HEADERS[REVISION_TAB]]
+    known = read_revisions(values)
+    rows += [[name, "0"] for name in TRACKED_TABS if name not in known]
+    if rows:
+        worksheets[REVISION_TAB].append_rows(rows)
+        tabs[REVISION_TAB] = values + rows
+
+
+def _add_row_ids(worksheets, tabs):
+    """Version 5: an ID column on the list tabs, filled in for every existing row."""
+    for name, col in ID_COLUMNS.items():
+        values = tabs.get(name, [])
+        if not values:
+            continue
+        ws = worksheets[name]
+        if ws.col_count < col:
+            ws.add_cols(col - ws.col_count)
+        cells = []
+        for i, row in enumerate(values):
+            if i and not any(row):
+                continue
+            if len(row) < col or not row[col - 1]:
+                value = "ID" if i == 0 else new_id()
+                cells.append(gspread.Cell(i + 1, col, value))
+                values[i] = row = row + [""] * (col - len(row))
+                row[col - 1] = value
+        if cells:
+            ws.update_cells(cells)
+
+
+# Ordered (version, migration) pairs. Each migration runs exactly once per spreadsheet.
+MIGRATIONS = [
+    (1, _seed_defaults),
+    (2, _add_grocery_source),
+    (3, _add_recipe_json),
+    (4, _add_revisions),
+    (5, _add_row_ids),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def read_schema_version(settings_values):
+    for i, row in enumerate(settings_values):
+        if row and row[0] == SCHEMA_VERSION_KEY:
+            value = row[1] if len(row) > 1 else ""
+            return (int(value) if str(value).isdigit() else 0), i + 1
+    return 0, None
+
+
+def bootstrap(db):
+    """Returns every tab's worksheet handle, creating tabs and running pending migrations.
+
+    Costs one metadata call and one read of the small Settings tab, which holds the schema
+    version, when the schema is current; the other tabs are only read to migrate them.
+    """
+    worksheets = {ws.title: ws for ws in db.worksheets()}
+    for name in TAB_RANGES:
+        if name not in worksheets:
+            rows, cols = TAB_SIZES[name]
+            worksheets[name] = db.add_worksheet(title=name, rows=rows, cols=cols)
+
+    settings = fetch_tabs(db, ["Settings"])["Settings"]
+    version, version_row = read_schema_version(settings)
+    if version >= SCHEMA_VERSION:
+        return worksheets
+
+    tabs = fetch_tabs(db)
+    for target, migrate in MIGRATIONS:
+        if version < target:
+            migrate(worksheets, tabs)
+
+    settings_ws = worksheets["Settings"]
+    version, version_row = read_schema_version(tabs["Settings"])
+    if version_row:
+        settings_ws.update_cell(version_row, 2, SCHEMA_VERSION)
+    else:
+        settings_ws.append_row([SCHEMA_VERSION_KEY, SCHEMA_VERSION])
+    return worksheets
+
+
+# --- LOADING ---
+
+
+def fetch_tabs(db, names=None):
+    """Reads every tab (or just names) with a single values:batchGet call."""
+    names = list(names or TAB_RANGES)
+    ranges = [f"'{name}'!{TAB_RANGES[name]}" for name in names]
+    response = db.values_batch_get(ranges)
+    value_ranges = response.get("valueRanges", [])
+    return {name: vr.get("values", []) for name, vr in zip(names, value_ranges)}
+
+
+def fetch_revisions(db):
+    """Every tab's revision marker, in one small values:get call."""
+    response = db.values_get(f"'{REVISION_TAB}'!{TAB_RANGES[REVISION_TAB]}")
+    return read_revisions(response.get("values", []))
+
+
+def read_revisions(values):
+    return {row[0]: (row[1] if len(row) > 1 else "") for row in values[1:] if row}
+
+
+def with_revisions(values, revisions):
+    """values of the Revisions tab with the given tabs' markers replaced (or added)."""
+    values = [list(row) for row in values] or [TAB_HEADERS[REVISION_TAB]]
+    remaining = dict(revisions)
+    for row in values[1:]:
+        if row and row[0] in remaining:
+            row[1:] = [remaining.pop(row[0])]
+    values += [[name, revision] for name, revision in remaining.items()]
+    return values
+
+
+def to_records(values):
+    """Same shape as gspread's get_all_records: one dict per row keyed by the header."""
+    if len(values) < 2:
+        return []
+    header = values[0]
+    records = []
+    for row in values[1:]:
+        padded = list(row) + [""] * (len(header) - len(row))
+        records.append(dict(zip(header, padded)))
+    return records
+
+
+def to_column(values):
+    """Same shape as gspread's col_values(1): first cell of every row, header included."""
+    return [row[0] if row else "" for row in values]
+
+
+# Decoded rows. One decoded view of a tab is shared by every session until the tab changes,
+# so views are built from tuples and read-only mappings: compact, and safe to hand out.
+Day = namedtuple("Day", ["status", "meal", "structured"])
+VaultMeal = namedtuple("VaultMeal", ["recipe", "rating", "structured", "key", "row_index"])
+GroceryItem = namedtuple("GroceryItem", ["list_type", "item", "source", "key"])
+
+
+def decode_schedule(values, load_recipe=recipes.load):
+    return types.MappingProxyType({
+        row["Day"]: Day(
+            str(row["Status"]),
+            str(row["Meal"]),
+            load_recipe(row.get("Recipe JSON", ""), str(row["Meal"])),
+        ) for row in to_records(values)
+    })
+
+
+def decode_items(tab):
+    def decode(values):
+        return Items(to_column(values)[1:], row_keys(values, KEY_COLUMNS[tab]))
+    return decode
+
+
+def decode_vault(values, load_recipe=recipes.load):
+    return types.MappingProxyType({
+        str(row["Meal Title"]): VaultMeal(
+            str(row["Recipe"]),
+            str(row["Rating"]),
+            load_recipe(row.get("Recipe JSON", ""), str(row["Recipe"]), str(row["Meal Title"])),
+            key,
+            i + 2,
+        ) for i, (row, key) in enumerate(zip(to_records(values), row_keys(values, KEY_COLUMNS["Recipe Vault"]))) if row.get("Meal Title")
+    })
+
+
+def decode_groceries(values):
+    """GroceryItems in sheet order, each with its row key."""
+    return tuple(
+        GroceryItem(str(row["List Type"]), str(row["Item"]), str(row.get("Source", "")), key)
+        for row, key in zip(to_records(values), row_keys(values, KEY_COLUMNS["Groceries"]))
+    )
+
+
+def decode_settings(values):
+    diet_prefs = "High-protein recipes."
+    for row in to_records(values):
+        if row.get("Setting") == "Diet & Portions":
+            diet_prefs = str(row.get("Value"))
+    return diet_prefs
+
+
+# What the app reads from each tab. Results are shared between sessions and reruns.
+DECODERS = {
+    "Schedule": decode_schedule,
+    "Pantry": decode_items("Pantry"),
+    "Recipe Vault": decode_vault,
+    "Voila": decode_items("Voila"),
+    "Settings": decode_settings,
+    "Groceries": decode_groceries,
+}
+RECIPE_TABS = ("Schedule", "Recipe Vault")
+
+
+def decode(tab, values, load_recipe=recipes.load):
+    """DECODERS[tab](values), reading the recipe cells of RECIPE_TABS with load_recipe
+    (recipes.load, or a memoised copy of it)."""
+    if tab in RECIPE_TABS:
+        return DECODERS[tab](values, load_recipe)
+    return DECODERS[tab](values)
@@ -0,0 +1,262 @@
+"""Background two-way sync between the local SQLite mirror and the spreadsheet.
+
+Push: queued edits are sent as one batchUpdate per worksheet shortly after they are
+made, and retried with backoff while Sheets is over quota, failing or unreachable.
+Edits address rows by key and are placed against a fresh read of the tab, and edits
+that would overwrite another device's change are dropped as conflicts. When Sheets
+refuses a batch outright (see retryable), the tab's edits are sent one at a time and
+only those it refuses are dropped as conflicts, so they cannot hold up the queue
+forever. The same batchUpdate replaces the tab's marker on the Revisions tab.
+Check: on request (every rerun, throttled) the markers are read with one small call and
+only the tabs whose marker moved are pulled, so edits from other devices show up within
+seconds without re-reading everything.
+Pull: tabs are re-read with one batched call and reconciled into the mirror row by row,
+with still-queued local edits replayed on top so nothing the user did is lost. A full
+pull every `interval` catches edits made by hand in the spreadsheet, which leave the
+markers alone.
+"""
+import atexit
+import contextvars
+import threading
+import time
+import uuid
+
+import gspread
+
+import journal
+import sheets
+
+
+def retryable(error):
+    """Whether a failed request may succeed if sent again. Only Sheets refusing the request
+    itself (a 4xx other than 408 and 429) is final; quota, server trouble, network errors
+    and failed auth token refreshes all pass, and so does anything unforeseen."""
+    if isinstance(error, gspread.exceptions.APIError):
+        status = getattr(error.response, "status_code", None) or error.code
+        return not 400 <= status < 500 or status in (408, 429)
+    return True
+
+
+class SyncEngine:
+    def __init__(self, db, worksheets, store, interval=300.0, check_interval=5.0, debounce=1.0, max_backoff=60.0):
+        self.db = db
+        self.worksheets = worksheets
+        self.store = store
+        self.interval = interval
+        self.check_interval = check_interval
+        self.debounce = debounce
+        self.max_backoff = max_backoff
+
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._push_at = None
+        # Background pushes and checks are traced as part of the script run that asked for them.
+        self._push_context = contextvars.copy_context()
+        self._check_context = self._push_context
+        self._pulled_at = 0.0
+        self._checked_at = 0.0
+        self._check_due = False
+        self._failures = 0
+        self._thread = None
+
+        self.last_error = None
+        self.pushes = 0
+        self.pulls = 0
+        self.checks = 0
+        self.conflicts = []
+
+    def start(self):
+        """Pulls first if the mirror has never been filled, then keeps syncing in the background."""
+        if not self.store.has_synced():
+            self.pull()
+        else:
+            self._pulled_at = time.monotonic()
+        if self.store.pending_count():
+            self.request_push()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+            self._thread.start()
+            atexit.register(self.push)
+
+    def request_push(self, delay=None):
+        with self._lock:
+            due = time.monotonic() + (self.debounce if delay is None else delay)
+            if self._failures and self._push_at is not None:
+                due = max(due, self._push_at)
+            self._push_at = due
+            self._push_context = contextvars.copy_context()
+        self._wake.set()
+
+    def request_check(self):
+        """Asks the sync thread to look for tabs changed elsewhere, at most once per check_interval."""
+        with self._lock:
+            if self._check_due or time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._check_due = True
+            self._check_context = contextvars.copy_context()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                deadlines = [self._pulled_at + self.interval]
+                if self._push_at is not None:
+                    deadlines.append(self._push_at)
+            self._wake.wait(timeout=max(0.0, min(deadlines) - time.monotonic()))
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                push_due = self._push_at is not None and now >= self._push_at
+                check_due, self._check_due = self._check_due, False
+                push_context, check_context = self._push_context, self._check_context
+            if push_due:
+                try:
+                    push_context.run(self.push)
+                except Exception as e:
+                    # Back off and try again rather than let the sync thread die.
+                    self._push_failed(e)
+            if check_due:
+                try:
+                    check_context.run(self.check)
+                except Exception as e:
+                    self.last_error = e
+            if now - self._pulled_at >= self.interval:
+                try:
+                    self.pull()
+                except Exception as e:
+                    self.last_error = e
+                    self._pulled_at = now
+
+    def push(self):
+        """Sends every queued edit now. Returns True when the outbox was fully drained.
+
+        The tabs about to be written are read first and each edit is placed against them
+        as they are at that moment (journal.resolve), so rows other devices added, moved or
+        removed are never hit by mistake. The same read brings those tabs up to date here.
+        """
+        with self._sync_lock:
+            with self._lock:
+                self._push_at = None
+            queued = self.store.claim()
+            by_tab = {}
+            for op_id, tab, op in queued:
+                ids, ops = by_tab.setdefault(tab, ([], []))
+                ids.append(op_id)
+                ops.append(op)
+
+            try:
+                remote = sheets.fetch_tabs(self.db, list(by_tab)) if by_tab else {}
+            except Exception as e:
+                self._push_failed(e)
+                return False
+
+            for tab, (ids, ops) in by_tab.items():
+                values = remote[tab]
+                unchanged = [list(row) for row in values]
+                try:
+                    try:
+                        revision, conflicts = self._send(tab, values, ops)
+                    except Exception as e:
+                        if retryable(e):
+                            raise
+                        # Sent again, the batch would fail again and block every tab queued
+                        # after it. Find the edits Sheets refuses by sending them one by one.
+                        values = unchanged
+                        revision, conflicts = self._send_singly(tab, values, ids, ops)
+                except Exception as e:
+                    self._push_failed(e)
+                    return False
+                self.store.ack(ids)
+                # values now holds exactly what the spreadsheet has after this push.
+                self.store.reconcile(tab, values, time.time())
+                if revision:
+                    self._remember({tab: revision})
+                self.conflicts += [(tab, op) for op in conflicts]
+                self.pushes += 1
+
+            with self._lock:
+                self._failures = 0
+                self.last_error = None
+            return True
+
+    def _send(self, tab, values, ops):
+        """Writes ops, placed against values (updated to match), and tab's new marker in one
+        batchUpdate. Returns (the new revision or None if nothing was written, conflicts)."""
+        resolved, conflicts = journal.resolve(values, ops)
+        if not resolved:
+            return None, conflicts
+        revision, marker = self._marker(tab)
+        self.db.batch_update({"requests": journal.ops_to_requests(self.worksheets[tab].id, resolved) + marker})
+        return revision, conflicts
+
+    def _send_singly(self, tab, values, ids, ops):
+        """_send() for one op at a time, each acknowledged once it is settled. Ops Sheets
+        refuses are left out of values and returned among the conflicts."""
+        revision, conflicts = None, []
+        for op_id, op in zip(ids, ops):
+            before = [list(row) for row in values]
+            try:
+                sent, dropped = self._send(tab, values, [op])
+            except Exception as e:
+                if retryable(e):
+                    raise
+                values[:] = before
+                sent, dropped = None, [op]
+            self.store.ack([op_id])
+            revision = sent or revision
+            conflicts += dropped
+        return revision, conflicts
+
+    def _push_failed(self, error):
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            self._push_at = time.monotonic() + min(self.max_backoff, self.debounce * 2 ** self._failures)
+        self._wake.set()
+
+    def _marker(self, tab):
+        """(new revision, requests writing it to tab's row on the Revisions tab)."""
+        found = self.store.find(sheets.REVISION_TAB, tab)
+        if found is None:
+            return None, []
+        revision = "r" + uuid.uuid4().hex[:12]
+        sheet_id = self.worksheets[sheets.REVISION_TAB].id
+        return revision, journal.ops_to_requests(sheet_id, [("update", found[0], 2, revision)])
+
+    def _remember(self, revisions):
+        values = sheets.with_revisions(self.store.values(sheets.REVISION_TAB), revisions)
+        self.store.reconcile(sheets.REVISION_TAB, values, time.time())
+
+    def check(self):
+        """Pulls only the tabs whose revision marker moved since they were last read. Returns their names."""
+        with self._sync_lock:
+            return self._check()
+
+    def _check(self):
+        remote = sheets.fetch_revisions(self.db)
+        known = sheets.read_revisions(self.store.values(sheets.REVISION_TAB))
+        changed = [tab for tab in sheets.TRACKED_TABS if tab in remote and remote[tab] != known.get(tab)]
+        if changed:
+            self._pull(changed)
+            # Remember the markers as read before the pull: a tab written again in
+            # between is merely pulled once more on the next check.
+            self._remember({tab: remote[tab] for tab in changed})
+        with self._lock:
+            self._checked_at = time.monotonic()
+        self.checks += 1
+        return changed
+
+    def pull(self, names=None):
+        """Re-reads tabs (all by default) from the spreadsheet and reconciles them into the mirror."""
+        with self._sync_lock:
+            self._pull(names)
+            if names is None:
+                self._pulled_at = time.monotonic()
+
+    def _pull(self, names):
+        remote = sheets.fetch_tabs(self.db, names)
+        now = time.time()
+        for tab, values in remote.items():
+            self.store.reconcile(tab, values, now)
+        self.pulls += 1
@@ -0,0 +1,68 @@
+import pytest
+
+import ai_cache
+import fakes
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = ai_cache.ResponseCache(":memory:")
+    cache.put("k", "grocery_list", "### Produce")
+    clock[0] += 59
+    assert cache.get("k", "grocery_list", ttl=60) == "### Produce"
+    clock[0] += 2
+    assert cache.get("k", "grocery_list", ttl=60) is None
+    assert cache.stats()["sites"]["grocery_list"] == {"hits": 1, "misses": 1}
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ai_cache.ResponseCache(":memory:", max_entries=3)
+    for key in "abc":
+        clock[0] += 1
+        cache.put(key, "ai_sub", key.upper())
+    clock[0] += 1
+    cache.get("a", "ai_sub", ttl=60)
+    clock[0] += 1
+    cache.put("d", "ai_sub", "D")
+    assert [key for key in "abcd" if cache.get(key, "ai_sub", ttl=60)] == ["a", "c", "d"]
+
+
+def test_eviction_keeps_the_cache_under_its_byte_limit(clock):
+    cache = ai_cache.ResponseCache(":memory:", max_bytes=250)
+    for n in range(10):
+        clock[0] += 1
+        cache.put(f"k{n}", "ai_sub", "x" * 100)
+    assert cache.stats()["bytes"] <= 250
+    assert cache.get("k9", "ai_sub", ttl=60) is not None
+
+
+def test_cache_key_ignores_whitespace_but_not_the_schema():
+    key = ai_cache.cache_key("flash", "  Sort these:\n   eggs ")
+    assert key == ai_cache.cache_key("flash", "Sort these: eggs")
+    assert key != ai_cache.cache_key("pro", "Sort these: eggs")
+    assert key != ai_cache.cache_key("flash", "Sort these: eggs", {"response_mime_type": "application/json"})
+
+
+class FakeBudget:
+    model_name = "flash"
+
+    def __init__(self):
+        self.model = fakes.FakeGenerativeModel()
+
+    def generate_content(self, prompt, cancel=None, generation_config=None, site=""):
+        return self.model.generate_content(prompt, generation_config=generation_config)
+
+
+def test_only_cacheable_sites_reuse_answers():
+    budget = FakeBudget()
+    model = ai_cache.CachedModel(budget, ai_cache.ResponseCache(":memory:"))
+    assert model.generate("voila_merge", "DUPLICATE? eggs") == model.generate("voila_merge", "DUPLICATE?  eggs")
+    model.generate("new_meal", "Suggest a meal")
+    model.generate("new_meal", "Suggest a meal")
+    assert len(budget.model.calls) == 3
@@ -0,0 +1,31 @@
+import pytest
+
+import cart_match
+
+CART = ["2 Cartons Milk", "1 Lb Ground Beef", "Scallions", "Bananas", "Green Apples", "Red Apples"]
+
+
+@pytest.mark.parametrize("item, verdict, match, merged", [
+    ("1 carton milk", "duplicate", 0, "3 Cartons Milk"),
+    ("8 oz ground beef", "duplicate", 1, "1 1/2 Lb Ground Beef"),
+    ("Banana", "duplicate", 3, "2 Bananas"),
+    ("Green Apple", "duplicate", 4, "2 Green Apples"),
+    # Same product, but the amounts cannot be added up: Gemini decides.
+    ("1 L milk", "ambiguous", [0], None),
+    ("mince", "ambiguous", [1], None),
+    ("1 bunch spring onion", "ambiguous", [2], None),
+    ("apples", "ambiguous", [5, 4], None),
+    ("Toilet Paper", "new", None, None),
+    ("", "new", None, None),
+])
+def test_match(item, verdict, match, merged):
+    assert cart_match.CartIndex(CART).match(item) == (verdict, match, merged)
+
+
+def test_match_key_folds_plurals_and_synonyms():
+    assert cart_match.match_key("Spring Onions") == cart_match.match_key("scallion") == "green onion"
+
+
+def test_merge_lines_refuses_mismatched_units():
+    assert cart_match.merge_lines("2 Cartons Milk", "1 L milk") is None
+    assert cart_match.merge_lines("1 Lb Ground Beef", "8 oz ground beef") == "1 1/2 Lb Ground Beef"
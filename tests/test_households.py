@@ -0,0 +1,54 @@
+import pytest
+
+import households
+
+SECRETS = {
+    "GCP_SERVICE_ACCOUNT": "shared",
+    "SHEET_URL": "top-level",
+    "GEMINI_RPM": 60,
+    "households": {
+        "smith": {"SHEET_URL": "smith-sheet", "TOKEN": "s3cret-smith"},
+        "jones": {"SHEET_URL": "jones-sheet", "TOKEN": "s3cret-jones", "GEMINI_RPM": 10},
+        "open": {"SHEET_URL": "open-sheet"},
+    },
+}
+
+
+def test_single_family_install():
+    secrets = {"SHEET_URL": "only", "GCP_SERVICE_ACCOUNT": "sa"}
+    assert households.names(secrets) == [households.DEFAULT]
+    assert households.settings(secrets, households.DEFAULT)["SHEET_URL"] == "only"
+    assert households.settings(secrets, households.DEFAULT)["LOCAL_DB_PATH"] == "meal_planner.sqlite3"
+    assert households.admits(secrets, households.DEFAULT, None)
+
+
+def test_household_settings():
+    assert households.names(SECRETS) == ["jones", "open", "smith"]
+    smith = households.settings(SECRETS, "smith")
+    assert smith["SHEET_URL"] == "smith-sheet"
+    assert smith["GCP_SERVICE_ACCOUNT"] == "shared"
+    assert smith["LOCAL_DB_PATH"] == "meal_planner_smith.sqlite3"
+    assert smith["GEMINI_RPM"] == 20
+    assert households.settings(SECRETS, "jones")["GEMINI_RPM"] == 10
+    with pytest.raises(KeyError):
+        households.settings(SECRETS, "default")
+
+
+@pytest.mark.parametrize("name, token, admitted", [
+    ("smith", "s3cret-smith", True),
+    ("smith", "s3cret-jones", False),
+    ("smith", "", False),
+    ("smith", None, False),
+    ("open", "", False),
+    ("default", None, False),
+    ("nobody", "s3cret-smith", False),
+])
+def test_admits(name, token, admitted):
+    assert households.admits(SECRETS, name, token) is admitted
+
+
+def test_a_household_named_default_is_an_ordinary_household():
+    secrets = {"SHEET_URL": "top-level", "households": {"default": {"SHEET_URL": "its-own", "TOKEN": "t0ken"}}}
+    assert households.settings(secrets, "default")["SHEET_URL"] == "its-own"
+    assert not households.admits(secrets, "default", None)
+    assert households.admits(secrets, "default", "t0ken")
@@ -0,0 +1,59 @@
+from fractions import Fraction
+
+import pytest
+
+import grocery_lists
+import ingredients
+
+
+@pytest.mark.parametrize("line, parsed", [
+    ("2 (15 oz) cans black beans, drained", (Fraction(2), "can", "black beans")),
+    ("½ lb ground turkey", (Fraction(1, 2), "lb", "ground turkey")),
+    ("1 1/2 Cups rice", (Fraction(3, 2), "cup", "rice")),
+    ("1-2 tbsp olive oil", (Fraction(2), "tbsp", "olive oil")),
+    ("3 cloves garlic, minced", (Fraction(3), "clove", "garlic")),
+    ("a pinch of salt", (Fraction(1), "pinch", "salt")),
+    ("Salt and pepper to taste", (None, "", "Salt and pepper")),
+])
+def test_parse_line(line, parsed):
+    assert ingredients.parse_line(line) == parsed
+
+
+def test_parse_line_gives_up_on_prose():
+    assert ingredients.parse_line("Serve with whatever vegetables the kids will actually eat tonight please") is None
+
+
+def test_name_key():
+    assert ingredients.name_key("Tomatoes, diced") == "tomato"
+    assert ingredients.name_key("Red Bell Peppers") == "red bell pepper"
+    assert ingredients.name_key("ground beef") == "ground beef"
+
+
+def test_ingredient_lines_skip_titles_and_steps():
+    text = "**Chili**\n*A cozy bowl.*\nFor the sauce:\n- 1 lb beef\n* 2 cups beans\n1. Brown the beef."
+    assert ingredients.ingredient_lines(text) == ["1 lb beef", "2 cups beans"]
+
+
+def test_aggregator_combines_units_and_skips_the_pantry():
+    aggregator = ingredients.GroceryAggregator(["Olive Oil", "Salt"])
+    aggregator.add_recipe("- 1 lb chicken breast\n- 8 oz chicken breast\n- 2 tbsp olive oil\n- kosher salt\n- 1 cup rice")
+    aggregator.add_line("Serve with whatever vegetables the kids will actually eat tonight please")
+    assert aggregator.grouped() == {"Meat & Seafood": ["1 1/2 lb chicken breast"], "Pantry & Dry Goods": ["1 cup rice"]}
+    assert aggregator.pantry_hits == {"olive oil", "kosher salt"}
+    assert len(aggregator.unparsed) == 1
+
+
+def test_to_list_items_orders_aisles():
+    items = ingredients.to_list_items({"Other": ["Joy"], "Produce": ["2 onion", "1 apple"]})
+    assert items == ["### Produce", "1 apple", "2 onion", "### Other", "Joy"]
+
+
+def test_a_partially_sorted_list_is_compiled_again():
+    aggregator = ingredients.GroceryAggregator([])
+    aggregator.add_parsed(1, "lb", "chicken")
+    fingerprint = grocery_lists.fingerprint("\nChicken Bowl", aggregator)
+    header = ["List Type", "Item", "Source", "ID"]
+    done = [header, ["Cook", "Chicken", fingerprint, "id-1"]]
+    partial = [header, ["Cook", "Chicken", fingerprint + grocery_lists.PARTIAL, "id-1"]]
+    assert grocery_lists.is_current(done, "Cook", fingerprint, aggregator)
+    assert not grocery_lists.is_current(partial, "Cook", fingerprint, aggregator)
@@ -0,0 +1,74 @@
+import threading
+
+import jobs
+
+
+def wait(job, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if not job.active:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{job.name} still {job.state}")
+
+
+def test_a_job_reports_its_result_and_progress():
+    runner = jobs.JobRunner()
+
+    def pipeline(job, meals):
+        job.progress(len(meals), len(meals), "Planned.")
+        return meals
+
+    job = wait(runner.submit("autofill", pipeline, ["Tacos", "Soup"]))
+    assert (job.state, job.result, job.message, job.fraction()) == ("done", ["Tacos", "Soup"], "Planned.", 1.0)
+    assert runner.get("autofill") is job
+
+
+def test_a_failed_job_keeps_its_error():
+    def pipeline(job):
+        raise ValueError("no meals")
+
+    job = wait(jobs.JobRunner().submit("autofill", pipeline))
+    assert job.state == "failed"
+    assert isinstance(job.error, ValueError)
+
+
+def test_asking_again_while_running_joins_the_job():
+    runner = jobs.JobRunner()
+    release = threading.Event()
+    calls = []
+
+    def pipeline(job):
+        calls.append(job.id)
+        release.wait(5)
+        return len(calls)
+
+    first = runner.submit("groceries", pipeline)
+    second = runner.submit("groceries", pipeline)
+    assert second is first
+    release.set()
+    wait(first)
+    assert (calls, runner.started, runner.joined) == ([first.id], 1, 1)
+    # Once finished, asking again starts a new run.
+    third = wait(runner.submit("groceries", pipeline))
+    assert third is not first and third.result == 2
+
+
+def test_jobs_sharing_a_lock_never_overlap():
+    runner = jobs.JobRunner(workers=4)
+    running, seen = set(), []
+    guard = threading.Lock()
+
+    def pipeline(job):
+        with guard:
+            running.add(job.name)
+            seen.append(len(running - {"other"}))
+        threading.Event().wait(0.05)
+        with guard:
+            running.discard(job.name)
+
+    submitted = [runner.submit(name, pipeline, lock="schedule") for name in ("autofill", "groceries", "regenerate")]
+    submitted.append(runner.submit("other", pipeline))
+    for job in submitted:
+        assert wait(job).state == "done"
+    # However the unlocked job interleaved, no two locked jobs ever ran at once.
+    assert max(seen) == 1
@@ -0,0 +1,90 @@
+import journal
+from local_store import LocalStore
+
+
+def test_coalesce_merges_updates_to_one_row():
+    ops = []
+    journal.coalesce(ops, ("update_row", 1, "Monday", [[3, "Tacos"]], [[3, "Soup"]]))
+    journal.coalesce(ops, ("update_row", 1, "Monday", [[3, "Chili"], [4, "{}"]], [[3, "Tacos"], [4, "x"]]))
+    # Expectations are the first edit's, plus any for cells only the second one read.
+    assert ops == [("update_row", 1, "Monday", [[3, "Chili"], [4, "{}"]], [[3, "Soup"], [4, "x"]])]
+
+
+def test_coalesce_keeps_updates_to_other_rows_apart():
+    ops = []
+    journal.coalesce(ops, ("update_row", 1, "Monday", [[3, "Tacos"]], None))
+    journal.coalesce(ops, ("update_row", 1, "Tuesday", [[3, "Chili"]], None))
+    assert len(ops) == 2
+
+
+def test_coalesce_does_not_merge_across_a_delete():
+    ops = []
+    journal.coalesce(ops, ("update_row", 2, "id-a", [[1, "Rice"]], None))
+    journal.coalesce(ops, ("delete_keys", 2, ["id-b"]))
+    journal.coalesce(ops, ("update_row", 2, "id-a", [[1, "Oats"]], None))
+    assert [op[0] for op in ops] == ["update_row", "delete_keys", "update_row"]
+
+
+def test_coalesce_joins_appends_and_adjacent_deletes():
+    ops = []
+    journal.coalesce(ops, ("append", [["Rice", "id-a"]]))
+    journal.coalesce(ops, ("append", [["Oats", "id-b"]]))
+    assert ops == [("append", [["Rice", "id-a"], ["Oats", "id-b"]])]
+
+    ops = []
+    journal.coalesce(ops, ("delete", 5, 5))
+    journal.coalesce(ops, ("delete", 4, 4))
+    journal.coalesce(ops, ("delete", 4, 4))
+    assert ops == [("delete", 4, 6)]
+
+
+def test_resolve_places_keyed_ops_against_current_rows():
+    values = [["Item", "ID"], ["Rice", "id-a"], ["Salt", "id-b"], ["Oats", "id-c"]]
+    resolved, conflicts = journal.resolve(values, [
+        ("delete_keys", 2, ["id-c", "id-a", "id-gone"]),
+        ("update_row", 2, "id-b", [[1, "Sea Salt"]], [[1, "Salt"]]),
+    ])
+    assert resolved == [("delete", 4, 4), ("delete", 2, 2), ("update", 2, 1, "Sea Salt")]
+    assert conflicts == []
+    assert values == [["Item", "ID"], ["Sea Salt", "id-b"]]
+
+
+def test_resolve_reports_updates_whose_row_changed_or_went():
+    values = [["Item", "ID"], ["Rock Salt", "id-b"]]
+    changed = ("update_row", 2, "id-b", [[1, "Sea Salt"]], [[1, "Salt"]])
+    gone = ("update_row", 2, "id-z", [[1, "Oats"]], None)
+    resolved, conflicts = journal.resolve(values, [changed, gone])
+    assert resolved == []
+    assert conflicts == [changed, gone]
+
+
+def test_resolve_accepts_a_retried_update_that_already_landed():
+    values = [["Item", "ID"], ["Sea Salt", "id-b"]]
+    op = ("update_row", 2, "id-b", [[1, "Sea Salt"]], [[1, "Salt"]])
+    resolved, conflicts = journal.resolve(values, [op])
+    assert conflicts == []
+    assert resolved == [("update", 2, 1, "Sea Salt")]
+
+
+def test_cells_go_out_as_text():
+    requests = journal.ops_to_requests(7, [("append", [["007", "id-a"]]), ("update", 2, 1, 5)])
+    cells = requests[0]["appendCells"]["rows"][0]["values"] + requests[1]["updateCells"]["rows"][0]["values"]
+    assert [cell["userEnteredValue"] for cell in cells] == [{"stringValue": "007"}, {"stringValue": "id-a"}, {"stringValue": "5"}]
+
+
+def test_views_reuse_unchanged_recipes_per_household():
+    schedule = [["Day", "Status", "Meal", "Recipe JSON"], ["Monday", "Cook", "1 cup rice"], ["Tuesday", "Cook", "2 eggs"]]
+
+    def household():
+        store = LocalStore(":memory:")
+        store.reconcile("Schedule", schedule, 0)
+        return store, journal.MutationJournal(store, engine=None)
+
+    store, planner = household()
+    monday = planner.view("Schedule")["Monday"].structured
+    store.record("Schedule", ("update_row", 1, "Tuesday", [[3, "3 eggs"]], None))
+    view = planner.view("Schedule")
+    assert view["Tuesday"].meal == "3 eggs"
+    assert view["Monday"].structured is monday
+    # Another household decodes the same cells itself.
+    assert household()[1].view("Schedule")["Monday"].structured is not monday
@@ -0,0 +1,59 @@
+import json
+import random
+import sqlite3
+
+import journal
+import local_store
+import sheets
+
+
+def pantry(rows):
+    return [["Item", "ID"]] + [list(row) for row in rows]
+
+
+def test_keyed_ops_through_the_index_match_the_journal():
+    rng = random.Random(4)
+    for _ in range(50):
+        store = local_store.LocalStore(":memory:")
+        values = pantry([f"item {n}", sheets.new_id() if rng.random() < 0.8 else ""] for n in range(8))
+        store.reconcile("Pantry", values, 0)
+        for _ in range(10):
+            keys = sheets.row_keys(values, 2)
+            if keys and rng.random() < 0.4:
+                op = ("delete_keys", 2, rng.sample(keys, min(len(keys), 2)) + ["id-gone"])
+            elif keys and rng.random() < 0.7:
+                op = ("update_row", 2, rng.choice(keys), [[1, f"edit {rng.random()}"]], None)
+            else:
+                op = ("append", [[f"new {rng.random()}", sheets.new_id()]])
+            store.record("Pantry", op)
+            journal.apply_op(values, op)
+            assert store.values("Pantry") == values
+
+
+def test_find_uses_the_key_column():
+    store = local_store.LocalStore(":memory:")
+    store.reconcile("Pantry", pantry([["Salt", "id-a"], ["Rice", "id-b"]]), 0)
+    assert store.find("Pantry", "id-b") == (3, ["Rice", "id-b"])
+    assert store.find("Pantry", "Rice") is None
+
+
+def test_old_mirrors_are_rekeyed(tmp_path):
+    path = str(tmp_path / "mirror.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(local_store.SCHEMA)
+    conn.execute("INSERT INTO rows (tab, pos, key, cells) VALUES ('Pantry', 2, 'Salt', ?)", (json.dumps(["Salt", "id-a"]),))
+    conn.commit()
+    conn.close()
+
+    store = local_store.LocalStore(path)
+    assert store.find("Pantry", "id-a") == (2, ["Salt", "id-a"])
+
+
+def test_unpushed_edits_survive_a_pull():
+    store = local_store.LocalStore(":memory:")
+    store.reconcile("Pantry", pantry([["Salt", "id-a"]]), 0)
+    store.record("Pantry", ("append", [["Rice", "id-b"]]))
+    # Another device added a row; the pull must not lose the queued one.
+    store.reconcile("Pantry", pantry([["Salt", "id-a"], ["Oats", "id-c"]]), 1)
+    assert store.values("Pantry") == pantry([["Salt", "id-a"], ["Oats", "id-c"], ["Rice", "id-b"]])
+    assert store.pending_count() == 1
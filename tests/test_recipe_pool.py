@@ -0,0 +1,60 @@
+import fakes
+import recipe_pool
+
+
+class FakeAI:
+    """The CachedModel.generate surface, answered by fakes.FakeGenerativeModel."""
+
+    def __init__(self, fail=False):
+        self.model = fakes.FakeGenerativeModel()
+        self.fail = fail
+
+    def generate(self, site, prompt, cancel=None, generation_config=None):
+        if self.fail:
+            raise RuntimeError("quota")
+        return self.model.generate_content(prompt, generation_config=generation_config).text
+
+
+def context(diet="High-protein", loved=("Tacos",), banned=(), loved_str="Tacos"):
+    return recipe_pool.Context(diet, frozenset(loved), frozenset(banned), loved_str, ", ".join(banned) or "None")
+
+
+def test_nothing_is_generated_until_a_recipe_is_asked_for():
+    ai = FakeAI()
+    pool = recipe_pool.RecipePool(ai)
+    assert ai.model.calls == []
+    taken = pool.take(context(), count=3, timeout=5)
+    assert len({recipe.title for recipe in taken}) == 3
+    assert len(ai.model.calls) == 1
+
+
+def test_take_serves_from_the_pool_and_skips_excluded_titles():
+    ai = FakeAI()
+    pool = recipe_pool.RecipePool(ai, batch_size=8, low_water=3)
+    first = pool.take(context(), count=2, timeout=5)
+    second = pool.take(context(), count=2, exclude=[first[0].title.upper()])
+    assert len(second) == 2
+    assert not {recipe.title for recipe in first} & {recipe.title for recipe in second}
+    assert len(ai.model.calls) == 1
+
+
+def test_a_different_context_empties_the_pool():
+    ai = FakeAI()
+    pool = recipe_pool.RecipePool(ai)
+    pool.take(context(), count=1, timeout=5)
+    # Rewording the same loved meals keeps the pool; a new diet does not.
+    assert pool.take(context(loved_str="Tacos (5 stars)"), count=1)
+    assert pool.take(context(diet="Vegetarian"), count=1) == []
+    assert len(pool.take(context(diet="Vegetarian"), count=1, timeout=5)) == 1
+    assert "Vegetarian" in ai.model.calls[-1]
+    assert pool.take(context(diet="Vegetarian", banned=("Tacos",)), count=1) == []
+
+
+def test_a_failed_refill_waits_before_trying_again():
+    ai = FakeAI(fail=True)
+    pool = recipe_pool.RecipePool(ai, retry_after=60.0)
+    assert pool.take(context(), count=1, timeout=5) == []
+    assert isinstance(pool.last_error, RuntimeError)
+    ai.fail = False
+    assert pool.take(context(), count=1, timeout=0.1) == []
+    assert ai.model.calls == []
@@ -0,0 +1,56 @@
+import fakes
+import sheets
+
+
+def test_bootstrap_sets_up_an_empty_spreadsheet():
+    db = fakes.FakeSpreadsheet()
+    worksheets = sheets.bootstrap(db)
+
+    assert set(worksheets) == set(sheets.TAB_RANGES)
+    tabs = sheets.fetch_tabs(db)
+    for name, header in sheets.TAB_HEADERS.items():
+        assert tabs[name][0] == header
+    assert sheets.read_schema_version(tabs["Settings"])[0] == sheets.SCHEMA_VERSION
+    assert [row[0] for row in tabs["Schedule"][1:]] == [row[0] for row in sheets.DEFAULT_SCHEDULE]
+    assert sheets.read_revisions(tabs["Revisions"]) == {name: "0" for name in sheets.TRACKED_TABS}
+
+
+def test_bootstrap_migrates_an_old_spreadsheet():
+    db = fakes.FakeSpreadsheet({
+        "Schedule": [["Day", "Status", "Meal"], ["Monday", "Cook at Home", "Tacos"]],
+        "Pantry": [["Item"], ["Salt"], ["Salt"]],
+        "Recipe Vault": [["Meal Title", "Recipe", "Rating"], ["Chili", "- 1 lb beef", "5"]],
+        "Voila": [["Item"]],
+        "Settings": [["Setting", "Value"], ["Diet & Portions", "Vegan"]],
+        "Groceries": [["List Type", "Item"], ["Monday List", "Rice"]],
+    })
+    sheets.bootstrap(db)
+    tabs = sheets.fetch_tabs(db)
+
+    assert tabs["Groceries"][0] == sheets.TAB_HEADERS["Groceries"]
+    assert tabs["Recipe Vault"][0] == sheets.TAB_HEADERS["Recipe Vault"]
+    assert tabs["Schedule"][0] == sheets.TAB_HEADERS["Schedule"]
+    # Existing rows keep their data and get distinct IDs.
+    ids = [row[1] for row in tabs["Pantry"][1:]]
+    assert [row[0] for row in tabs["Pantry"][1:]] == ["Salt", "Salt"]
+    assert all(ids) and len(set(ids)) == 2
+    assert tabs["Recipe Vault"][1][:3] == ["Chili", "- 1 lb beef", "5"] and tabs["Recipe Vault"][1][4]
+    assert sheets.decode_settings(tabs["Settings"]) == "Vegan"
+    assert sheets.read_schema_version(tabs["Settings"])[0] == sheets.SCHEMA_VERSION
+
+
+def test_bootstrap_of_a_current_spreadsheet_reads_only_settings():
+    db = fakes.FakeSpreadsheet()
+    sheets.bootstrap(db)
+    calls = len(db.calls)
+    sheets.bootstrap(db)
+    assert db.calls[calls:] == [("meta", None), ("read", ("'Settings'!A:B",))]
+
+
+def test_rows_without_an_id_get_stable_distinct_keys():
+    values = [["Item", "ID"], ["Salt", ""], ["Salt"], ["Rice", "id-a"]]
+    keys = sheets.row_keys(values, 2)
+    assert keys[2] == "id-a"
+    assert keys[0] != keys[1] and all(key.startswith("~") for key in keys[:2])
+    assert sheets.row_keys([list(row) for row in values], 2) == keys
+    assert sheets.find_row(values, 2, keys[1]) == 3
@@ -0,0 +1,236 @@
+"""Two devices syncing through one fake spreadsheet, without threads or a network."""
+import time
+
+import gspread
+import pytest
+import requests
+from google.auth import exceptions as auth_exceptions
+
+import fakes
+import journal
+import local_store
+import sheets
+import sync
+
+
+@pytest.fixture
+def db():
+    db = fakes.FakeSpreadsheet()
+    sheets.bootstrap(db)
+    return db
+
+
+def device(db):
+    store = local_store.LocalStore(":memory:")
+    engine = sync.SyncEngine(db, {ws.title: ws for ws in db.worksheets()}, store)
+    engine.pull()
+    return journal.MutationJournal(store, engine)
+
+
+def remote_items(db, tab):
+    return [row[0] for row in db.worksheet(tab).values[1:]]
+
+
+def key_of(device, tab, item):
+    items = device.view(tab)
+    return items.keys[items.index(item)]
+
+
+def api_error(status):
+    response = requests.Response()
+    response.status_code = status
+    response._content = b'{"error": {"code": %d, "message": "refused", "status": "REFUSED"}}' % status
+    return gspread.exceptions.APIError(response)
+
+
+def test_keyed_delete_removes_its_row_while_another_device_moves_rows(db):
+    a, b = device(db), device(db)
+    salt = key_of(b, "Pantry", "Salt")
+
+    # Device a removes the row above Salt and appends another, shifting everything below.
+    a.delete_row("Pantry", key_of(a, "Pantry", "Olive Oil"))
+    a.append_rows("Pantry", [["Rice"]])
+    assert a.engine.push()
+
+    b.delete_row("Pantry", salt)
+    assert b.engine.push()
+
+    assert remote_items(db, "Pantry") == ["Black Pepper", "Garlic Powder", "Rice"]
+    assert list(b.view("Pantry")) == ["Black Pepper", "Garlic Powder", "Rice"]
+    assert b.conflicts == []
+
+
+def test_keyed_delete_of_a_row_already_gone_is_dropped(db):
+    a, b = device(db), device(db)
+    salt = key_of(a, "Pantry", "Salt")
+    a.delete_row("Pantry", salt)
+    b.delete_row("Pantry", salt)
+    assert a.engine.push() and b.engine.push()
+
+    assert remote_items(db, "Pantry") == ["Olive Oil", "Black Pepper", "Garlic Powder"]
+    assert b.conflicts == []
+
+
+def test_update_over_another_devices_change_is_recorded_as_conflict(db):
+    a, b = device(db), device(db)
+    seen = b.view("Settings")
+
+    a.update_row("Settings", "Diet & Portions", {2: "Vegan"}, expected={2: seen})
+    assert a.engine.push()
+    b.update_row("Settings", "Diet & Portions", {2: "Keto"}, expected={2: seen})
+    assert b.engine.push()
+
+    assert [op[0] for tab, op in b.conflicts] == ["update_row"]
+    assert b.conflicts[0][0] == "Settings"
+    # The losing device is brought back to what the spreadsheet holds.
+    assert b.view("Settings") == "Vegan"
+    assert sheets.decode_settings(db.worksheet("Settings").values) == "Vegan"
+
+
+def test_queued_edits_to_one_row_go_out_as_one_op(db):
+    a = device(db)
+    seen = a.view("Settings")
+    a.update_row("Settings", "Diet & Portions", {2: "Vegan"}, expected={2: seen})
+    a.update_row("Settings", "Diet & Portions", {2: "Vegan, no nuts"}, expected={2: "Vegan"})
+    assert a.pending_count() == 1
+
+    calls = len(db.calls)
+    assert a.engine.push()
+    assert [kind for kind, _ in db.calls[calls:]] == ["read", "write"]
+    # The merged edit still expects what the device showed before the first one.
+    assert a.conflicts == []
+    assert sheets.decode_settings(db.worksheet("Settings").values) == "Vegan, no nuts"
+
+
+def test_check_pulls_only_the_tabs_whose_marker_moved(db):
+    a, b = device(db), device(db)
+    b.append_rows("Voila", [["Milk"]])
+    assert b.engine.push()
+
+    calls = len(db.calls)
+    assert a.engine.check() == ["Voila"]
+    assert db.calls[calls:] == [("read", "'Revisions'!A:B"), ("read", ("'Voila'!A:B",))]
+    assert list(a.view("Voila")) == ["Milk"]
+
+    calls = len(db.calls)
+    assert a.engine.check() == []
+    assert db.calls[calls:] == [("read", "'Revisions'!A:B")]
+
+
+def test_own_push_does_not_trigger_a_pull(db):
+    a = device(db)
+    a.append_rows("Pantry", [["Rice"]])
+    assert a.engine.push()
+    assert a.engine.check() == []
+
+
+def test_refused_edits_become_conflicts_and_the_queue_moves_on(db):
+    a = device(db)
+    a.update_row("Settings", "Diet & Portions", {2: "Vegan"})
+    a.append_rows("Voila", [["Milk"]])
+    settings_id = a.engine.worksheets["Settings"].id
+    batch_update = db.batch_update
+
+    def refuse_settings(body):
+        if body["requests"][0].get("updateCells", {}).get("start", {}).get("sheetId") == settings_id:
+            raise api_error(400)
+        return batch_update(body)
+
+    db.batch_update = refuse_settings
+    assert a.engine.push()
+
+    assert a.pending_count() == 0
+    assert [tab for tab, op in a.conflicts] == ["Settings"]
+    assert a.view("Settings") == sheets.DEFAULT_DIET
+    assert remote_items(db, "Voila") == ["Milk"]
+
+
+def test_only_the_refused_edit_of_a_batch_is_dropped(db):
+    a, b = device(db), device(db)
+    a.append_rows("Pantry", [["Rice"]])
+    a.update_row("Pantry", key_of(a, "Pantry", "Salt"), {1: "Refuse Me"})
+    a.delete_row("Pantry", key_of(a, "Pantry", "Olive Oil"))
+    batch_update = db.batch_update
+
+    def refuse_one(body):
+        if "Refuse Me" in str(body):
+            raise api_error(400)
+        return batch_update(body)
+
+    db.batch_update = refuse_one
+    assert a.engine.push()
+
+    assert a.pending_count() == 0
+    assert [op[0] for tab, op in a.conflicts] == ["update_row"]
+    assert remote_items(db, "Pantry") == ["Salt", "Black Pepper", "Garlic Powder", "Rice"]
+    assert list(a.view("Pantry")) == ["Salt", "Black Pepper", "Garlic Powder", "Rice"]
+    # Other devices still hear about the edits that went out.
+    assert b.engine.check() == ["Pantry"]
+    assert list(b.view("Pantry")) == ["Salt", "Black Pepper", "Garlic Powder", "Rice"]
+
+
+def test_a_failed_token_refresh_keeps_edits_queued(db):
+    a = device(db)
+    a.append_rows("Voila", [["Milk"]])
+
+    def refresh_failed(body):
+        raise auth_exceptions.TransportError("connection reset during token refresh")
+
+    db.batch_update = refresh_failed
+    assert not a.engine.push()
+    assert a.pending_count() == 1
+    assert a.conflicts == []
+
+
+def test_retryable_errors_keep_edits_queued(db):
+    a = device(db)
+    a.append_rows("Voila", [["Milk"]])
+
+    def unavailable(body):
+        raise api_error(503)
+
+    db.batch_update = unavailable
+    assert not a.engine.push()
+    assert a.pending_count() == 1
+    assert a.conflicts == []
+    assert a.last_error is not None
+    # The edit stays visible locally while it waits.
+    assert list(a.view("Voila")) == ["Milk"]
+
+
+def test_background_push_survives_unexpected_errors(db):
+    a = device(db)
+    a.engine.debounce = 0.01
+    claim = a.store.claim
+    failures = []
+
+    def fails_once():
+        if not failures:
+            failures.append("claim")
+            raise RuntimeError("disk I/O error")
+        return claim()
+
+    a.store.claim = fails_once
+    a.engine.start()
+    a.append_rows("Voila", [["Milk"]])
+    deadline = time.monotonic() + 5
+    while a.pending_count() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert failures == ["claim"]
+    assert a.pending_count() == 0
+    assert remote_items(db, "Voila") == ["Milk"]
+
+
+@pytest.mark.parametrize("error, expected", [
+    (api_error(429), True),
+    (api_error(500), True),
+    (api_error(400), False),
+    (api_error(403), False),
+    (requests.ConnectionError(), True),
+    (auth_exceptions.TransportError(), True),
+    (auth_exceptions.RefreshError(), True),
+    (KeyError("tab"), True),
+])
+def test_retryable(error, expected):
+    assert sync.retryable(error) is expected
@@ -0,0 +1,75 @@
+import math
+
+import recipes
+import sheets
+import vault_search
+
+
+def meal(title, rating, lines, row):
+    structured = recipes.from_markdown("\n".join(f"- {line}" for line in lines), title)
+    return sheets.VaultMeal("", rating, structured, f"id-{row}", row)
+
+
+VAULT = {
+    "Chicken Tikka Masala": meal("Chicken Tikka Masala", "5", ["1 lb chicken thighs", "1 cup yogurt"], 2),
+    "Lemon Chicken Soup": meal("Lemon Chicken Soup", "4", ["1 lb chicken breast", "2 lemons"], 3),
+    "Salmon Teriyaki": meal("Salmon Teriyaki", "5", ["1 lb salmon", "2 tbsp soy sauce"], 4),
+    "Beef Liver Stew": meal("Beef Liver Stew", "1", ["1 lb beef liver"], 5),
+    "Tofu Scramble": meal("Tofu Scramble", "2", ["1 block tofu"], 6),
+    "Plain Rice": meal("Plain Rice", "3", ["1 cup rice"], 7),
+}
+
+
+def tokens_of(listing):
+    return sum(math.ceil((len(title) + 2) / vault_search.CHARS_PER_TOKEN) for title in listing.split(", "))
+
+
+def test_prompt_context_puts_the_best_loved_match_first():
+    loved, banned = vault_search.VaultIndex(VAULT).prompt_context("salmon")
+    assert loved.split(", ")[0] == "Salmon Teriyaki"
+    assert set(loved.split(", ")) == {"Salmon Teriyaki", "Chicken Tikka Masala", "Lemon Chicken Soup"}
+    # Banned meals only come up when they could collide with the request.
+    assert banned == "None"
+
+
+def test_prompt_context_lists_banned_meals_matching_the_request_or_diet():
+    index = vault_search.VaultIndex(VAULT)
+    assert index.prompt_context("beef stew")[1] == "Beef Liver Stew"
+    assert index.prompt_context("chicken", background="tofu")[1] == "Tofu Scramble"
+
+
+def test_prompt_context_stays_within_budget():
+    vault = {
+        f"Slow Cooker Chicken Casserole Number {n}": meal(f"Slow Cooker Chicken Casserole Number {n}", "5", ["1 lb chicken"], n + 2)
+        for n in range(200)
+    }
+    vault.update({f"Dreadful Chicken Surprise {n}": meal(f"Dreadful Chicken Surprise {n}", "1", ["1 lb chicken"], n + 300) for n in range(200)})
+    loved, banned = vault_search.VaultIndex(vault).prompt_context("chicken")
+    assert 0 < tokens_of(loved) <= vault_search.LOVED_BUDGET
+    assert 0 < tokens_of(banned) <= vault_search.BANNED_BUDGET
+
+
+def test_prompt_context_of_an_empty_vault():
+    assert vault_search.VaultIndex({}).prompt_context("anything") == ("None yet", "None")
+
+
+def test_search_matches_every_word_and_prefixes():
+    index = vault_search.VaultIndex(VAULT)
+    assert set(index.search("chick")) == {"Chicken Tikka Masala", "Lemon Chicken Soup"}
+    assert index.search("chicken lemon") == ["Lemon Chicken Soup"]
+    # Ingredients are searchable too.
+    assert index.search("soy") == ["Salmon Teriyaki"]
+    assert index.search("chicken salmon") == []
+
+
+def test_search_filters_by_rating():
+    index = vault_search.VaultIndex(VAULT)
+    banned = vault_search.RATING_FILTERS["Banned (1-2 ⭐)"]
+    assert index.search("salm", banned) == []
+    assert index.search("", banned) == ["Tofu Scramble", "Beef Liver Stew"]
+
+
+def test_browsing_without_a_query_lists_newest_first():
+    index = vault_search.VaultIndex(VAULT)
+    assert index.search("") == list(reversed(VAULT))
+    assert index.search("the and") is index.search("")
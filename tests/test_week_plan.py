@@ -0,0 +1,52 @@
+import random
+
+import recipes
+import sheets
+import week_plan
+
+
+def meal(title, rating, lines):
+    structured = recipes.from_markdown("\n".join(f"- {line}" for line in lines), title)
+    return sheets.VaultMeal("", rating, structured, "", 2)
+
+
+VAULT = {
+    "Chicken Bowl": meal("Chicken Bowl", "5", ["1 lb chicken", "1 cup rice", "1 head broccoli"]),
+    "Chicken Fried Rice": meal("Chicken Fried Rice", "5", ["1 lb chicken", "2 cups rice", "1 cup broccoli", "2 eggs"]),
+    "Beef Tacos": meal("Beef Tacos", "5", ["1 lb ground beef", "8 tortillas", "1 cup salsa"]),
+    "Beef Burritos": meal("Beef Burritos", "5", ["1 lb ground beef", "4 tortillas", "1 cup salsa", "1 cup cheese"]),
+    "Plain Pasta": meal("Plain Pasta", "3", ["1 lb pasta"]),
+    "Banned Stew": meal("Banned Stew", "1", ["1 lb liver"]),
+}
+
+
+def test_only_loved_meals_with_ingredients_are_planned():
+    index = week_plan.PlanIndex({**VAULT, "Mystery Dish": sheets.VaultMeal("", "5", None, "", 2)})
+    assert sorted(index.titles) == ["Beef Burritos", "Beef Tacos", "Chicken Bowl", "Chicken Fried Rice"]
+
+
+def test_days_shopped_together_share_ingredients():
+    index = week_plan.PlanIndex(VAULT)
+    for seed in range(20):
+        plan = week_plan.plan_week(index, ["Tuesday", "Wednesday"], rng=random.Random(seed))
+        assert len(plan) == 2
+        assert len({title.split()[0] for title in plan.values()}) == 1, plan
+
+
+def test_fills_only_as_many_days_as_there_are_meals():
+    plan = week_plan.plan_week(week_plan.PlanIndex(VAULT), ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"], rng=random.Random(1))
+    assert len(plan) == 4
+    assert len(set(plan.values())) == 4
+
+
+def test_excluded_meals_are_skipped():
+    plan = week_plan.plan_week(week_plan.PlanIndex(VAULT), ["Tuesday", "Wednesday"], exclude=["chicken bowl", "Beef Tacos"], rng=random.Random(1))
+    assert sorted(plan.values()) == ["Beef Burritos", "Chicken Fried Rice"]
+
+
+def test_pantry_mask_covers_ingredients_the_pantry_has():
+    index = week_plan.PlanIndex({
+        "Steak": meal("Steak", "5", ["1 lb steak", "1 tsp kosher salt", "salt and pepper"]),
+    })
+    covered = index.pantry_mask(["Salt", "Black Pepper"])
+    assert {key for key, bit in index.bits.items() if covered >> bit & 1} == {"kosher salt", "salt and pepper"}
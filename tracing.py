@@ -0,0 +1,208 @@
+"""Timing and call counting for the planner's hot paths.
+
+Every Sheets request, every Gemini attempt, every tab decode and every full script run
+is kept as a span in a bounded in-memory ring. Spans carry the id of the script run they
+were made for, so API calls can be counted per interaction (including the background
+pushes and jobs an interaction triggers) and held against the per-minute quotas.
+export_jsonl() hands the raw spans over for offline analysis.
+
+The current run is a context variable: each session's script thread sets its own, and
+code handing work to another thread runs it in contextvars.copy_context() to keep it.
+"""
+import collections
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Sheets API quotas per minute for one user (the service account), the project defaults.
+SHEETS_QUOTAS = {"read": 60, "write": 60}
+
+# Spreadsheet and worksheet methods that cost a Sheets API request, by quota bucket.
+SHEETS_METHODS = {
+    "fetch_sheet_metadata": "read",
+    "worksheets": "read",
+    "worksheet": "read",
+    "values_get": "read",
+    "values_batch_get": "read",
+    "get_all_values": "read",
+    "get_all_records": "read",
+    "col_values": "read",
+    "row_values": "read",
+    "add_worksheet": "write",
+    "batch_update": "write",
+    "values_update": "write",
+    "values_append": "write",
+    "update": "write",
+    "update_cell": "write",
+    "update_cells": "write",
+    "append_row": "write",
+    "append_rows": "write",
+    "insert_rows": "write",
+    "delete_rows": "write",
+    "add_cols": "write",
+    "clear": "write",
+}
+WORKSHEET_FACTORIES = {"worksheets", "worksheet", "add_worksheet"}
+
+_current_run = contextvars.ContextVar("trace_run", default=None)
+
+
+class Tracer:
+    def __init__(self, max_spans=5000):
+        self._spans = collections.deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    @property
+    def current_run(self):
+        """Id of the script run this thread (or the run that handed it this work) belongs to."""
+        return _current_run.get()
+
+    # Recording
+    def begin(self, kind, name, **fields):
+        span = {"id": next(self._ids), "run": self.current_run, "kind": kind, "name": name,
+                "at": time.time(), "thread": threading.current_thread().name, **fields}
+        span["_started"] = time.perf_counter()
+        return span
+
+    def end(self, span, error=None):
+        """Records span; ending it twice is harmless."""
+        started = span.pop("_started", None)
+        if started is None:
+            return
+        span["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if error:
+            span["error"] = error
+        with self._lock:
+            self._spans.append(span)
+
+    def begin_run(self, name="script"):
+        """Starts a script run span; later spans in this context count towards it until the next run."""
+        span = self.begin("run", name)
+        _current_run.set(span["id"])
+        return span
+
+    @contextmanager
+    def span(self, kind, name, **fields):
+        """Times the block. Yields the span dict, so the block can add fields to it."""
+        span = self.begin(kind, name, **fields)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, type(e).__name__)
+            raise
+        self.end(span)
+
+    def cache(self, name, hit):
+        with self._lock:
+            counts = self.hits if hit else self.misses
+            counts[name] = counts.get(name, 0) + 1
+
+    # Reporting
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self):
+        """Per (kind, name): calls, errors and latency, slowest in total first."""
+        groups = {}
+        for span in self.spans():
+            if span["kind"] != "run":
+                groups.setdefault((span["kind"], span["name"]), []).append(span)
+        rows = []
+        for (kind, name), spans in groups.items():
+            times = sorted(span["ms"] for span in spans)
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "calls": len(spans),
+                "errors": sum(1 for span in spans if "error" in span),
+                "total ms": round(sum(times), 1),
+                "p50 ms": times[len(times) // 2],
+                "p95 ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+                "max ms": times[-1],
+            })
+        return sorted(rows, key=lambda row: -row["total ms"])
+
+    def runs(self, limit=10):
+        """The latest script runs, newest first, with the API calls made during each."""
+        spans = self.spans()
+        counts = {}
+        for span in spans:
+            if span["kind"] == "sheets":
+                key = f"sheets {span['op']}s"
+            elif span["kind"] == "gemini":
+                key = "gemini calls"
+            else:
+                continue
+            counts.setdefault(span["run"], collections.Counter())[key] += 1
+        rows = []
+        for span in reversed(spans):
+            if span["kind"] == "run":
+                calls = counts.get(span["id"], {})
+                rows.append({
+                    "run": span["id"],
+                    "ms": span["ms"],
+                    "outcome": span.get("error", "done"),
+                    "sheets reads": calls.get("sheets reads", 0),
+                    "sheets writes": calls.get("sheets writes", 0),
+                    "gemini calls": calls.get("gemini calls", 0),
+                })
+                if len(rows) == limit:
+                    break
+        return rows
+
+    def last_minute(self):
+        """API requests started in the last 60 seconds: {"read": n, "write": n, "gemini": n}."""
+        since = time.time() - 60
+        counts = {"read": 0, "write": 0, "gemini": 0}
+        for span in self.spans():
+            if span["at"] >= since:
+                if span["kind"] == "sheets":
+                    counts[span["op"]] += 1
+                elif span["kind"] == "gemini":
+                    counts["gemini"] += 1
+        return counts
+
+    def cache_rates(self):
+        with self._lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return [{"cache": name, "hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)} for name in names]
+
+    def export_jsonl(self):
+        """Every retained span, then one line per cache, as JSON lines."""
+        lines = [json.dumps(span, default=str) for span in self.spans()]
+        lines += [json.dumps({"kind": "cache", **row}) for row in self.cache_rates()]
+        return "\n".join(lines) + "\n"
+
+
+class TracedSheets:
+    """Stands in for a gspread Spreadsheet or Worksheet (or their fakes), timing every API call."""
+
+    def __init__(self, target, tracer, label=""):
+        self._target = target
+        self._tracer = tracer
+        self._label = label
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name not in SHEETS_METHODS or not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            with self._tracer.span("sheets", self._label + name, op=SHEETS_METHODS[name]):
+                result = value(*args, **kwargs)
+            if name == "worksheets":
+                return [self._wrap(ws) for ws in result]
+            if name in WORKSHEET_FACTORIES:
+                return self._wrap(result)
+            return result
+        return call
+
+    def _wrap(self, ws):
+        return TracedSheets(ws, self._tracer, f"{ws.title}.")
@@ -0,0 +1,144 @@
+"""Local relevance ranking and search over the Recipe Vault.
+
+Prompts used to list every loved and banned title, so they grew with the vault forever.
+VaultIndex scores vault meals against a request (diet settings plus any craving) with
+BM25 over their title and ingredient names, and prompt_context() returns only the best
+loved meals and the banned meals that could plausibly collide with the request, cut
+to a fixed token budget. The same inverted index backs the Vault browser's search.
+"""
+import bisect
+import math
+import re
+
+import ingredients
+
+K1 = 1.5
+B = 0.75
+TITLE_WEIGHT = 2
+# Standing preferences (the diet settings) count for less than what was asked for right now.
+BACKGROUND_WEIGHT = 0.3
+
+# Rough prompt-token budget for each list; Gemini averages about four characters a token.
+LOVED_BUDGET = 80
+BANNED_BUDGET = 80
+CHARS_PER_TOKEN = 4
+
+# Vault browser filter label -> ratings it shows (None: every rating).
+RATING_FILTERS = {
+    "All ratings": None,
+    "Loved (4-5 ⭐)": ("4", "5"),
+    "Okay (3 ⭐)": ("3",),
+    "Banned (1-2 ⭐)": ("1", "2"),
+}
+
+STOPWORDS = {
+    "a", "an", "and", "or", "the", "of", "with", "for", "to", "in", "on", "at", "by", "from", "use", "using",
+    "recipe", "dinner", "meal", "dish", "exactly", "all", "any", "base", "single", "feed", "make",
+}
+
+
+def tokens(text):
+    return [word for word in ingredients.name_key(text).split() if word not in STOPWORDS]
+
+
+class VaultIndex:
+    """BM25 index over a decoded vault (sheets.decode_vault); build once per vault version."""
+
+    def __init__(self, vault_dict):
+        self.titles = list(vault_dict)
+        self.ratings = [vault_dict[title].rating for title in self.titles]
+        self.recency = [vault_dict[title].row_index for title in self.titles]
+        self.loved = [title for title, rating in zip(self.titles, self.ratings) if rating in ["4", "5"]]
+        self.banned = [title for title, rating in zip(self.titles, self.ratings) if rating in ["1", "2"]]
+
+        self.lengths = []
+        self.postings = {}
+        for doc, title in enumerate(self.titles):
+            structured = vault_dict[title].structured
+            terms = tokens(title) * TITLE_WEIGHT
+            for item in (structured.ingredients if structured else ()):
+                terms += tokens(item.name or item.text)
+            self.lengths.append(len(terms))
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((doc, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.terms = sorted(self.postings)
+
+        # Newest first, for browsing without a query.
+        newest = sorted(range(len(self.titles)), key=lambda doc: -self.recency[doc])
+        self.newest = {
+            ratings: [self.titles[doc] for doc in newest if ratings is None or self.ratings[doc] in ratings]
+            for ratings in RATING_FILTERS.values()
+        }
+
+    def scores(self, query, background=""):
+        """doc position -> BM25 score, for documents sharing at least one query term."""
+        weights = dict.fromkeys(tokens(background), BACKGROUND_WEIGHT)
+        weights.update(dict.fromkeys(tokens(query), 1.0))
+        scores = {}
+        total = len(self.titles)
+        for term, weight in weights.items():
+            postings = self.postings.get(term, [])
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, count in postings:
+                norm = count + K1 * (1 - B + B * self.lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0.0) + weight * idf * count * (K1 + 1) / norm
+        return scores
+
+    def _expand(self, word):
+        """Indexed terms starting with word, so search works while the user is still typing."""
+        start = bisect.bisect_left(self.terms, word)
+        end = bisect.bisect_left(self.terms, word + "\uffff")
+        return self.terms[start:end]
+
+    def search(self, query="", ratings=None):
+        """Titles matching every word of query, best match first; newest first without a query.
+
+        ratings is one of the RATING_FILTERS values. Browsing without a query returns a
+        prebuilt, shared list (do not modify it), so a page costs the same at any vault size.
+        """
+        words = tokens(query)
+        if not words:
+            return self.newest.get(ratings, self.newest[None])
+
+        matched = None
+        expanded = []
+        for word in words:
+            terms = self._expand(word)
+            docs = {doc for term in terms for doc, _ in self.postings[term]}
+            matched = docs if matched is None else matched & docs
+            expanded += terms
+        scores = self.scores(" ".join(expanded))
+        docs = [doc for doc in matched if ratings is None or self.ratings[doc] in ratings]
+        docs.sort(key=lambda doc: (-scores.get(doc, 0.0), -self.recency[doc]))
+        return [self.titles[doc] for doc in docs]
+
+    def _ranked(self, query, background, ratings):
+        scores = self.scores(query, background)
+        docs = [doc for doc, rating in enumerate(self.ratings) if rating in ratings]
+        # Best match first; among equals, higher rated and then more recently added.
+        return sorted(docs, key=lambda doc: (-scores.get(doc, 0.0), -int(self.ratings[doc]), -self.recency[doc])), scores
+
+    def prompt_context(self, query, background=""):
+        """(loved_str, banned_str) for a prompt about query, each within its token budget."""
+        loved, _ = self._ranked(query, background, ["4", "5"])
+        banned, scores = self._ranked(query, background, ["1", "2"])
+        loved_str = _within_budget([self.titles[doc] for doc in loved], LOVED_BUDGET)
+        banned_str = _within_budget([self.titles[doc] for doc in banned if scores.get(doc)], BANNED_BUDGET)
+        return loved_str or "None yet", banned_str or "None"
+
+
+def _within_budget(titles, budget):
+    chosen, used = [], 0
+    for title in titles:
+        cost = math.ceil((len(title) + 2) / CHARS_PER_TOKEN)
+        if used + cost > budget:
+            break
+        chosen.append(re.sub(r"\s+", " ", title).strip())
+        used += cost
+    return ", ".join(chosen)
@@ -0,0 +1,153 @@
+"""Local week planning from the Recipe Vault.
+
+Auto-Fill used to draw two random favourites and ask Gemini for every other day. The
+planner instead fills as many days as it can with loved vault meals, choosing the
+combination with the fewest ingredients left to buy: per shopping list first (the days
+in grocery_lists.LIST_GROUPS, i.e. the batch-cook pairs, are shopped together), then
+over the whole week, with whatever the pantry covers for free. Higher-rated meals get a
+small edge and last week's meals are skipped. Meals are compared as bitmasks of their
+ingredient keys, so planning over thousands of vault meals takes milliseconds. Gemini
+is only asked for the days the vault cannot fill.
+"""
+import random
+import re
+
+import grocery_lists
+import ingredients
+
+# Ratings worth planning, and their edge measured in ingredients to buy.
+RATING_BONUS = {"5": 1.0, "4": 0.5}
+# Week-wide ingredients to buy count on top of each list's own.
+WEEK_WEIGHT = 0.5
+# Random edge per meal, so pressing Auto-Fill again offers a different, equally good week.
+JITTER = 0.75
+# Meals needing the fewest new ingredients are the only ones the search looks at.
+SHORTLIST = 200
+MAX_PASSES = 4
+
+
+class PlanIndex:
+    """Ingredient bitmasks of the plannable vault meals; build once per vault version."""
+
+    def __init__(self, vault_dict):
+        self.bits = {}
+        self.titles = []
+        self.masks = []
+        self.bonus = []
+        for title, meal in vault_dict.items():
+            if meal.rating not in RATING_BONUS or not meal.structured:
+                continue
+            mask = 0
+            for item in meal.structured.ingredients:
+                key = ingredients.name_key(item.name) if item.name else ""
+                if key:
+                    mask |= 1 << self.bits.setdefault(key, len(self.bits))
+            if mask:
+                self.titles.append(title)
+                self.masks.append(mask)
+                self.bonus.append(RATING_BONUS[meal.rating])
+
+    def pantry_mask(self, pantry):
+        """Bits of the ingredients the pantry covers, by the rule of ingredients.in_pantry(to_taste=True)."""
+        pantry_keys = {ingredients.name_key(item) for item in pantry} - {""}
+        endings = {suffix for item in pantry_keys for suffix in _suffixes(item)} - pantry_keys
+        mask = 0
+        for key, bit in self.bits.items():
+            parts = [part.strip() for part in re.split(r"\band\b|&", key) if part.strip()]
+            if parts and all(part in endings or _suffixes(part) & pantry_keys for part in parts):
+                mask |= 1 << bit
+        return mask
+
+
+def _suffixes(key):
+    words = key.split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+def _groups(days):
+    """Slot positions of days shopped together: one group per grocery list, any other day alone."""
+    groups = []
+    for _, list_days in grocery_lists.LIST_GROUPS:
+        slots = [slot for slot, day in enumerate(days) if day in list_days]
+        if slots:
+            groups.append(slots)
+    listed = {slot for slots in groups for slot in slots}
+    return groups + [[slot] for slot in range(len(days)) if slot not in listed]
+
+
+class _Search:
+    def __init__(self, index, candidates, groups, to_buy, edge):
+        self.masks = index.masks
+        self.candidates = candidates
+        self.groups = groups
+        self.to_buy = to_buy
+        self.edge = edge
+
+    def cost(self, plan):
+        total, week = 0.0, 0
+        for slots in self.groups:
+            union = 0
+            for slot in slots:
+                if plan[slot] is not None:
+                    union |= self.masks[plan[slot]]
+            total += (union & self.to_buy).bit_count()
+            week |= union
+        total += WEEK_WEIGHT * (week & self.to_buy).bit_count()
+        return total - sum(self.edge[meal] for meal in plan if meal is not None)
+
+    def best_for(self, plan, slot):
+        """The unused candidate that makes plan cheapest in slot, and that cost."""
+        used = set(plan)
+        best, best_cost = None, None
+        for meal in self.candidates:
+            if meal in used:
+                continue
+            plan[slot] = meal
+            cost = self.cost(plan)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = meal, cost
+        plan[slot] = None
+        return best, best_cost
+
+    def improve(self, plan):
+        """Local search: replace one meal or swap two days while that lowers the cost."""
+        cost = self.cost(plan)
+        for _ in range(MAX_PASSES):
+            improved = False
+            for slot in range(len(plan)):
+                current = plan[slot]
+                plan[slot] = None
+                meal, new_cost = self.best_for(plan, slot)
+                if meal is not None and new_cost < cost - 1e-9:
+                    plan[slot], cost, improved = meal, new_cost, True
+                else:
+                    plan[slot] = current
+            for first in range(len(plan)):
+                for second in range(first + 1, len(plan)):
+                    plan[first], plan[second] = plan[second], plan[first]
+                    new_cost = self.cost(plan)
+                    if new_cost < cost - 1e-9:
+                        cost, improved = new_cost, True
+                    else:
+                        plan[first], plan[second] = plan[second], plan[first]
+            if not improved:
+                break
+        return plan
+
+
+def plan_week(index, days, pantry=(), exclude=(), rng=random):
+    """{day: vault title} for as many of days as there are plannable meals not in exclude."""
+    excluded = {title.lower() for title in exclude}
+    to_buy = ~index.pantry_mask(pantry)
+    edge = [bonus + rng.random() * JITTER for bonus in index.bonus]
+    candidates = [meal for meal, title in enumerate(index.titles) if title.lower() not in excluded]
+    candidates.sort(key=lambda meal: (index.masks[meal] & to_buy).bit_count() - edge[meal])
+    search = _Search(index, candidates[:SHORTLIST], _groups(days), to_buy, edge)
+
+    # Greedy, one shopping list at a time: each day takes the meal that suits the plan so far best.
+    plan = [None] * len(days)
+    for slots in search.groups:
+        for slot in slots:
+            plan[slot], _ = search.best_for(plan, slot)
+    plan = search.improve(plan)
+    return {day: index.titles[meal] for day, meal in zip(days, plan) if meal is not None}